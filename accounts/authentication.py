@@ -0,0 +1,154 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .blacklist import blacklist
+from .models import User
+
+# Состояние пользователя, которого достаточно для проверки прав в API.
+USER_STATE_FIELDS = ("id", "email", "is_staff", "is_active")
+# Claims, из которых в stateless-режиме собирается то же состояние.
+USER_STATE_CLAIMS = ("email", "is_staff")
+USER_CACHE_PREFIX = "accounts:user:"
+# Сколько пользователей держится в памяти процесса до полной очистки.
+LOCAL_CACHE_MAX_SIZE = 10_000
+
+_local_cache = {}
+
+
+def user_cache_key(user_id):
+    return f"{USER_CACHE_PREFIX}{user_id}"
+
+
+def local_cache_key(user_id):
+    # В токене id строкой, в сигналах модели - числом.
+    return str(user_id)
+
+
+def get_user_state(user_id):
+    """
+    Состояние пользователя из памяти процесса, общего кэша или базы.
+
+    Возвращает словарь USER_STATE_FIELDS или None, если пользователя нет.
+    """
+    now = time.monotonic()
+    entry = _local_cache.get(local_cache_key(user_id))
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    key = user_cache_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        state = (
+            User.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+            .values(*USER_STATE_FIELDS)
+            .first()
+        )
+        if state is None:
+            return None
+        cache.set(key, state, settings.ACCOUNTS_USER_CACHE_TTL)
+
+    if len(_local_cache) >= LOCAL_CACHE_MAX_SIZE:
+        _local_cache.clear()
+    _local_cache[local_cache_key(user_id)] = (
+        now + settings.ACCOUNTS_USER_LOCAL_CACHE_TTL,
+        state,
+    )
+    return state
+
+
+def forget_user_state(user_id):
+    """
+    Сбрасывает закэшированное состояние пользователя.
+
+    Сброс повторяется после коммита: иначе запрос, успевший прочитать старую
+    строку до коммита, положил бы ее обратно в кэш на весь TTL. Память других
+    процессов не сбрасывается и устаревает за ACCOUNTS_USER_LOCAL_CACHE_TTL.
+    """
+
+    def forget():
+        _local_cache.pop(local_cache_key(user_id), None)
+        cache.delete(user_cache_key(user_id))
+
+    forget()
+    transaction.on_commit(forget)
+
+
+def state_from_claims(token):
+    """Состояние пользователя из claims токена или None, если их там нет."""
+    if any(claim not in token for claim in USER_STATE_CLAIMS):
+        return None
+    # Неактивным пользователям токены не выдаются, как и в TokenUser.
+    return {
+        "id": User._meta.pk.to_python(token[api_settings.USER_ID_CLAIM]),
+        "email": token["email"],
+        "is_staff": token["is_staff"],
+        "is_active": True,
+    }
+
+
+def user_from_state(state):
+    """
+    User с загруженными полями USER_STATE_FIELDS.
+
+    Это обычный экземпляр модели: его можно присвоить внешнему ключу или
+    передать в filter(). Остальные поля отложены и при обращении читаются
+    из базы, как после only().
+    """
+    # from_db ждет значения в порядке полей модели.
+    names = [
+        field.attname
+        for field in User._meta.concrete_fields
+        if field.attname in USER_STATE_FIELDS
+    ]
+    return User.from_db(
+        router.db_for_read(User), names, [state[name] for name in names]
+    )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication без запроса к accounts_user на каждый вызов API.
+
+    Состояние пользователя кэшируется на ACCOUNTS_USER_LOCAL_CACHE_TTL секунд
+    в памяти процесса и на ACCOUNTS_USER_CACHE_TTL в общем кэше (Redis) и
+    сбрасывается сигналами сохранения и удаления User. Изменения через
+    QuerySet.update() сигналов не вызывают, после них кэш надо сбросить
+    forget_user_state().
+
+    При ACCOUNTS_JWT_STATELESS пользователь собирается из claims токена, как
+    TokenUser, и база не читается совсем; изменения прав и блокировка
+    вступают в силу только с новым токеном. Токены без нужных claims
+    проверяются через кэш.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as error:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            ) from error
+        # Выход со всех устройств отзывает и access-токены.
+        if blacklist.is_user_revoked(user_id, validated_token.get("iat")):
+            raise InvalidToken(_("Token is blacklisted"))
+        # Для проверки отзыва по паролю нужен его хэш, кэш его не хранит.
+        if api_settings.CHECK_REVOKE_TOKEN:
+            return super().get_user(validated_token)
+
+        state = None
+        if settings.ACCOUNTS_JWT_STATELESS:
+            state = state_from_claims(validated_token)
+        if state is None:
+            state = get_user_state(user_id)
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not state["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user_from_state(state)
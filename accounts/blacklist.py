@@ -0,0 +1,225 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.settings import api_settings
+
+BLACKLIST_PREFIX = "accounts:tokens:"
+SEQUENCE_KEY = f"{BLACKLIST_PREFIX}seq"
+SNAPSHOT_KEY = f"{BLACKLIST_PREFIX}snapshot"
+SNAPSHOT_POSITION_KEY = f"{BLACKLIST_PREFIX}snapshot:position"
+# Отозванные токены раскладываются по фильтрам по дню истечения: фильтр
+# удаляется целиком, когда все его токены истекли.
+BUCKET_SECONDS = 24 * 60 * 60
+REPLAY_CHUNK_SIZE = 1000
+
+
+def jti_key(jti):
+    return f"{BLACKLIST_PREFIX}jti:{jti}"
+
+
+def log_key(number):
+    return f"{BLACKLIST_PREFIX}log:{number}"
+
+
+class BloomFilter:
+    """Фильтр Блума: без ложноотрицательных ответов, ложноположительные редки."""
+
+    def __init__(self, size, hashes):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray((size + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate):
+        size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        return cls(size, max(1, round(size / capacity * math.log(2))))
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * step) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self.positions(item)
+        )
+
+
+class TokenBlacklist:
+    """
+    Копия журнала отзывов в памяти процесса.
+
+    Каждый отзыв пишется в кэш дважды: ключом jti, который и есть черный
+    список, и записью журнала с порядковым номером. Процесс раз в
+    ACCOUNTS_TOKEN_BLACKLIST_SYNC_INTERVAL секунд дочитывает журнал в свои
+    фильтры Блума, поэтому отсутствие jti в фильтре проверяется без кэша,
+    а кэш читается только при попадании в фильтр. Отзыв всех сессий
+    пользователя хранится точно: это время, раньше которого выданные
+    токены недействительны.
+
+    Задача compact_token_blacklist сохраняет состояние в снимок, с которого
+    начинают новые процессы, чтобы не читать журнал с начала.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.position = 0
+        # Записи журнала с номером не больше horizon были видны еще при
+        # прошлой синхронизации: если такой записи нет, она истекла.
+        self.horizon = 0
+        self.synced_at = -math.inf
+        self.buckets = {}
+        self.users = {}
+
+    def snapshot(self):
+        return {
+            "position": self.position,
+            "horizon": self.horizon,
+            "buckets": self.buckets,
+            "users": self.users,
+        }
+
+    def load(self, snapshot):
+        self.position = snapshot["position"]
+        self.horizon = snapshot["horizon"]
+        self.buckets = snapshot["buckets"]
+        self.users = snapshot["users"]
+
+    def apply(self, entry):
+        kind, key, value = entry
+        if kind == "jti":
+            bucket = value // BUCKET_SECONDS
+            if bucket not in self.buckets:
+                self.buckets[bucket] = BloomFilter.for_capacity(
+                    settings.ACCOUNTS_TOKEN_BLACKLIST_CAPACITY,
+                    settings.ACCOUNTS_TOKEN_BLACKLIST_ERROR_RATE,
+                )
+            self.buckets[bucket].add(key)
+        elif value > self.users.get(key, 0):
+            self.users[key] = value
+
+    def prune(self):
+        now = time.time()
+        lifetime = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+        self.buckets = {
+            bucket: bloom
+            for bucket, bloom in self.buckets.items()
+            if (bucket + 1) * BUCKET_SECONDS > now
+        }
+        self.users = {
+            user_id: revoked_at
+            for user_id, revoked_at in self.users.items()
+            if revoked_at + lifetime > now
+        }
+
+    def replay(self, sequence):
+        """Дочитывает журнал до записи с номером sequence."""
+        while self.position < sequence:
+            numbers = range(
+                self.position + 1,
+                min(self.position + REPLAY_CHUNK_SIZE, sequence) + 1,
+            )
+            entries = cache.get_many([log_key(number) for number in numbers])
+            for number in numbers:
+                entry = entries.get(log_key(number))
+                if entry is not None:
+                    self.apply(entry)
+                elif number > self.horizon:
+                    # Номер уже выдан, а запись еще не дописана: ждем ее
+                    # до следующей синхронизации.
+                    self.horizon = sequence
+                    return
+                self.position = number
+        self.horizon = sequence
+
+    def sync(self, force=False):
+        now = time.monotonic()
+        interval = settings.ACCOUNTS_TOKEN_BLACKLIST_SYNC_INTERVAL
+        if not force and self.synced_at + interval > now:
+            return
+        self.synced_at = now
+
+        values = cache.get_many([SEQUENCE_KEY, SNAPSHOT_POSITION_KEY])
+        sequence = values.get(SEQUENCE_KEY, 0)
+        if sequence < self.position:
+            # Кэш очищен: журнал начался заново.
+            self.reset()
+            self.synced_at = now
+        if values.get(SNAPSHOT_POSITION_KEY, 0) > self.position:
+            snapshot = cache.get(SNAPSHOT_KEY)
+            if snapshot is not None:
+                self.load(snapshot)
+        self.replay(sequence)
+        self.prune()
+
+    def record(self, entry, ttl):
+        cache.add(SEQUENCE_KEY, 0, None)
+        number = cache.incr(SEQUENCE_KEY)
+        cache.set(log_key(number), entry, ttl)
+        self.apply(entry)
+
+    def revoke(self, token):
+        """
+        Отзывает токен; возвращает False, если он уже был отозван.
+
+        Ключ jti создается атомарно, поэтому из двух одновременных обновлений
+        одним refresh-токеном пройдет только одно.
+        """
+        jti, expires_at = token[api_settings.JTI_CLAIM], token["exp"]
+        ttl = max(expires_at - int(time.time()), 1)
+        if not cache.add(jti_key(jti), 1, ttl):
+            return False
+        self.record(("jti", jti, expires_at), ttl)
+        return True
+
+    def revoke_user(self, user_id):
+        """
+        Отзывает все токены пользователя, выданные до этого момента.
+
+        iat хранится с точностью до секунды, поэтому отзываются и токены,
+        выданные в ту же секунду, что и отзыв: вход в эту секунду сразу после
+        выхода со всех устройств придется повторить.
+        """
+        lifetime = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+        self.record(("user", str(user_id), int(time.time())), math.ceil(lifetime))
+
+    def is_user_revoked(self, user_id, issued_at):
+        self.sync()
+        revoked_at = self.users.get(str(user_id))
+        return (
+            revoked_at is not None and issued_at is not None and issued_at <= revoked_at
+        )
+
+    def is_revoked(self, token):
+        if self.is_user_revoked(
+            token.get(api_settings.USER_ID_CLAIM), token.get("iat")
+        ):
+            return True
+        jti = token[api_settings.JTI_CLAIM]
+        bloom = self.buckets.get(token["exp"] // BUCKET_SECONDS)
+        if bloom is None or jti not in bloom:
+            return False
+        return cache.get(jti_key(jti)) is not None
+
+
+blacklist = TokenBlacklist()
+
+
+def compact_blacklist():
+    """Сохраняет снимок журнала отзывов; возвращает его позицию."""
+    state = TokenBlacklist()
+    state.sync(force=True)
+    cache.set(SNAPSHOT_KEY, state.snapshot(), None)
+    cache.set(SNAPSHOT_POSITION_KEY, state.position, None)
+    return state.position
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+from django.utils.module_loading import import_string
+
+# Бэкенды, у которых каждый процесс видит свой кэш (или никакого).
+PER_PROCESS_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Буфер last_login, черный список токенов, кэш пользователей и строки
+    загрузок пользователей живут в кэше по умолчанию и работают, только если
+    он общий для веб-процессов и Celery.
+    """
+    backend = import_string(settings.CACHES["default"]["BACKEND"])
+    if not any(issubclass(backend, import_string(path)) for path in PER_PROCESS_CACHES):
+        return []
+    return [
+        Warning(
+            "Кэш по умолчанию у каждого процесса свой: flush_last_logins в Celery "
+            "не увидит буфер входов и last_login не будет записан, а отзыв "
+            "токенов и смена пароля не дойдут до других процессов, а загрузки "
+            "пользователей через API завершатся ошибкой.",
+            hint="Задайте REDIS_CACHE_URL.",
+            id="accounts.W001",
+        )
+    ]
@@ -0,0 +1,103 @@
+import threading
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# Хэшеры с параметрами из настроек. Имена алгоритмов совпадают с Django, поэтому
+# при смене параметров must_update() срабатывает и пароль пересчитывается при
+# следующем входе.
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return settings.ACCOUNTS_SCRYPT_WORK_FACTOR
+
+    @property
+    def block_size(self):
+        return settings.ACCOUNTS_SCRYPT_BLOCK_SIZE
+
+    @property
+    def parallelism(self):
+        return settings.ACCOUNTS_SCRYPT_PARALLELISM
+
+    @property
+    def maxmem(self):
+        # По умолчанию OpenSSL не дает scrypt больше 32 МБ; нужно около
+        # 128 * block_size * (work_factor + parallelism) байт.
+        return 2 * 128 * self.block_size * (self.work_factor + self.parallelism)
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return settings.ACCOUNTS_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ACCOUNTS_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ACCOUNTS_ARGON2_PARALLELISM
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.ACCOUNTS_PBKDF2_ITERATIONS
+
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Слишком много входов и регистраций, повторите позже."
+    default_code = "password_hashing_busy"
+
+
+_slots_lock = threading.Lock()
+_slots = None
+
+
+def get_slots():
+    """Семафор процесса: сколько хэшей может считаться одновременно."""
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(
+                settings.ACCOUNTS_PASSWORD_HASHING_CONCURRENCY
+            )
+        return _slots
+
+
+def run_hashing(func, *args):
+    """
+    Выполняет func(*args), если в процессе свободно место для хэширования.
+
+    Хэш считается в потоке запроса. Gunicorn запускается с потоковыми
+    воркерами (gunicorn.conf.py): scrypt, PBKDF2 и argon2 отпускают GIL,
+    поэтому остальные потоки процесса обслуживают запросы, пока одни
+    считают хэши, но считать хэши одновременно могут не больше
+    ACCOUNTS_PASSWORD_HASHING_CONCURRENCY потоков. Запрос, не дождавшийся
+    места за ACCOUNTS_PASSWORD_HASHING_TIMEOUT секунд, получает 503, а не
+    ждет, пока хэширование займет весь CPU.
+    """
+    slots = get_slots()
+    if not slots.acquire(timeout=settings.ACCOUNTS_PASSWORD_HASHING_TIMEOUT):
+        raise PasswordHashingBusy()
+    try:
+        return func(*args)
+    finally:
+        slots.release()
+
+
+def make_password(raw_password):
+    if raw_password is None:
+        return hashers.make_password(None)
+    return run_hashing(hashers.make_password, raw_password)
+
+
+def verify_password(raw_password, encoded):
+    """Возвращает пару (пароль верен, хэш надо пересчитать)."""
+    return run_hashing(hashers.verify_password, raw_password, encoded)
@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from .models import User
+
+LAST_LOGIN_PREFIX = "accounts:last_login:"
+# Номер последней записи буфера и номер последней записи, уже внесенной в базу.
+SEQUENCE_KEY = f"{LAST_LOGIN_PREFIX}seq"
+FLUSHED_KEY = f"{LAST_LOGIN_PREFIX}flushed"
+# Номер последней записи на момент предыдущего flush: пропуски до него считаются
+# истекшими, а после него — еще не дописанными.
+HORIZON_KEY = f"{LAST_LOGIN_PREFIX}horizon"
+# Сколько живет запись буфера, если flush_last_logins долго не запускался.
+ENTRY_TTL = 24 * 60 * 60
+FLUSH_CHUNK_SIZE = 1000
+
+# Строки обновляются по возрастанию id, чтобы параллельные flush не
+# блокировали друг друга. last_login не сдвигается назад.
+UPDATE_SQL = f"""
+    UPDATE {User._meta.db_table} AS account
+    SET last_login = login.last_login
+    FROM (
+        SELECT * FROM unnest(%s::bigint[], %s::timestamptz[]) AS login (id, last_login)
+        ORDER BY id
+    ) AS login
+    WHERE account.id = login.id
+        AND (account.last_login IS NULL OR account.last_login < login.last_login)
+"""
+
+
+def entry_key(number):
+    return f"{LAST_LOGIN_PREFIX}entry:{number}"
+
+
+def user_key(user_id):
+    return f"{LAST_LOGIN_PREFIX}user:{user_id}"
+
+
+def record_login(user):
+    """
+    Запоминает вход пользователя в буфере кэша вместо UPDATE accounts_user.
+
+    Для одного пользователя в буфер попадает не больше одной записи за
+    ACCOUNTS_LAST_LOGIN_INTERVAL секунд, остальные входы за это время
+    last_login не меняют. В базу буфер переносит flush_last_logins().
+    """
+    now = timezone.now()
+    interval = settings.ACCOUNTS_LAST_LOGIN_INTERVAL
+    if user.last_login and (now - user.last_login).total_seconds() < interval:
+        return False
+    if not cache.add(user_key(user.pk), 1, interval):
+        return False
+
+    cache.add(SEQUENCE_KEY, 0, None)
+    number = cache.incr(SEQUENCE_KEY)
+    cache.set(entry_key(number), (user.pk, now), ENTRY_TTL)
+    return True
+
+
+def flush_last_logins():
+    """
+    Переносит накопленные входы в accounts_user и возвращает число строк.
+
+    Записи читаются пачками по FLUSH_CHUNK_SIZE; для каждого пользователя
+    пишется самый поздний вход одним UPDATE на пачку. Истекшие записи буфера
+    пропускаются: last_login обновится при следующем входе. Запись, номер
+    которой выдан после предыдущего flush, но которая еще не дописана,
+    не пропускается: на ней чтение останавливается до следующего запуска.
+    """
+    last = cache.get(SEQUENCE_KEY, 0)
+    values = cache.get_many([FLUSHED_KEY, HORIZON_KEY])
+    flushed = values.get(FLUSHED_KEY, 0)
+    horizon = values.get(HORIZON_KEY, 0)
+    updated = 0
+    while flushed < last:
+        numbers = range(flushed + 1, min(flushed + FLUSH_CHUNK_SIZE, last) + 1)
+        entries = cache.get_many([entry_key(number) for number in numbers])
+        latest, position = {}, flushed
+        for number in numbers:
+            entry = entries.get(entry_key(number))
+            if entry is None and number > horizon:
+                # record_login уже взял номер, но еще не записал вход.
+                break
+            if entry is not None:
+                user_id, logged_in = entry
+                if user_id not in latest or latest[user_id] < logged_in:
+                    latest[user_id] = logged_in
+            position = number
+        if latest:
+            with connection.cursor() as cursor:
+                cursor.execute(UPDATE_SQL, [list(latest), list(latest.values())])
+                updated += cursor.rowcount
+        cache.set(FLUSHED_KEY, position, None)
+        cache.delete_many(
+            [entry_key(number) for number in range(flushed + 1, position + 1)]
+        )
+        if position < numbers[-1]:
+            break
+        flushed = position
+    cache.set(HORIZON_KEY, last, None)
+    return updated
@@ -0,0 +1,68 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import hashers
+from django.core.management.base import BaseCommand
+
+from accounts import hashers as tuned
+
+PASSWORD = "correct horse battery staple"
+
+
+def configurations():
+    """Пары (название, хэшер): параметры Django по умолчанию и из настроек."""
+    yield "pbkdf2 django", hashers.PBKDF2PasswordHasher()
+    yield "pbkdf2 settings", tuned.PBKDF2PasswordHasher()
+    yield "scrypt django", hashers.ScryptPasswordHasher()
+    yield "scrypt settings", tuned.ScryptPasswordHasher()
+    yield "argon2 django", hashers.Argon2PasswordHasher()
+    yield "argon2 settings", tuned.Argon2PasswordHasher()
+
+
+class Command(BaseCommand):
+    help = (
+        "Измеряет, сколько входов в секунду (проверок пароля) выдерживает одно "
+        "ядро для каждого хэшера, и пропускную способность при --threads потоках."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=3)
+        parser.add_argument("--threads", type=int, default=1)
+
+    def handle(self, *args, **options):
+        for label, hasher in configurations():
+            try:
+                if hasher.library:
+                    hasher._load_library()
+            except ValueError:
+                self.stdout.write(f"{label:<16} пропущен: библиотека не установлена")
+                continue
+            encoded = hasher.encode(PASSWORD, hasher.salt())
+            per_core = self.measure(hasher, encoded, options["seconds"], 1)
+            line = f"{label:<16} {per_core:8.1f} входов/с на ядро"
+            if options["threads"] > 1:
+                total = self.measure(
+                    hasher, encoded, options["seconds"], options["threads"]
+                )
+                line += f", {total:8.1f} входов/с в {options['threads']} потоках"
+            summary = ", ".join(
+                f"{key}={value}"
+                for key, value in hasher.safe_summary(encoded).items()
+                if key not in ("algorithm", "salt", "hash")
+            )
+            self.stdout.write(f"{line} ({summary})")
+
+    def measure(self, hasher, encoded, seconds, threads):
+        def work():
+            count = 0
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                hasher.verify(PASSWORD, encoded)
+                count += 1
+            return count
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            counts = [executor.submit(work) for _ in range(threads)]
+            total = sum(future.result() for future in counts)
+        return total / (time.perf_counter() - started)
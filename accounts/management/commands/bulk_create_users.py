@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from accounts.provisioning import bulk_create_users
+from core.reports import write_load_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Создает пользователей из CSV с колонками email, full_name, password; "
+        "занятые email пропускаются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--chunk-size", type=int)
+        parser.add_argument("--processes", type=int)
+
+    def handle(self, *args, **options):
+        with open(options["path"], encoding="utf-8-sig", newline="") as stream:
+            report = bulk_create_users(
+                stream, options["chunk_size"], options["processes"]
+            )
+
+        write_load_report(self, report, ["created", "skipped"])
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_userbulkcreatejob"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="userbulkcreatejob",
+            name="content",
+        ),
+        migrations.AddField(
+            model_name="userbulkcreatejob",
+            name="chunks",
+            field=models.PositiveIntegerField(default=0, verbose_name="Порций"),
+        ),
+    ]
@@ -1,5 +1,8 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from . import hashers
 from .managers import UserManager
 
 
@@ -37,3 +40,56 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.email
+
+    # Хэширование идет через accounts.hashers с ограничением одновременных
+    # хэшей, в том числе при входе через ModelBackend и в create_user().
+    def set_password(self, raw_password):
+        self.password = hashers.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        is_correct, must_update = hashers.verify_password(raw_password, self.password)
+        if is_correct and must_update:
+            # Хэш устаревшего алгоритма или с другими параметрами.
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=["password"])
+        return is_correct
+
+
+class UserBulkCreateJob(models.Model):
+    """Загрузка пользователей из CSV через API, которую выполняет Celery."""
+
+    STATUS_CHOICES = (
+        ("pending", "В очереди"),
+        ("running", "Выполняется"),
+        ("done", "Выполнена"),
+        ("failed", "Ошибка"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="+",
+        verbose_name="Администратор",
+    )
+    # Строки файла с паролями лежат в кэше (accounts.provisioning), в базе
+    # только число их порций.
+    chunks = models.PositiveIntegerField(default=0, verbose_name="Порций")
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default="pending", verbose_name="Статус"
+    )
+    report = models.JSONField(null=True, blank=True, verbose_name="Отчет")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    finished_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Дата завершения"
+    )
+
+    class Meta:
+        verbose_name = "Загрузка пользователей"
+        verbose_name_plural = "Загрузки пользователей"
+
+    def __str__(self):
+        return f"{self.pk}: {self.status}"
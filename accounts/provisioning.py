@@ -0,0 +1,280 @@
+import csv
+import io
+import logging
+import multiprocessing
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import hashers
+from .models import User, UserBulkCreateJob
+from .tasks import run_user_bulk_create
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_MIN_LENGTH = 6
+# Сколько отклоненных строк возвращать подробно, остальные только считаются.
+MAX_REPORTED_REJECTS = 100
+
+
+def clean_row(row):
+    """Возвращает (email, full_name, password) или бросает ValidationError."""
+    errors = {}
+    email = (row.get("email") or "").strip()
+    full_name = (row.get("full_name") or "").strip()
+    password = row.get("password") or None
+    try:
+        email = User.objects.normalize_email(
+            User._meta.get_field("email").clean(email, None)
+        )
+    except ValidationError as error:
+        errors["email"] = error.messages
+    try:
+        User._meta.get_field("full_name").clean(full_name, None)
+    except ValidationError as error:
+        errors["full_name"] = error.messages
+    if password is not None and len(password) < PASSWORD_MIN_LENGTH:
+        errors["password"] = [
+            f"Пароль должен быть не короче {PASSWORD_MIN_LENGTH} символов."
+        ]
+    if errors:
+        raise ValidationError(errors)
+    return email, full_name, password
+
+
+def hash_passwords(passwords, executor, processes):
+    """
+    Хэши паролей в порядке passwords; без пароля вход невозможен до сброса.
+
+    Без пула процессов пароли хэшируются в текущем потоке с тем же
+    ограничением одновременных хэшей (accounts.hashers), что у входов и
+    регистраций.
+    """
+    raw = [password for password in passwords if password is not None]
+    if executor is None or len(raw) < 2:
+        hashed = map(hashers.make_password, raw)
+    else:
+        chunksize = max(1, len(raw) // (processes * 4))
+        hashed = executor.map(make_password, raw, chunksize=chunksize)
+    return [
+        make_password(None) if password is None else next(hashed)
+        for password in passwords
+    ]
+
+
+def password_pool(processes):
+    if processes <= 1:
+        return None
+    # forkserver: процесс веб-сервера многопоточный, fork из него небезопасен.
+    return ProcessPoolExecutor(
+        processes,
+        mp_context=multiprocessing.get_context("forkserver"),
+        initializer=django.setup,
+    )
+
+
+def bulk_create_users(stream, chunk_size=None, processes=None):
+    """Создает пользователей из CSV с колонками email, full_name, password."""
+    return create_users(csv.DictReader(stream), chunk_size, processes)
+
+
+def create_users(rows, chunk_size=None, processes=None):
+    """
+    Создает пользователей из строк-словарей с ключами email, full_name, password.
+
+    Строки читаются порциями по ACCOUNTS_BULK_CREATE_CHUNK_SIZE. Для
+    каждой порции занятые email ищутся одним запросом, пароли хэшируются
+    в processes (по умолчанию ACCOUNTS_BULK_CREATE_PROCESSES) процессах,
+    которые запускаются только при первой порции хотя бы с двумя паролями,
+    а пользователи вставляются
+    одним bulk_create(ignore_conflicts=True): email, занятый параллельной
+    регистрацией, пропускается, а не прерывает загрузку. Повторы email в
+    файле тоже пропускаются, создается первая строка. Возвращает отчет
+    с числом строк, созданных и пропущенных пользователей, ошибками и
+    временем этапов.
+    """
+    chunk_size = chunk_size or settings.ACCOUNTS_BULK_CREATE_CHUNK_SIZE
+    processes = processes or settings.ACCOUNTS_BULK_CREATE_PROCESSES
+    started = time.perf_counter()
+    timings = {"validate": 0.0, "lookup": 0.0, "hash": 0.0, "insert": 0.0}
+    total = created = skipped = rejected = 0
+    rejects = []
+    seen = set()
+
+    executor = None
+    try:
+        numbered = enumerate(rows, start=1)
+        while chunk := list(islice(numbered, chunk_size)):
+            stage_started = time.perf_counter()
+            accounts = {}
+            for line, row in chunk:
+                total += 1
+                try:
+                    email, full_name, password = clean_row(row)
+                except ValidationError as error:
+                    rejected += 1
+                    if len(rejects) < MAX_REPORTED_REJECTS:
+                        rejects.append({"line": line, "errors": error.message_dict})
+                    continue
+                if email in seen:
+                    skipped += 1
+                    continue
+                seen.add(email)
+                accounts[email] = (full_name, password)
+            timings["validate"] += time.perf_counter() - stage_started
+
+            stage_started = time.perf_counter()
+            existing = set(
+                User.objects.filter(email__in=accounts).values_list("email", flat=True)
+            )
+            for email in existing:
+                del accounts[email]
+            skipped += len(existing)
+            timings["lookup"] += time.perf_counter() - stage_started
+            if not accounts:
+                continue
+
+            stage_started = time.perf_counter()
+            passwords = [password for _, password in accounts.values()]
+            if executor is None and sum(p is not None for p in passwords) >= 2:
+                executor = password_pool(processes)
+            hashes = hash_passwords(passwords, executor, processes)
+            timings["hash"] += time.perf_counter() - stage_started
+
+            stage_started = time.perf_counter()
+            users = [
+                User(email=email, full_name=full_name, password=password_hash)
+                for (email, (full_name, _)), password_hash in zip(
+                    accounts.items(), hashes
+                )
+            ]
+            User.objects.bulk_create(users, ignore_conflicts=True)
+            # Соли у хэшей разные: по паре (email, хэш) видно, чья строка вставлена.
+            inserted = User.objects.filter(
+                email__in=accounts, password__in=hashes
+            ).count()
+            created += inserted
+            skipped += len(users) - inserted
+            timings["insert"] += time.perf_counter() - stage_started
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": total,
+        "created": created,
+        "skipped": skipped,
+        "rejected": rejected,
+        "rejects": rejects,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(total / elapsed) if elapsed else total,
+        "timings": {stage: round(value, 3) for stage, value in timings.items()},
+    }
+
+
+def staged_chunk_key(job_id, number):
+    return f"accounts:bulk_create:{job_id}:{number}"
+
+
+def stage_rows(job_id, rows):
+    """
+    Раскладывает строки CSV по порциям в кэше и возвращает число порций.
+
+    Строки с паролями не попадают в базу: они живут в кэше не дольше
+    ACCOUNTS_BULK_CREATE_STAGE_TIMEOUT и удаляются после выполнения загрузки.
+    """
+    chunk_size = settings.ACCOUNTS_BULK_CREATE_CHUNK_SIZE
+    number = 0
+    try:
+        while chunk := list(islice(rows, chunk_size)):
+            cache.set(
+                staged_chunk_key(job_id, number),
+                chunk,
+                settings.ACCOUNTS_BULK_CREATE_STAGE_TIMEOUT,
+            )
+            number += 1
+    except BaseException:
+        discard_staged_rows(job_id, number)
+        raise
+    return number
+
+
+def staged_rows(job_id, chunks):
+    for number in range(chunks):
+        chunk = cache.get(staged_chunk_key(job_id, number))
+        if chunk is None:
+            raise LookupError(f"Порция {number} загрузки {job_id} не найдена в кэше.")
+        yield from chunk
+
+
+def discard_staged_rows(job_id, chunks):
+    cache.delete_many([staged_chunk_key(job_id, number) for number in range(chunks)])
+
+
+def submit_bulk_create_job(file, created_by=None):
+    """
+    Читает загруженный CSV построчно в кэш и ставит загрузку в Celery после
+    коммита.
+
+    Ошибка брокера только логируется: загрузка остается в статусе pending,
+    и пока ее строки не истекли в кэше, ее можно запустить повторно задачей
+    run_user_bulk_create. Файл не в UTF-8 дает UnicodeDecodeError, а
+    испорченный CSV - csv.Error.
+    """
+    job_id = uuid.uuid4()
+    stream = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        chunks = stage_rows(job_id, iter(csv.DictReader(stream)))
+    finally:
+        # Файл загрузки закрывает Django, обертка его не трогает.
+        stream.detach()
+    try:
+        job = UserBulkCreateJob.objects.create(
+            pk=job_id, chunks=chunks, created_by=created_by
+        )
+    except BaseException:
+        discard_staged_rows(job_id, chunks)
+        raise
+    transaction.on_commit(
+        lambda: run_user_bulk_create.delay(str(job.pk)), robust=True
+    )
+    return job
+
+
+def run_bulk_create_job(job_id):
+    """
+    Выполняет загрузку UserBulkCreateJob и сохраняет ее отчет.
+
+    Загрузка берется, только если она еще ждет выполнения, поэтому повторная
+    доставка задачи не запускает ее второй раз. Строки с паролями удаляются
+    из кэша при любом исходе.
+    """
+    if not UserBulkCreateJob.objects.filter(pk=job_id, status="pending").update(
+        status="running"
+    ):
+        return None
+    job = UserBulkCreateJob.objects.get(pk=job_id)
+    try:
+        job.report = create_users(
+            staged_rows(job.pk, job.chunks),
+            processes=settings.ACCOUNTS_BULK_CREATE_TASK_PROCESSES,
+        )
+        job.status = "done"
+    except Exception:
+        logger.exception("Загрузка пользователей %s завершилась ошибкой", job_id)
+        job.status = "failed"
+    finally:
+        discard_staged_rows(job.pk, job.chunks)
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "report", "finished_at"])
+    return job.report
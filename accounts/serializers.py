@@ -1,6 +1,20 @@
+import csv
+
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from .models import User
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework.reverse import reverse
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .blacklist import blacklist
+from .last_login import record_login
+from .models import User, UserBulkCreateJob
+from .provisioning import submit_bulk_create_job
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -22,24 +36,85 @@ class UserRegistrationSerializer(serializers.Serializer):
         return attrs
 
     def create(self, validated_data):
-        user = User.objects.create_user(
-            email=validated_data["email"],
-            password=validated_data["password"],
-            full_name=validated_data["full_name"],
-        )
+        # exists() в validate не защищает от параллельной регистрации.
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(
+                    email=validated_data["email"],
+                    password=validated_data["password"],
+                    full_name=validated_data["full_name"],
+                )
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {"email": "Этот email уже зарегистрирован."}
+            )
         return user
 
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
         data = super().validate(attrs)
-        self.user = User.objects.get(email=attrs["email"])
+        # UPDATE_LAST_LOGIN выключен: вход пишется в буфер, а не в базу.
+        record_login(self.user)
         return data
 
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
         token["email"] = user.email
+        # Нужен CachedJWTAuthentication в режиме ACCOUNTS_JWT_STATELESS.
+        token["is_staff"] = user.is_staff
         return token
 
     username_field = User.EMAIL_FIELD
+
+
+class MyTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        if blacklist.is_revoked(refresh):
+            raise InvalidToken("Токен отозван.")
+        if api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION:
+            # Токен отзывается до выдачи нового: повторно его не обменять.
+            if not blacklist.revoke(refresh):
+                raise InvalidToken("Токен отозван.")
+        return super().validate(attrs)
+
+
+class LogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField(write_only=True)
+
+    def validate_refresh(self, value):
+        try:
+            return RefreshToken(value)
+        except TokenError as error:
+            raise serializers.ValidationError(error.args[0]) from error
+
+
+class UserBulkCreateSerializer(serializers.Serializer):
+    file = serializers.FileField()
+
+    def save(self, **kwargs):
+        # Файл читается построчно прямо при постановке загрузки.
+        try:
+            return submit_bulk_create_job(self.validated_data["file"], **kwargs)
+        except UnicodeDecodeError:
+            raise serializers.ValidationError({"file": ["Файл должен быть в UTF-8."]})
+        except csv.Error as error:
+            raise serializers.ValidationError({"file": [f"Ошибка CSV: {error}"]})
+
+
+class UserBulkCreateJobSerializer(serializers.ModelSerializer):
+    status_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserBulkCreateJob
+        fields = ["id", "status", "report", "created_at", "finished_at", "status_url"]
+        read_only_fields = fields
+
+    def get_status_url(self, job) -> str:
+        return reverse(
+            "users_bulk_create_status",
+            kwargs={"pk": job.pk},
+            request=self.context.get("request"),
+        )
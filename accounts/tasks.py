@@ -0,0 +1,23 @@
+from celery import shared_task
+
+from . import blacklist, last_login
+
+
+@shared_task
+def flush_last_logins():
+    """Переносит накопленные в кэше входы в last_login пользователей."""
+    return last_login.flush_last_logins()
+
+
+@shared_task
+def compact_token_blacklist():
+    """Сохраняет снимок журнала отозванных токенов для новых процессов."""
+    return blacklist.compact_blacklist()
+
+
+@shared_task
+def run_user_bulk_create(job_id):
+    """Создает пользователей из загруженного через API CSV."""
+    from .provisioning import run_bulk_create_job
+
+    return run_bulk_create_job(job_id)
@@ -1,9 +1,24 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView
-from .views import UserRegistrationView, MyTokenObtainPairView
+from .views import (
+    LogoutAllView,
+    LogoutView,
+    MyTokenObtainPairView,
+    MyTokenRefreshView,
+    UserBulkCreateStatusView,
+    UserBulkCreateView,
+    UserRegistrationView,
+)
 
 urlpatterns = [
     path("register/", UserRegistrationView.as_view(), name="register"),
+    path("users/bulk/", UserBulkCreateView.as_view(), name="users_bulk_create"),
+    path(
+        "users/bulk/<uuid:pk>/",
+        UserBulkCreateStatusView.as_view(),
+        name="users_bulk_create_status",
+    ),
     path("token/", MyTokenObtainPairView.as_view(), name="token_obtain_pair"),
-    path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("token/refresh/", MyTokenRefreshView.as_view(), name="token_refresh"),
+    path("logout/", LogoutView.as_view(), name="logout"),
+    path("logout/all/", LogoutAllView.as_view(), name="logout_all"),
 ]
@@ -1,13 +1,26 @@
+from django.shortcuts import get_object_or_404
+from drf_spectacular.utils import extend_schema
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.views import TokenObtainPairView
-from .serializers import UserRegistrationSerializer, MyTokenObtainPairSerializer
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from .blacklist import blacklist
+from .models import UserBulkCreateJob
+from .serializers import (
+    LogoutSerializer,
+    MyTokenObtainPairSerializer,
+    MyTokenRefreshSerializer,
+    UserBulkCreateJobSerializer,
+    UserBulkCreateSerializer,
+    UserRegistrationSerializer,
+)
 
 
 class UserRegistrationView(APIView):
     permission_classes = [AllowAny]
+    throttle_scope = "auth"
     serializer_class = UserRegistrationSerializer
 
     def post(self, request):
@@ -18,11 +31,81 @@ class UserRegistrationView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class UserBulkCreateView(APIView):
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+    serializer_class = UserBulkCreateSerializer
+
+    @extend_schema(responses={202: UserBulkCreateJobSerializer})
+    def post(self, request):
+        """
+        Принимает CSV (email, full_name, password) и создает пользователей
+        в фоне; занятые email пропускаются. Отчет - по ссылке status_url.
+        """
+        serializer = UserBulkCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = serializer.save(created_by=request.user)
+        data = UserBulkCreateJobSerializer(job, context={"request": request}).data
+        return Response(
+            data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": data["status_url"]},
+        )
+
+
+class UserBulkCreateStatusView(APIView):
+    permission_classes = [IsAdminUser]
+    serializer_class = UserBulkCreateJobSerializer
+
+    def get(self, request, pk):
+        """
+        Статус загрузки пользователей и ее отчет после выполнения.
+        """
+        job = get_object_or_404(UserBulkCreateJob, pk=pk)
+        serializer = UserBulkCreateJobSerializer(job, context={"request": request})
+        return Response(serializer.data)
+
+
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
+    throttle_scope = "auth"
     username_field = "email"
 
 
+class MyTokenRefreshView(TokenRefreshView):
+    serializer_class = MyTokenRefreshSerializer
+    throttle_scope = "auth"
+
+
+class LogoutView(APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    serializer_class = LogoutSerializer
+    throttle_scope = "auth"
+
+    @extend_schema(responses={204: None})
+    def post(self, request):
+        """
+        Отзывает refresh-токен: обменять его на новые токены больше нельзя.
+        """
+        serializer = LogoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        blacklist.revoke(serializer.validated_data["refresh"])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class LogoutAllView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(request=None, responses={204: None})
+    def post(self, request):
+        """
+        Завершает все сессии пользователя: отзывает все выданные ему токены.
+        """
+        blacklist.revoke_user(request.user.pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class HealthCheckView(APIView):
     permission_classes = [AllowAny]
 
@@ -0,0 +1,87 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def weak_etag(raw):
+    return f'W/"{hashlib.md5(raw.encode()).hexdigest()}"'
+
+
+class ConditionalGetMixin:
+    """
+    Weak ETag для list и retrieve, Last-Modified только для retrieve.
+
+    Версия выборки считается одним агрегирующим запросом (MAX(updated_at)
+    и COUNT) по отфильтрованному queryset. Если клиент прислал совпадающий
+    If-None-Match или If-Modified-Since, ответ 304 отдается без сериализации.
+    У списка MAX(updated_at) не меняется, когда строка удалена или вышла из
+    фильтра, поэтому его версия - только ETag, в который входит COUNT.
+    Представление, которое знает версию без запроса к базе, переопределяет
+    get_version.
+    """
+
+    last_modified_field = "updated_at"
+
+    def get_version_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    def get_version(self, queryset):
+        """Возвращает пару (ETag, Last-Modified или None)."""
+        version = queryset.aggregate(
+            last_modified=Max(self.last_modified_field), count=Count("pk")
+        )
+        if not version["count"] and self.action == "retrieve":
+            # Несуществующему объекту не выдаем ETag, иначе If-None-Match
+            # с версией пустой выборки получил бы 304 вместо 404.
+            raise Http404
+        last_modified = version["last_modified"]
+        raw = "{}:{}".format(
+            version["count"], last_modified.isoformat() if last_modified else ""
+        )
+        if self.action != "retrieve":
+            last_modified = None
+        return weak_etag(raw), last_modified
+
+    def conditional_response(self, request, queryset, respond):
+        etag, last_modified = self.get_version(queryset)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = respond()
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if timestamp is not None:
+                response["Last-Modified"] = http_date(timestamp)
+        return response
+
+    def use_conditional_list(self):
+        """Считать ли версию для списка; для очень больших выборок она дорога."""
+        return True
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_conditional_list():
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(
+            request,
+            self.get_version_queryset(),
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.get_version_queryset().filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, ValidationError):
+            # Как get_object_or_404: нечисловой pk — это 404, а не 500.
+            raise Http404
+        return self.conditional_response(
+            request,
+            queryset,
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+        )
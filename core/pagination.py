@@ -0,0 +1,223 @@
+import datetime
+import json
+from base64 import b64decode, b64encode
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connection
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Постраничная выдача по ключу (keyset) вместо OFFSET и COUNT(*).
+
+    Порядок берется из OrderingFilter вьюсета (или его атрибута ordering)
+    и дополняется pk, поэтому позиция в выдаче однозначна даже для
+    неуникальных полей вроде total_price. Курсор хранит значения полей
+    последней строки, и следующая страница читается условием
+    "строго после этой строки" с LIMIT: стоимость не зависит от глубины.
+    Поля сортировки должны быть NOT NULL.
+
+    С параметром approximate_count=1 в ответ добавляется примерное число
+    строк: pg_class.reltuples для таблицы без фильтров, иначе оценка
+    планировщика из EXPLAIN.
+    """
+
+    ordering = "-pk"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    approximate_count_query_param = "approximate_count"
+    invalid_cursor_message = _("Некорректный курсор.")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.keyset_ordering = self.get_keyset_ordering(request, queryset, view)
+        self.pk_attname = queryset.model._meta.pk.attname
+        self.approximate_count = None
+        if request.query_params.get(self.approximate_count_query_param) in (
+            "1",
+            "true",
+        ):
+            self.approximate_count = estimate_count(queryset)
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor.reverse
+        ordering = [(name, desc != reverse) for name, desc in self.keyset_ordering]
+        queryset = queryset.order_by(
+            *[f"-{name}" if desc else name for name, desc in ordering]
+        )
+        if cursor is not None:
+            queryset = queryset.filter(
+                self.after_position(queryset.model, ordering, cursor.position)
+            )
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        return self.page
+
+    def get_keyset_ordering(self, request, queryset, view):
+        """Возвращает [(поле, по убыванию), ...] с pk в конце."""
+        ordering = [
+            ("pk" if name.lstrip("-") == "id" else name.lstrip("-"), name[0] == "-")
+            for name in self.get_ordering(request, queryset, view)
+        ]
+        if "pk" not in [name for name, _ in ordering]:
+            ordering.append(("pk", ordering[-1][1]))
+        return ordering
+
+    def after_position(self, model, ordering, position):
+        """
+        Условие "строго после position" в порядке ordering.
+
+        Первое поле дополнительно ограничено нестрогим неравенством, чтобы
+        у индекса было начало диапазона, а не только фильтр.
+        """
+        # Поля сортировки NOT NULL: None и вложенные значения в курсоре
+        # не из выдачи, а собраны вручную.
+        if len(position) != len(ordering) or any(
+            value is None or isinstance(value, (list, dict)) for value in position
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            values = [
+                to_python(model, name, value)
+                for (name, _), value in zip(ordering, position)
+            ]
+        except (TypeError, ValidationError):
+            # TypeError: значение не того типа, например число вместо даты.
+            raise NotFound(self.invalid_cursor_message)
+
+        lookups = [f"{name}__{'lt' if desc else 'gt'}" for name, desc in ordering]
+        branches = [
+            Q(**{name: value for (name, _), value in zip(ordering[:i], values)})
+            & Q(**{lookups[i]: values[i]})
+            for i in range(len(ordering))
+        ]
+        first, desc = ordering[0]
+        return Q(**{f"{first}__{'lte' if desc else 'gte'}": values[0]}) & reduce(
+            or_, branches
+        )
+
+    def get_position(self, instance):
+        if isinstance(instance, dict):
+            # Строки из .values(): pk лежит под именем поля первичного ключа.
+            pk_name = self.pk_attname
+            return [
+                to_json(instance[pk_name if name == "pk" else name])
+                for name, _ in self.keyset_ordering
+            ]
+        return [to_json(getattr(instance, name)) for name, _ in self.keyset_ordering]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor({"p": self.get_position(self.page[-1]), "r": False})
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor({"p": self.get_position(self.page[0]), "r": True})
+
+    def encode_cursor(self, cursor):
+        encoded = b64encode(json.dumps(cursor).encode()).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(b64decode(encoded.encode("ascii")))
+            return KeysetCursor(list(cursor["p"]), bool(cursor.get("r")))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_paginated_response(self, data):
+        payload = {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+        if self.approximate_count is not None:
+            payload = {"approximate_count": self.approximate_count, **payload}
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["approximate_count"] = {
+            "type": "integer",
+            "example": 123,
+        }
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": self.approximate_count_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Добавить в ответ примерное число строк.",
+                "schema": {"type": "boolean"},
+            }
+        ]
+
+
+class KeysetCursor:
+    def __init__(self, position, reverse):
+        self.position = position
+        self.reverse = reverse
+
+
+def to_json(value):
+    # Не DjangoJSONEncoder: он обрезает время до миллисекунд, и курсор
+    # по created_at пропускал бы или повторял строки.
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (int, float, str, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def to_python(model, name, value):
+    """Приводит значение из курсора к типу поля; аннотации остаются как есть."""
+    try:
+        field = model._meta.pk if name == "pk" else model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return value
+    return field.to_python(value)
+
+
+def estimate_count(queryset):
+    """Примерное число строк queryset без COUNT(*)."""
+    if not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is not None and row[0] >= 0:
+            return int(row[0])
+
+    plan = json.loads(queryset.order_by().explain(format="json"))
+    return plan[0]["Plan"]["Plan Rows"]
@@ -0,0 +1,41 @@
+import io
+import re
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+from .renderers import FastJSONRenderer, orjson
+
+# orjson читает целые за пределами 64 бит как float, такие тела разбирает
+# json. Граница -2**63 уже 19-значная, поэтому с json уходит и часть целых,
+# которые orjson прочел бы верно.
+LONG_INTEGER = re.compile(rb"\d{19}")
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser на orjson для тел в UTF-8.
+
+    Если orjson не установлен, разбор не строгий (STRICT_JSON = False), тело
+    в другой кодировке или orjson его не принял, тело разбирает json.load
+    родительского класса: результат и текст ошибок те же, что у JSONParser.
+    """
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        if (
+            orjson is None
+            or not self.strict
+            or encoding.lower().replace("-", "") != "utf8"
+        ):
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        if not LONG_INTEGER.search(body):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(io.BytesIO(body), media_type, parser_context)
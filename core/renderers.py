@@ -0,0 +1,65 @@
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS
+    | orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_PASSTHROUGH_DATACLASS
+    if orjson
+    else 0
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson с тем же выводом для ответов API.
+
+    Даты и время orjson передает в encoder_class, как и json.dumps, а float,
+    полученный из Decimal, форматирует stdlib. Поэтому байты совпадают с
+    JSONRenderer вплоть до "Z" в datetime и записи вроде 1e+16. Обычные
+    float orjson пишет сам: экспоненту короче (1e16), а NaN как null.
+
+    Через json.dumps родительского класса рендеринг идет, если orjson не
+    установлен, если нужен отступ, не-компактный или ASCII-вывод, а также
+    если orjson не смог закодировать данные (целые длиннее 64 бит, одиночные
+    суррогаты).
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        encoder = self.encoder_class(allow_nan=not self.strict)
+
+        def default(obj):
+            if isinstance(obj, Decimal):
+                value = float(obj)
+                # В этом диапазоне orjson пишет float теми же цифрами, что repr().
+                if 1e-4 <= abs(value) < 1e16 or value == 0:
+                    return value
+            else:
+                value = encoder.default(obj)
+            if isinstance(value, float):
+                return orjson.Fragment(encoder.encode(value))
+            return value
+
+        try:
+            ret = orjson.dumps(data, default=default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как в JSONRenderer: U+2028 и U+2029 всегда экранируются.
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
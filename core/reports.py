@@ -0,0 +1,21 @@
+import json
+
+
+def write_load_report(command, report, counters):
+    """
+    Печатает отчет загрузки из файла для management-команды.
+
+    Отклоненные строки уходят в stderr, итог в stdout: число строк,
+    счетчики counters из отчета, время и скорость по этапам.
+    """
+    for reject in report["rejects"]:
+        errors = json.dumps(reject["errors"], ensure_ascii=False)
+        command.stderr.write(f"строка {reject['line']}: {errors}")
+    totals = " ".join(
+        f"{name}={report[name]}" for name in ["rows", *counters, "rejected"]
+    )
+    timings = " ".join(f"{k}={v}s" for k, v in report["timings"].items())
+    command.stdout.write(
+        f"{totals} time={report['seconds']}s "
+        f"rate={report['rows_per_second']} rows/s ({timings})"
+    )
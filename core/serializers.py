@@ -0,0 +1,137 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+
+BULK_RELATED_CACHE = "_bulk_related"
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField, который берет объекты из общего кэша контекста.
+
+    Кэш заполняет BulkRelatedListSerializer одним in_bulk на всю вложенную
+    структуру. Вне такого списка поле ведет себя как обычное.
+    """
+
+    _cache_key = None
+
+    def cache_key(self):
+        # SQL queryset отличает поля одной модели с разными фильтрами. Он
+        # компилируется один раз на поле, а не на каждый элемент корзины.
+        if self._cache_key is None:
+            queryset = self.get_queryset()
+            self._cache_key = queryset.model._meta.label, str(queryset.query)
+        return self._cache_key
+
+    def to_pk(self, data):
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        if isinstance(data, bool):
+            raise TypeError
+        return self.get_queryset().model._meta.pk.to_python(data)
+
+    def to_internal_value(self, data):
+        cache = self.context.get(BULK_RELATED_CACHE, {}).get(self.cache_key())
+        try:
+            pk = self.to_pk(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+        if cache is None or pk not in cache:
+            return super().to_internal_value(data)
+        if cache[pk] is None:
+            self.fail("does_not_exist", pk_value=data)
+        return cache[pk]
+
+
+def _field_pks(field, values):
+    pks = set()
+    for value in values:
+        try:
+            pks.add(field.to_pk(value))
+        except (TypeError, ValueError, DjangoValidationError):
+            pass
+    return pks
+
+
+def _collect_related_ids(serializer, data, found):
+    for field in serializer.fields.values():
+        if field.read_only:
+            continue
+
+        values = [item.get(field.field_name) for item in data if isinstance(item, dict)]
+        if isinstance(field, BulkPrimaryKeyRelatedField):
+            found.setdefault(field.cache_key(), (field, set()))[1].update(
+                _field_pks(field, values)
+            )
+        elif isinstance(field, serializers.ListSerializer) and isinstance(
+            field.child, serializers.Serializer
+        ):
+            nested = [
+                item for value in values if isinstance(value, list) for item in value
+            ]
+            _collect_related_ids(field.child, nested, found)
+        elif isinstance(field, serializers.Serializer):
+            _collect_related_ids(field, values, found)
+
+
+def preload_related(serializer, data):
+    """
+    Загружает объекты для всех BulkPrimaryKeyRelatedField во вложенных данных.
+
+    На каждый queryset выполняется не больше одного in_bulk, уже известные
+    первичные ключи повторно не запрашиваются.
+    """
+    found = {}
+    _collect_related_ids(serializer, data, found)
+
+    cache = serializer.context.setdefault(BULK_RELATED_CACHE, {})
+    for key, (field, pks) in found.items():
+        resolved = cache.setdefault(key, {})
+        unknown = pks - resolved.keys()
+        if unknown:
+            objects = field.get_queryset().in_bulk(unknown)
+            for pk in unknown:
+                resolved[pk] = objects.get(pk)
+
+
+class BulkRelatedListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer, который разрешает связанные объекты всего списка сразу.
+
+    Отсутствующие первичные ключи возвращаются одной ошибкой на поле,
+    а не отдельной ошибкой на каждый элемент.
+    """
+
+    default_error_messages = {
+        "does_not_exist": "Объекты с id {pk_values} не существуют.",
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            preload_related(self.child, data)
+            self.check_missing(data)
+
+        return super().to_internal_value(data)
+
+    def check_missing(self, data):
+        cache = self.context[BULK_RELATED_CACHE]
+        errors = {}
+        for field in self.child.fields.values():
+            if not isinstance(field, BulkPrimaryKeyRelatedField) or field.read_only:
+                continue
+
+            resolved = cache.get(field.cache_key(), {})
+            values = [
+                item.get(field.field_name) for item in data if isinstance(item, dict)
+            ]
+            missing = sorted(
+                pk for pk in _field_pks(field, values) if resolved[pk] is None
+            )
+            if missing:
+                errors[field.field_name] = [
+                    self.error_messages["does_not_exist"].format(
+                        pk_values=", ".join(str(pk) for pk in missing)
+                    )
+                ]
+        if errors:
+            raise serializers.ValidationError(errors)
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # 3rd party
     "rest_framework",
     "drf_spectacular",
@@ -94,6 +95,34 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+REDIS_CACHE_URL = os.environ.get("REDIS_CACHE_URL")
+
+if REDIS_CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+
+# Каталог: сколько секунд живут закэшированные страницы и карточки товаров
+# и сколько воркер ждет, пока другой воркер пересчитывает ту же запись.
+CATALOG_CACHE_TTL = int(os.environ.get("CATALOG_CACHE_TTL", 5 * 60))
+CATALOG_CACHE_LOCK_TIMEOUT = int(os.environ.get("CATALOG_CACHE_LOCK_TIMEOUT", 5))
+# Импорт товаров: сколько строк проверяется и копируется в базу за раз.
+PRODUCTS_IMPORT_CHUNK_SIZE = int(os.environ.get("PRODUCTS_IMPORT_CHUNK_SIZE", 5000))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -114,6 +143,64 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Хэширование паролей: алгоритм для новых хэшей (argon2, scrypt, pbkdf2) и его
+# параметры. Хэши остальных алгоритмов и хэши с другими параметрами
+# проверяются и пересчитываются выбранным при входе.
+PASSWORD_HASHER_CLASSES = {
+    "argon2": "accounts.hashers.Argon2PasswordHasher",
+    "scrypt": "accounts.hashers.ScryptPasswordHasher",
+    "pbkdf2": "accounts.hashers.PBKDF2PasswordHasher",
+}
+ACCOUNTS_PASSWORD_HASHER = os.environ.get("ACCOUNTS_PASSWORD_HASHER", "argon2")
+PASSWORD_HASHERS = [
+    PASSWORD_HASHER_CLASSES[ACCOUNTS_PASSWORD_HASHER],
+    *(
+        path
+        for name, path in PASSWORD_HASHER_CLASSES.items()
+        if name != ACCOUNTS_PASSWORD_HASHER
+    ),
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+]
+# Параметры по умолчанию - минимальные рекомендации OWASP.
+# argon2id: memory_cost в КиБ (19 МиБ на хэш).
+ACCOUNTS_ARGON2_TIME_COST = int(os.environ.get("ACCOUNTS_ARGON2_TIME_COST", 2))
+ACCOUNTS_ARGON2_MEMORY_COST = int(os.environ.get("ACCOUNTS_ARGON2_MEMORY_COST", 19456))
+ACCOUNTS_ARGON2_PARALLELISM = int(os.environ.get("ACCOUNTS_ARGON2_PARALLELISM", 1))
+# scrypt: память на хэш 128 * work_factor * block_size байт (32 МиБ).
+ACCOUNTS_SCRYPT_WORK_FACTOR = int(os.environ.get("ACCOUNTS_SCRYPT_WORK_FACTOR", 2**15))
+ACCOUNTS_SCRYPT_BLOCK_SIZE = int(os.environ.get("ACCOUNTS_SCRYPT_BLOCK_SIZE", 8))
+ACCOUNTS_SCRYPT_PARALLELISM = int(os.environ.get("ACCOUNTS_SCRYPT_PARALLELISM", 3))
+ACCOUNTS_PBKDF2_ITERATIONS = int(
+    os.environ.get("ACCOUNTS_PBKDF2_ITERATIONS", 1_000_000)
+)
+# Сколько хэшей паролей процесс веб-сервера считает одновременно и сколько
+# секунд запрос ждет свободного места до ответа 503. Потоков в процессе
+# больше (GUNICORN_THREADS), остальные в это время обслуживают другие запросы.
+ACCOUNTS_PASSWORD_HASHING_CONCURRENCY = int(
+    os.environ.get("ACCOUNTS_PASSWORD_HASHING_CONCURRENCY", 2)
+)
+ACCOUNTS_PASSWORD_HASHING_TIMEOUT = float(
+    os.environ.get("ACCOUNTS_PASSWORD_HASHING_TIMEOUT", 5)
+)
+# Массовое создание пользователей: сколько строк CSV обрабатывается за раз
+# и в скольких процессах хэшируются пароли.
+ACCOUNTS_BULK_CREATE_CHUNK_SIZE = int(
+    os.environ.get("ACCOUNTS_BULK_CREATE_CHUNK_SIZE", 1000)
+)
+ACCOUNTS_BULK_CREATE_PROCESSES = int(
+    os.environ.get("ACCOUNTS_BULK_CREATE_PROCESSES", os.cpu_count() or 1)
+)
+# Загрузка через API выполняется задачей Celery: по умолчанию в процессе
+# воркера, без своего пула процессов.
+ACCOUNTS_BULK_CREATE_TASK_PROCESSES = int(
+    os.environ.get("ACCOUNTS_BULK_CREATE_TASK_PROCESSES", 1)
+)
+# Сколько секунд строки загрузки с паролями ждут задачу в кэше.
+ACCOUNTS_BULK_CREATE_STAGE_TIMEOUT = int(
+    os.environ.get("ACCOUNTS_BULK_CREATE_STAGE_TIMEOUT", 3600)
+)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -142,11 +229,21 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Rest Settings
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "accounts.authentication.CachedJWTAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    # JSON через orjson, если он установлен; вывод тот же, что у JSONRenderer.
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "core.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
     "DEFAULT_FILTER_BACKENDS": [
@@ -154,6 +251,24 @@ REST_FRAMEWORK = {
         "rest_framework.filters.OrderingFilter",
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    # Корзины токенов в Redis (без Redis - в кэше процесса). auth - вход,
+    # регистрация и обновление токенов с одного IP, orders - оформление
+    # заказов одним пользователем.
+    "DEFAULT_THROTTLE_CLASSES": [
+        "core.throttling.AnonTokenBucketThrottle",
+        "core.throttling.UserTokenBucketThrottle",
+        "core.throttling.ScopedTokenBucketThrottle",
+    ],
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": os.environ.get("THROTTLE_RATE_ANON", "100/min"),
+        "user": os.environ.get("THROTTLE_RATE_USER", "1000/min"),
+        "auth": os.environ.get("THROTTLE_RATE_AUTH", "20/min"),
+        "orders": os.environ.get("THROTTLE_RATE_ORDERS", "60/min"),
+    },
+    # Сколько прокси перед gunicorn дописывают X-Forwarded-For. IP клиента для
+    # лимитов берется из заголовка только на эту глубину; при 0 - REMOTE_ADDR,
+    # иначе клиент подставляет любой X-Forwarded-For и получает новую корзину.
+    "NUM_PROXIES": int(os.environ.get("NUM_PROXIES", 0)),
 }
 
 SIMPLE_JWT = {
@@ -161,7 +276,8 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
-    "UPDATE_LAST_LOGIN": True,
+    # last_login пишет accounts.last_login, см. ACCOUNTS_LAST_LOGIN_INTERVAL.
+    "UPDATE_LAST_LOGIN": False,
     "ALGORITHM": "HS256",
     "SIGNING_KEY": SECRET_KEY,
     "VERIFYING_KEY": None,
@@ -183,6 +299,40 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 }
 
+# Аутентификация: сколько секунд состояние пользователя (id, email, is_staff,
+# is_active) живет в общем кэше и в памяти процесса. Память процесса при
+# изменении пользователя сбрасывается только в том процессе, где он изменен,
+# поэтому ее TTL короткий. ACCOUNTS_JWT_STATELESS=1 - брать пользователя
+# из claims токена без кэша и базы.
+ACCOUNTS_USER_CACHE_TTL = int(os.environ.get("ACCOUNTS_USER_CACHE_TTL", 5 * 60))
+ACCOUNTS_USER_LOCAL_CACHE_TTL = int(os.environ.get("ACCOUNTS_USER_LOCAL_CACHE_TTL", 5))
+ACCOUNTS_JWT_STATELESS = os.environ.get("ACCOUNTS_JWT_STATELESS", "0") == "1"
+
+# last_login: не чаще одной записи на пользователя за интервал (в секундах);
+# входы копятся в кэше и переносятся в базу задачей flush_last_logins.
+ACCOUNTS_LAST_LOGIN_INTERVAL = int(
+    os.environ.get("ACCOUNTS_LAST_LOGIN_INTERVAL", 10 * 60)
+)
+ACCOUNTS_LAST_LOGIN_FLUSH_INTERVAL = int(
+    os.environ.get("ACCOUNTS_LAST_LOGIN_FLUSH_INTERVAL", 60)
+)
+
+# Черный список токенов: раз во сколько секунд процесс дочитывает журнал
+# отзывов в фильтры Блума, сколько отзывов в день рассчитан фильтр и с какой
+# долей ложных срабатываний, раз во сколько секунд сохраняется снимок.
+ACCOUNTS_TOKEN_BLACKLIST_SYNC_INTERVAL = float(
+    os.environ.get("ACCOUNTS_TOKEN_BLACKLIST_SYNC_INTERVAL", 2)
+)
+ACCOUNTS_TOKEN_BLACKLIST_CAPACITY = int(
+    os.environ.get("ACCOUNTS_TOKEN_BLACKLIST_CAPACITY", 100_000)
+)
+ACCOUNTS_TOKEN_BLACKLIST_ERROR_RATE = float(
+    os.environ.get("ACCOUNTS_TOKEN_BLACKLIST_ERROR_RATE", 0.01)
+)
+ACCOUNTS_TOKEN_BLACKLIST_COMPACT_INTERVAL = int(
+    os.environ.get("ACCOUNTS_TOKEN_BLACKLIST_COMPACT_INTERVAL", 60)
+)
+
 
 SPECTACULAR_SETTINGS = {
     "TITLE": "API",
@@ -191,6 +341,10 @@ SPECTACULAR_SETTINGS = {
     "SERVE_INCLUDE_SCHEMA": False,
     "COMPONENT_SPLIT_REQUEST": True,
     "SCHEMA_PATH_PREFIX": r"/api/v[0-9]",
+    "ENUM_NAME_OVERRIDES": {
+        "OrderStatusEnum": "orders.models.Order.STATUS_CHOICES",
+        "OrderIntakeStatusEnum": "orders.models.OrderIntake.STATUS_CHOICES",
+    },
 }
 
 # Email
@@ -208,4 +362,59 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 
 
-CELERY_IMPORTS = ("orders.tasks",)
+CELERY_IMPORTS = ("orders.tasks", "accounts.tasks")
+
+CELERY_BEAT_SCHEDULE = {
+    "relay-outbox": {
+        "task": "orders.tasks.relay_outbox",
+        "schedule": float(os.environ.get("ORDERS_OUTBOX_RELAY_INTERVAL", 1)),
+    },
+    "drain-order-intake": {
+        "task": "orders.tasks.drain_order_intake",
+        "schedule": float(os.environ.get("ORDERS_INTAKE_DRAIN_INTERVAL", 30)),
+    },
+    "purge-outbox": {
+        "task": "orders.tasks.purge_outbox",
+        "schedule": 60 * 60,
+    },
+    "fold-order-rollups": {
+        "task": "orders.tasks.fold_order_rollups",
+        "schedule": float(os.environ.get("ORDERS_ROLLUP_FOLD_INTERVAL", 60)),
+    },
+    "flush-last-logins": {
+        "task": "accounts.tasks.flush_last_logins",
+        "schedule": float(ACCOUNTS_LAST_LOGIN_FLUSH_INTERVAL),
+    },
+    "compact-token-blacklist": {
+        "task": "accounts.tasks.compact_token_blacklist",
+        "schedule": float(ACCOUNTS_TOKEN_BLACKLIST_COMPACT_INTERVAL),
+    },
+}
+
+# Orders
+
+# Сколько хранится ответ на запрос с Idempotency-Key и сколько живет
+# блокировка запроса, который еще выполняется (в секундах).
+ORDERS_IDEMPOTENCY_TTL = int(os.environ.get("ORDERS_IDEMPOTENCY_TTL", 60 * 60))
+ORDERS_IDEMPOTENCY_LOCK_TTL = int(os.environ.get("ORDERS_IDEMPOTENCY_LOCK_TTL", 60))
+
+# Асинхронный прием заказов (Prefer: respond-async): окно накопления заявок
+# в секундах и максимальный размер пакета, который воркер разбирает за раз.
+ORDERS_INTAKE_BATCH_WINDOW = int(os.environ.get("ORDERS_INTAKE_BATCH_WINDOW", 1))
+ORDERS_INTAKE_BATCH_SIZE = int(os.environ.get("ORDERS_INTAKE_BATCH_SIZE", 200))
+
+# Transactional outbox: сколько сообщений relay отправляет за одну транзакцию
+# и сколько секунд хранятся уже отправленные сообщения.
+ORDERS_OUTBOX_BATCH_SIZE = int(os.environ.get("ORDERS_OUTBOX_BATCH_SIZE", 500))
+ORDERS_OUTBOX_RETENTION = int(os.environ.get("ORDERS_OUTBOX_RETENTION", 24 * 60 * 60))
+
+# Подтверждения заказов: сколько писем уходит через одно SMTP-соединение,
+# сколько писем в секунду допускает провайдер (0 - без ограничения),
+# сколько раз и с какой начальной задержкой (в секундах) повторять неудачные.
+ORDERS_EMAIL_BATCH_SIZE = int(os.environ.get("ORDERS_EMAIL_BATCH_SIZE", 100))
+ORDERS_EMAIL_RATE_LIMIT = float(os.environ.get("ORDERS_EMAIL_RATE_LIMIT", 0))
+ORDERS_EMAIL_MAX_RETRIES = int(os.environ.get("ORDERS_EMAIL_MAX_RETRIES", 5))
+ORDERS_EMAIL_RETRY_DELAY = int(os.environ.get("ORDERS_EMAIL_RETRY_DELAY", 30))
+
+# Выгрузка заказов: сколько строк за раз читается из серверного курсора.
+ORDERS_EXPORT_CHUNK_SIZE = int(os.environ.get("ORDERS_EXPORT_CHUNK_SIZE", 2000))
@@ -0,0 +1,167 @@
+import logging
+import threading
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+from redis.exceptions import RedisError
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_PREFIX = "throttle:"
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+# Корзина хранится в хэше {tokens, ts}. Чтение, пополнение и списание идут
+# одним скриптом, поэтому параллельные запросы из разных воркеров не
+# перезаписывают друг друга. Время берется у Redis: часы воркеров не важны.
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(wait)}
+"""
+
+_script = None
+_local_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """ "20/min" -> (20, 60): емкость корзины и за сколько секунд она наполняется."""
+    count, period = rate.split("/")
+    return int(count), PERIODS[period[0]]
+
+
+def redis_client():
+    # cache - прокси, тип бэкенда виден только у caches["default"].
+    backend = caches["default"]
+    if not isinstance(backend, RedisCache):
+        return None
+    # Клиент redis-py из пула соединений кэша.
+    return backend._cache.get_client(write=True)
+
+
+def take_token(key, capacity, rate):
+    """
+    Списывает токен из корзины key на capacity токенов, пополняемой со
+    скоростью rate токенов в секунду. Возвращает (разрешено, секунд до
+    следующего токена).
+    """
+    global _script
+    key = cache.make_and_validate_key(f"{THROTTLE_PREFIX}{key}")
+    client = redis_client()
+    if client is None:
+        return take_local_token(key, capacity, rate)
+    if _script is None:
+        _script = client.register_script(TOKEN_BUCKET_LUA)
+    allowed, wait = _script(keys=[key], args=[capacity, rate], client=client)
+    return bool(allowed), float(wait)
+
+
+def take_local_token(key, capacity, rate):
+    """
+    Та же корзина в кэше без Redis (locmem в тестах и разработке).
+
+    Атомарность дает блокировка процесса, поэтому между процессами лимит
+    не согласован.
+    """
+    key = f"local:{key}"
+    with _local_lock:
+        now = time.time()
+        tokens, ts = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + max(0, now - ts) * rate)
+        allowed, wait = tokens >= 1, 0.0
+        if allowed:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        cache.set(key, (tokens, now), (capacity - tokens) / rate + 1)
+    return allowed, wait
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Ограничение частоты запросов корзиной токенов.
+
+    Лимит scope из DEFAULT_THROTTLE_RATES, например "20/min": корзина на 20
+    запросов, которая полностью наполняется за минуту. Проверка - один вызов
+    скрипта в Redis, тогда как throttle DRF читают и перезаписывают историю
+    запросов отдельными командами и теряют запросы параллельных воркеров.
+    Retry-After в ответе 429 DRF берет из wait(). Если Redis недоступен,
+    запрос пропускается без лимита: сбой кэша не должен отвечать 500.
+    """
+
+    scope = None
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.get_scope(view))
+        key = self.get_cache_key(request, view)
+        if rate is None or key is None:
+            return True
+        capacity, period = parse_rate(rate)
+        try:
+            allowed, self.wait_seconds = take_token(key, capacity, capacity / period)
+        except RedisError:
+            logger.warning("Лимит запросов %s не проверен: Redis недоступен", key)
+            return True
+        return allowed
+
+    def get_scope(self, view):
+        return self.scope
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AnonTokenBucketThrottle(TokenBucketThrottle):
+    """Лимит анонимных запросов с одного IP."""
+
+    scope = "anon"
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return f"anon:{self.get_ident(request)}"
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Лимит запросов аутентифицированного пользователя."""
+
+    scope = "user"
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return None
+
+
+class ScopedTokenBucketThrottle(TokenBucketThrottle):
+    """Лимит на группу эндпоинтов из throttle_scope представления."""
+
+    def get_scope(self, view):
+        return getattr(view, "throttle_scope", None)
+
+    def get_cache_key(self, request, view):
+        scope = self.get_scope(view)
+        if scope is None:
+            return None
+        if request.user and request.user.is_authenticated:
+            return f"{scope}:user:{request.user.pk}"
+        return f"{scope}:ip:{self.get_ident(request)}"
@@ -0,0 +1,11 @@
+import os
+
+# Потоковые воркеры: пока одни потоки считают хэши паролей (argon2, scrypt и
+# PBKDF2 отпускают GIL) или ждут базу, другие обслуживают запросы. Хэшей
+# одновременно в процессе не больше ACCOUNTS_PASSWORD_HASHING_CONCURRENCY,
+# то есть всего не больше workers * ACCOUNTS_PASSWORD_HASHING_CONCURRENCY.
+bind = "0.0.0.0:8000"
+worker_class = "gthread"
+workers = int(os.environ.get("GUNICORN_WORKERS", os.cpu_count() or 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import secrets
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from core.throttling import redis_client
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# Блокировка снимается, только если в ней все еще наш токен: запрос, который
+# пережил ORDERS_IDEMPOTENCY_LOCK_TTL, не должен снять блокировку повтора.
+# Токен - целое число: RedisCache хранит int как есть, без pickle.
+RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_release_script = None
+_local_lock = threading.Lock()
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Запрос с этим Idempotency-Key еще выполняется."
+    default_code = "idempotency_key_in_use"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "Idempotency-Key уже использован для другого запроса."
+    default_code = "idempotency_key_reused"
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(
+        f"{request.method}:{request.path}:{body}".encode()
+    ).hexdigest()
+
+
+def _replay(stored, fingerprint):
+    if stored["fingerprint"] != fingerprint:
+        raise IdempotencyKeyReused()
+
+    response = Response(
+        stored["data"], status=stored["status"], headers=stored["headers"]
+    )
+    response[REPLAYED_HEADER] = "true"
+    return response
+
+
+def release_lock(lock_key, token):
+    """Удаляет lock_key, если в нем лежит token (сравнение и удаление атомарны)."""
+    global _release_script
+    client = redis_client()
+    if client is None:
+        # Кэш процесса (тесты, разработка): атомарность дает блокировка процесса.
+        with _local_lock:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+        return
+    if _release_script is None:
+        _release_script = client.register_script(RELEASE_LOCK_LUA)
+    _release_script(
+        keys=[cache.make_and_validate_key(lock_key)], args=[token], client=client
+    )
+
+
+def idempotent(view_method):
+    """
+    Делает POST-действие вьюсета идемпотентным по заголовку Idempotency-Key.
+
+    Успешный ответ сохраняется в кэше вместе с отпечатком запроса, повтор
+    с тем же ключом получает сохраненный ответ без обращения к базе и без
+    побочных эффектов. Пока первый запрос выполняется, повторы получают 409;
+    блокировку снимает только запрос, который ее взял.
+    Ответы с ошибками не сохраняются, такой запрос можно повторить с тем
+    же ключом.
+    """
+
+    @wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(view, request, *args, **kwargs)
+        if len(key) > 255:
+            raise serializers.ValidationError(
+                {IDEMPOTENCY_HEADER: "Ключ должен быть не длиннее 255 символов."}
+            )
+
+        cache_key = f"idempotency:{request.user.pk}:{key}"
+        lock_key = f"{cache_key}:lock"
+        fingerprint = request_fingerprint(request)
+
+        stored = cache.get(cache_key)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+
+        token = secrets.randbits(63)
+        if not cache.add(lock_key, token, settings.ORDERS_IDEMPOTENCY_LOCK_TTL):
+            raise IdempotencyKeyInUse()
+        try:
+            # Первый запрос мог завершиться между проверкой и захватом блокировки.
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+
+            response = view_method(view, request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                cache.set(
+                    cache_key,
+                    {
+                        "fingerprint": fingerprint,
+                        "status": response.status_code,
+                        "data": response.data,
+                        "headers": {
+                            name: value
+                            for name, value in response.items()
+                            if name != "Content-Type"
+                        },
+                    },
+                    settings.ORDERS_IDEMPOTENCY_TTL,
+                )
+            return response
+        finally:
+            release_lock(lock_key, token)
+
+    return wrapper
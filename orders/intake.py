@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, OrderIntake
+from .outbox import enqueue
+from .serializers import create_orders
+from .tasks import drain_order_intake, send_order_confirmation_emails
+
+INTAKE_DRAIN_SCHEDULED = "orders:intake:drain-scheduled"
+
+
+def submit_order_intake(user, payload):
+    """
+    Ставит заказ в очередь и планирует ее разбор после коммита.
+
+    Разбор планируется не чаще раза за ORDERS_INTAKE_BATCH_WINDOW секунд,
+    поэтому заявки, пришедшие за это время, обрабатываются одним пакетом.
+    Заявка уже сохранена, поэтому ошибка брокера только логируется, а не
+    превращает ответ в 500: повтор клиента создал бы вторую заявку.
+    Оставшиеся в очереди заявки разберет периодический drain_order_intake.
+    """
+    intake = OrderIntake.objects.create(user=user, payload=payload)
+    transaction.on_commit(schedule_intake_drain, robust=True)
+    return intake
+
+
+def schedule_intake_drain():
+    window = settings.ORDERS_INTAKE_BATCH_WINDOW
+    if cache.add(INTAKE_DRAIN_SCHEDULED, True, window * 10):
+        try:
+            drain_order_intake.apply_async(countdown=window)
+        except Exception:
+            # Иначе следующие заявки не запланировали бы разбор до истечения флага.
+            cache.delete(INTAKE_DRAIN_SCHEDULED)
+            raise
+
+
+@transaction.atomic
+def process_intake_batch(batch_size=None):
+    """
+    Обрабатывает до batch_size заявок одной транзакцией и возвращает их число.
+
+    Заявки выбираются с SKIP LOCKED, так что несколько воркеров могут
+    разбирать очередь параллельно. Заявки, для которых не хватило товара
+    или данные устарели, отклоняются по отдельности.
+    """
+    intakes = list(
+        OrderIntake.objects.filter(status="pending")
+        .select_related("user")
+        .order_by("created_at")
+        .select_for_update(skip_locked=True, of=("self",))[
+            : batch_size or settings.ORDERS_INTAKE_BATCH_SIZE
+        ]
+    )
+    if not intakes:
+        return 0
+
+    results = create_orders(
+        [intake.payload for intake in intakes],
+        [{"user": intake.user} for intake in intakes],
+        atomic=False,
+    )
+
+    processed_at = timezone.now()
+    for intake, result in zip(intakes, results):
+        intake.processed_at = processed_at
+        if isinstance(result, Order):
+            intake.status = "accepted"
+            intake.order = result
+        else:
+            intake.status = "rejected"
+            intake.errors = result
+    OrderIntake.objects.bulk_update(
+        intakes, ["status", "order", "errors", "processed_at"]
+    )
+
+    confirmations = [
+        [intake.order.id, intake.user.email]
+        for intake in intakes
+        if intake.status == "accepted"
+    ]
+    if confirmations:
+        enqueue(send_order_confirmation_emails, orders=confirmations)
+    return len(intakes)
@@ -0,0 +1,71 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from orders.models import Order
+from orders.services import place_order
+from products.inventory import rebalance_stock
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Измеряет пропускную способность создания заказов на один горячий товар "
+        "без шардирования остатка и с ним."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=2000)
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--shards", type=int, default=16)
+        parser.add_argument("--quantity", type=int, default=1)
+
+    def handle(self, *args, **options):
+        user, _ = get_user_model().objects.get_or_create(email="bench@example.com")
+        product = Product.objects.create(
+            name="Bench hot SKU",
+            price=10,
+            stock=options["orders"] * options["quantity"],
+        )
+
+        try:
+            for shards in (0, options["shards"]):
+                rebalance_stock(
+                    product,
+                    total=options["orders"] * options["quantity"],
+                    shards=shards,
+                )
+                elapsed = self.run(product, user, options)
+                self.stdout.write(
+                    f"shards={shards:<3} orders={options['orders']} "
+                    f"workers={options['workers']} time={elapsed:.2f}s "
+                    f"rate={options['orders'] / elapsed:.0f} orders/s"
+                )
+                Order.objects.filter(user=user).delete()
+        finally:
+            product.delete()
+            user.delete()
+
+    def run(self, product, user, options):
+        items = [{"product": product, "quantity": options["quantity"]}]
+
+        def worker(count):
+            try:
+                for _ in range(count):
+                    with transaction.atomic():
+                        place_order(items, user=user)
+            finally:
+                connection.close()
+
+        workers = options["workers"]
+        counts = [
+            options["orders"] // workers + (1 if i < options["orders"] % workers else 0)
+            for i in range(workers)
+        ]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(worker, counts))
+        return time.perf_counter() - started
@@ -0,0 +1,71 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from orders.models import Order, OrderItem
+from orders.serializers import ORDER_READ_FIELDS, OrderReadSerializer, OrderSerializer
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает время построения страницы заказов через OrderSerializer "
+        "и OrderReadSerializer. Тестовые данные удаляются откатом транзакции."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=100)
+        parser.add_argument("--items", type=int, default=5)
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            ids = self.generate(options["orders"], options["items"])
+            full = self.measure(
+                options["repeat"],
+                lambda: OrderSerializer(
+                    Order.objects.filter(pk__in=ids)
+                    .select_related("user")
+                    .prefetch_related("items__product"),
+                    many=True,
+                ).data,
+            )
+            fast = self.measure(
+                options["repeat"],
+                lambda: OrderReadSerializer(
+                    Order.objects.filter(pk__in=ids).values(*ORDER_READ_FIELDS),
+                    many=True,
+                ).data,
+            )
+            self.stdout.write(
+                f"orders={options['orders']} items={options['items']} "
+                f"serializer={full:.1f}ms read={fast:.1f}ms "
+                f"speedup={full / fast:.1f}x"
+            )
+            transaction.set_rollback(True)
+
+    def generate(self, orders, items):
+        user = get_user_model().objects.create(email="bench-orders@example.com")
+        products = Product.objects.bulk_create(
+            [Product(name=f"Bench {i}", price=10, stock=0) for i in range(items)]
+        )
+        created = Order.objects.bulk_create([Order(user=user) for _ in range(orders)])
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order=order, product=product, quantity=1, price=10)
+                for order in created
+                for product in products
+            ]
+        )
+        return [order.pk for order in created]
+
+    def measure(self, repeat, render):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            render()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,96 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import FastJSONRenderer, orjson
+from orders.models import Order, OrderItem
+from orders.serializers import OrderSerializer
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает время рендеринга страниц заказов JSONRenderer и "
+        "FastJSONRenderer: данные OrderSerializer и строки values() с Decimal "
+        "и datetime. Тестовые данные удаляются откатом транзакции."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=100)
+        parser.add_argument("--items", type=int, default=5)
+        parser.add_argument("--repeat", type=int, default=200)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError("orjson не установлен: FastJSONRenderer = JSONRenderer.")
+
+        with transaction.atomic():
+            ids = self.generate(options["orders"], options["items"])
+            orders = (
+                Order.objects.filter(pk__in=ids)
+                .select_related("user")
+                .prefetch_related("items__product")
+            )
+            pages = {
+                "serializer": self.page(OrderSerializer(orders, many=True).data),
+                "values": self.page(
+                    list(
+                        OrderItem.objects.filter(order_id__in=ids).values(
+                            "order_id",
+                            "order__created_at",
+                            "order__total_price",
+                            "product_id",
+                            "quantity",
+                            "price",
+                        )
+                    )
+                ),
+            }
+            transaction.set_rollback(True)
+
+        for label, page in pages.items():
+            rendered = JSONRenderer().render(page)
+            if FastJSONRenderer().render(page) != rendered:
+                raise CommandError(f"{label}: вывод рендереров отличается.")
+            stdlib = self.measure(options["repeat"], JSONRenderer().render, page)
+            fast = self.measure(options["repeat"], FastJSONRenderer().render, page)
+            self.stdout.write(
+                f"{label:<10} bytes={len(rendered)} json={stdlib:.2f}ms "
+                f"orjson={fast:.2f}ms speedup={stdlib / fast:.1f}x"
+            )
+
+    def generate(self, orders, items):
+        user = get_user_model().objects.create(email="bench-renderers@example.com")
+        products = Product.objects.bulk_create(
+            [Product(name=f"Bench {i}", price=10, stock=0) for i in range(items)]
+        )
+        created = Order.objects.bulk_create(
+            [Order(user=user, total_price=10 * items) for _ in range(orders)]
+        )
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order=order, product=product, quantity=1, price="10.00")
+                for order in created
+                for product in products
+            ]
+        )
+        return [order.pk for order in created]
+
+    def page(self, results):
+        return {
+            "next": "http://testserver/api/orders/?cursor=eyJwIjpbXX0%3D",
+            "previous": None,
+            "results": results,
+        }
+
+    def measure(self, repeat, render, page):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            render(page)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,35 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from orders.export import EXPORT_FORMATS, export_lines
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = "Выгружает заказы с позициями в CSV или NDJSON потоком."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+        parser.add_argument(
+            "--status", choices=[code for code, _ in Order.STATUS_CHOICES]
+        )
+        parser.add_argument(
+            "--from", dest="created_from", type=datetime.date.fromisoformat
+        )
+        parser.add_argument("--to", dest="created_to", type=datetime.date.fromisoformat)
+        parser.add_argument("--output", help="Файл; по умолчанию stdout.")
+
+    def handle(self, *args, **options):
+        lines = export_lines(
+            options["format"],
+            status=options["status"],
+            created_from=options["created_from"],
+            created_to=options["created_to"],
+        )
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+        with open(options["output"], "w", encoding="utf-8", newline="") as output:
+            output.writelines(lines)
@@ -0,0 +1,35 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from orders.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает агрегаты продаж (заказы и выручка по дням и статусам, "
+        "продажи товаров по дням) за период из таблиц заказов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from", dest="date_from", type=datetime.date.fromisoformat, required=True
+        )
+        parser.add_argument(
+            "--to",
+            dest="date_to",
+            type=datetime.date.fromisoformat,
+            help="По умолчанию сегодня.",
+        )
+
+    def handle(self, *args, **options):
+        date_from = options["date_from"]
+        date_to = options["date_to"] or timezone.localdate()
+        if date_from > date_to:
+            raise CommandError("Конец периода раньше начала.")
+        rebuilt = rebuild_rollups(date_from, date_to)
+        self.stdout.write(
+            f"{date_from}..{date_to}: order_stats={rebuilt['order_stats']} "
+            f"product_sales={rebuilt['product_sales']}"
+        )
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0003_outbox"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+        ),
+        migrations.RunSQL(
+            "UPDATE orders_order SET updated_at = created_at",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,136 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    Order = apps.get_model("orders", "Order")
+    OrderItem = apps.get_model("orders", "OrderItem")
+    OrderDailyStats = apps.get_model("orders", "OrderDailyStats")
+    ProductDailySales = apps.get_model("orders", "ProductDailySales")
+
+    OrderDailyStats.objects.bulk_create(
+        OrderDailyStats(**row)
+        for row in Order.objects.annotate(day=TruncDate("created_at"))
+        .values("day", "status")
+        .annotate(orders=Count("pk"), revenue=Sum("total_price"))
+        .order_by()
+    )
+    ProductDailySales.objects.bulk_create(
+        ProductDailySales(**row)
+        for row in OrderItem.objects.exclude(order__status="cancelled")
+        .annotate(day=TruncDate("order__created_at"))
+        .values("day", "product_id")
+        .annotate(units=Sum("quantity"), revenue=Sum(F("quantity") * F("price")))
+        .order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0005_order_access_indexes"),
+        ("products", "0004_product_sku"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderDailyStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="День")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("new", "Новый"),
+                            ("in_progress", "В обработке"),
+                            ("completed", "Выполнен"),
+                            ("cancelled", "Отменен"),
+                        ],
+                        max_length=20,
+                        verbose_name="Статус",
+                    ),
+                ),
+                ("orders", models.IntegerField(default=0, verbose_name="Заказов")),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Выручка",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Статистика заказов за день",
+                "verbose_name_plural": "Статистика заказов по дням",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "status"),
+                        name="orders_daily_stats_day_status_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="ProductDailySales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="День")),
+                (
+                    "units",
+                    models.IntegerField(default=0, verbose_name="Продано единиц"),
+                ),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="Выручка",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="products.product",
+                        verbose_name="Товар",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Продажи товара за день",
+                "verbose_name_plural": "Продажи товаров по дням",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "product"),
+                        name="orders_product_sales_day_product_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
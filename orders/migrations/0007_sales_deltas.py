@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0006_sales_rollups"),
+        ("products", "0004_product_sku"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SalesDelta",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="День")),
+                (
+                    "status",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("new", "Новый"),
+                            ("in_progress", "В обработке"),
+                            ("completed", "Выполнен"),
+                            ("cancelled", "Отменен"),
+                        ],
+                        max_length=20,
+                        null=True,
+                        verbose_name="Статус",
+                    ),
+                ),
+                ("count", models.IntegerField(verbose_name="Заказов или единиц")),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=14, verbose_name="Выручка"
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        blank=True,
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="products.product",
+                        verbose_name="Товар",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Изменение агрегатов продаж",
+                "verbose_name_plural": "Изменения агрегатов продаж",
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fk_index_name(apps, schema_editor):
+    # Имя, которое Django дал индексу внешнего ключа в 0001_initial.
+    table = apps.get_model("orders", "Order")._meta.db_table
+    return schema_editor._create_index_name(table, ["user_id"])
+
+
+def drop_user_fk_index(apps, schema_editor):
+    schema_editor.execute(
+        "DROP INDEX CONCURRENTLY IF EXISTS %s"
+        % schema_editor.quote_name(fk_index_name(apps, schema_editor))
+    )
+
+
+def create_user_fk_index(apps, schema_editor):
+    table = apps.get_model("orders", "Order")._meta.db_table
+    schema_editor.execute(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON %s (user_id)"
+        % (
+            schema_editor.quote_name(fk_index_name(apps, schema_editor)),
+            schema_editor.quote_name(table),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    # DROP INDEX CONCURRENTLY не выполняется внутри транзакции.
+    atomic = False
+
+    dependencies = [
+        ("orders", "0008_order_user_total_price_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Индексы (user, -created_at, -id) и (user, total_price, id) начинаются
+        # с user_id и заменяют отдельный индекс внешнего ключа.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="order",
+                    name="user",
+                    field=models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="orders",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(drop_user_fk_index, create_user_fk_index),
+            ],
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from accounts.models import User
 from products.models import Product
@@ -11,13 +13,16 @@ class Order(models.Model):
         ("cancelled", "Отменен"),
     )
 
+    # Индекс не нужен: user_id открывает составные индексы из Meta.indexes.
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name="orders",
+        db_index=False,
         verbose_name="Пользователь",
     )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     status = models.CharField(
         max_length=20, choices=STATUS_CHOICES, default="new", verbose_name="Статус"
     )
@@ -29,6 +34,29 @@ class Order(models.Model):
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
         ordering = ["-created_at"]
+        # Под выборки OrderViewSet: keyset-пагинация всегда добавляет id
+        # последним полем сортировки (см. tests/test_order_query_plans.py).
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-id"], name="orders_user_created_idx"
+            ),
+            models.Index(fields=["-created_at", "-id"], name="orders_created_idx"),
+            models.Index(
+                fields=["status", "-created_at", "-id"],
+                name="orders_status_created_idx",
+            ),
+            models.Index(
+                fields=["user", "total_price", "id"],
+                name="orders_user_total_price_idx",
+            ),
+            models.Index(fields=["total_price", "id"], name="orders_total_price_idx"),
+            # Рабочая очередь администратора: открытые заказы по сумме.
+            models.Index(
+                fields=["total_price", "id"],
+                name="orders_open_total_price_idx",
+                condition=models.Q(status__in=["new", "in_progress"]),
+            ),
+        ]
 
     def __str__(self):
         return f"Заказ #{self.pk} от {self.user.email}"
@@ -51,3 +79,164 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
+
+
+class OrderDailyStats(models.Model):
+    """Число заказов и выручка за день в разрезе статуса (см. orders/rollups.py)."""
+
+    day = models.DateField(verbose_name="День")
+    status = models.CharField(
+        max_length=20, choices=Order.STATUS_CHOICES, verbose_name="Статус"
+    )
+    orders = models.IntegerField(default=0, verbose_name="Заказов")
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name="Выручка"
+    )
+
+    class Meta:
+        verbose_name = "Статистика заказов за день"
+        verbose_name_plural = "Статистика заказов по дням"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "status"], name="orders_daily_stats_day_status_uniq"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.status}: {self.orders}"
+
+
+class ProductDailySales(models.Model):
+    """Продано единиц товара за день, без отмененных заказов."""
+
+    day = models.DateField(verbose_name="День")
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="+", verbose_name="Товар"
+    )
+    units = models.IntegerField(default=0, verbose_name="Продано единиц")
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name="Выручка"
+    )
+
+    class Meta:
+        verbose_name = "Продажи товара за день"
+        verbose_name_plural = "Продажи товаров по дням"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "product"], name="orders_product_sales_day_product_uniq"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.day} #{self.product_id}: {self.units}"
+
+
+class SalesDelta(models.Model):
+    """
+    Изменение агрегатов продаж, еще не перенесенное в них (см. orders/rollups.py).
+
+    Строка без товара относится к OrderDailyStats, строка с товаром -
+    к ProductDailySales.
+    """
+
+    day = models.DateField(verbose_name="День")
+    status = models.CharField(
+        max_length=20,
+        choices=Order.STATUS_CHOICES,
+        null=True,
+        blank=True,
+        verbose_name="Статус",
+    )
+    # Без индекса: журнал короткий, а каждый индекс замедляет вставку при заказе.
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        db_index=False,
+        related_name="+",
+        verbose_name="Товар",
+    )
+    count = models.IntegerField(verbose_name="Заказов или единиц")
+    revenue = models.DecimalField(
+        max_digits=14, decimal_places=2, verbose_name="Выручка"
+    )
+
+    class Meta:
+        verbose_name = "Изменение агрегатов продаж"
+        verbose_name_plural = "Изменения агрегатов продаж"
+
+    def __str__(self):
+        return f"{self.day} {self.status or self.product_id}: {self.count}"
+
+
+class OrderIntake(models.Model):
+    """Заказ, принятый в асинхронную очередь и еще не обработанный."""
+
+    STATUS_CHOICES = (
+        ("pending", "В очереди"),
+        ("accepted", "Принят"),
+        ("rejected", "Отклонен"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="order_intakes",
+        verbose_name="Пользователь",
+    )
+    payload = models.JSONField(verbose_name="Данные заказа")
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default="pending", verbose_name="Статус"
+    )
+    order = models.OneToOneField(
+        Order,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="intake",
+        verbose_name="Заказ",
+    )
+    errors = models.JSONField(null=True, blank=True, verbose_name="Ошибки")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    processed_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Дата обработки"
+    )
+
+    class Meta:
+        verbose_name = "Заявка на заказ"
+        verbose_name_plural = "Заявки на заказ"
+        indexes = [
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(status="pending"),
+                name="orders_intake_pending_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"Заявка {self.pk} ({self.status})"
+
+
+class OutboxMessage(models.Model):
+    """Задача Celery, записанная в транзакции и еще не отправленная брокеру."""
+
+    task = models.CharField(max_length=255, verbose_name="Задача")
+    kwargs = models.JSONField(default=dict, verbose_name="Аргументы")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата отправки")
+
+    class Meta:
+        verbose_name = "Сообщение outbox"
+        verbose_name_plural = "Сообщения outbox"
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(sent_at__isnull=True),
+                name="orders_outbox_pending_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk}"
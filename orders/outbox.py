@@ -0,0 +1,80 @@
+from datetime import timedelta
+
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+# Задачи, вызовы которых relay склеивает в один:
+# имя задачи -> (аргумент-список, функция, возвращающая максимальный размер списка)
+MERGEABLE_TASKS = {}
+
+
+def register_mergeable(task, list_kwarg, max_size):
+    """
+    Разрешает relay объединять вызовы task, склеивая списки list_kwarg.
+
+    Так задача, которая обрабатывает список, получает все элементы,
+    накопившиеся за интервал relay, кусками не больше max_size().
+    """
+    MERGEABLE_TASKS[task.name] = (list_kwarg, max_size)
+
+
+def enqueue(task, **kwargs):
+    """
+    Записывает вызов задачи в outbox в текущей транзакции.
+
+    Задача уйдет брокеру только после коммита, ее отправит relay_outbox.
+    Если транзакция откатится, задача не будет отправлена вовсе.
+    """
+    return OutboxMessage.objects.create(task=task.name, kwargs=kwargs)
+
+
+@transaction.atomic
+def relay_outbox_batch(batch_size=None):
+    """
+    Отправляет брокеру пакет неотправленных сообщений и возвращает их число.
+
+    Сообщения выбираются с SKIP LOCKED, поэтому relay можно запускать
+    параллельно. Вызовы задач из MERGEABLE_TASKS склеиваются в один.
+    Если отправка упадет посреди пакета, транзакция откатится и весь
+    пакет уйдет повторно: доставка "как минимум один раз".
+    """
+    messages = list(
+        OutboxMessage.objects.filter(sent_at__isnull=True)
+        .order_by("pk")
+        .select_for_update(skip_locked=True)[
+            : batch_size or settings.ORDERS_OUTBOX_BATCH_SIZE
+        ]
+    )
+    merged = {}
+    for message in messages:
+        if message.task in MERGEABLE_TASKS and message.kwargs.keys() == {
+            MERGEABLE_TASKS[message.task][0]
+        }:
+            list_kwarg, _ = MERGEABLE_TASKS[message.task]
+            merged.setdefault(message.task, []).extend(message.kwargs[list_kwarg])
+        else:
+            current_app.tasks[message.task].apply_async(kwargs=message.kwargs)
+
+    for task, items in merged.items():
+        list_kwarg, max_size = MERGEABLE_TASKS[task]
+        size = max_size()
+        for start in range(0, len(items), size):
+            current_app.tasks[task].apply_async(
+                kwargs={list_kwarg: items[start : start + size]}
+            )
+
+    OutboxMessage.objects.filter(pk__in=[message.pk for message in messages]).update(
+        sent_at=timezone.now()
+    )
+    return len(messages)
+
+
+def purge_outbox():
+    """Удаляет отправленные сообщения старше ORDERS_OUTBOX_RETENTION секунд."""
+    return OutboxMessage.objects.filter(
+        sent_at__lt=timezone.now() - timedelta(seconds=settings.ORDERS_OUTBOX_RETENTION)
+    ).delete()[0]
@@ -0,0 +1,270 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .export import start_of_day
+from .models import Order, OrderDailyStats, OrderItem, ProductDailySales, SalesDelta
+
+# Позиции отмененных заказов не считаются проданными.
+UNSOLD_STATUSES = ("cancelled",)
+
+# Заказ не обновляет строки агрегатов сам: иначе все заказы на товар за день
+# ждали бы блокировки одной строки ProductDailySales, а все новые заказы -
+# одной строки OrderDailyStats. Изменения дописываются в журнал SalesDelta,
+# вставки в который друг друга не блокируют.
+APPEND_SQL = f"""
+    INSERT INTO {SalesDelta._meta.db_table}
+        (day, status, product_id, count, revenue)
+    SELECT * FROM unnest(
+        %s::date[], %s::varchar[], %s::bigint[], %s::integer[], %s::numeric[]
+    )
+"""
+# Перенос журнала в агрегаты одним запросом. Удаленные из журнала строки
+# суммируются по ключу; строки агрегатов сортируются по ключу, поэтому
+# параллельные переносы блокируют их в одном порядке. Строки, добавленные
+# после начала переноса, остаются в журнале до следующего.
+FOLD_SQL = f"""
+    WITH delta AS (
+        DELETE FROM {SalesDelta._meta.db_table}
+        RETURNING day, status, product_id, count, revenue
+    ), order_stats AS (
+        INSERT INTO {OrderDailyStats._meta.db_table} AS rollup
+            (day, status, orders, revenue)
+        SELECT day, status, sum(count), sum(revenue) FROM delta
+        WHERE product_id IS NULL
+        GROUP BY day, status
+        ORDER BY day, status
+        ON CONFLICT (day, status) DO UPDATE SET
+            orders = rollup.orders + EXCLUDED.orders,
+            revenue = rollup.revenue + EXCLUDED.revenue
+    ), product_sales AS (
+        INSERT INTO {ProductDailySales._meta.db_table} AS rollup
+            (day, product_id, units, revenue)
+        SELECT day, product_id, sum(count), sum(revenue) FROM delta
+        WHERE product_id IS NOT NULL
+        GROUP BY day, product_id
+        ORDER BY day, product_id
+        ON CONFLICT (day, product_id) DO UPDATE SET
+            units = rollup.units + EXCLUDED.units,
+            revenue = rollup.revenue + EXCLUDED.revenue
+    )
+    SELECT count(*) FROM delta
+"""
+# Пересчет одним запросом: журнал за пересчитанные дни удаляется в том же
+# снимке, из которого читаются заказы. Изменения, закоммиченные до снимка,
+# уже учтены в пересчете и удаляются из журнала; закоммиченные после -
+# в снимок не попали и остаются в журнале до переноса.
+REBUILD_SQL = f"""
+    WITH delta AS (
+        DELETE FROM {SalesDelta._meta.db_table}
+        WHERE day BETWEEN %(date_from)s AND %(date_to)s
+    ), order_stats AS (
+        INSERT INTO {OrderDailyStats._meta.db_table} (day, status, orders, revenue)
+        SELECT (created_at AT TIME ZONE %(tzname)s)::date, status,
+            count(*), sum(total_price)
+        FROM {Order._meta.db_table}
+        WHERE created_at >= %(created_from)s AND created_at < %(created_to)s
+        GROUP BY 1, 2
+        RETURNING 1
+    ), product_sales AS (
+        INSERT INTO {ProductDailySales._meta.db_table}
+            (day, product_id, units, revenue)
+        SELECT (o.created_at AT TIME ZONE %(tzname)s)::date, i.product_id,
+            sum(i.quantity), sum(i.quantity * i.price)
+        FROM {OrderItem._meta.db_table} i
+        JOIN {Order._meta.db_table} o ON o.id = i.order_id
+        WHERE o.created_at >= %(created_from)s AND o.created_at < %(created_to)s
+            AND o.status <> ALL(%(unsold)s)
+        GROUP BY 1, 2
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM order_stats), (SELECT count(*) FROM product_sales)
+"""
+# Блокируются только таблицы агрегатов: переносы журнала ждут окончания
+# пересчета, а заказы продолжают дописывать журнал.
+LOCK_SQL = (
+    f"LOCK TABLE {OrderDailyStats._meta.db_table}, "
+    f"{ProductDailySales._meta.db_table} IN SHARE ROW EXCLUSIVE MODE"
+)
+# Отчет складывает агрегаты и еще не перенесенный журнал, ничего не записывая.
+REPORT_DAYS_SQL = f"""
+    SELECT day, status, sum(orders) AS orders, sum(revenue) AS revenue FROM (
+        SELECT day, status, orders, revenue FROM {OrderDailyStats._meta.db_table}
+        WHERE day BETWEEN %(date_from)s AND %(date_to)s
+        UNION ALL
+        SELECT day, status, count, revenue FROM {SalesDelta._meta.db_table}
+        WHERE product_id IS NULL AND day BETWEEN %(date_from)s AND %(date_to)s
+    ) AS stats
+    GROUP BY day, status
+    HAVING sum(orders) <> 0
+    ORDER BY day, status
+"""
+REPORT_PRODUCTS_SQL = f"""
+    SELECT product_id, sum(units) AS unit_count, sum(revenue) AS revenue_total
+    FROM (
+        SELECT product_id, units, revenue FROM {ProductDailySales._meta.db_table}
+        WHERE day BETWEEN %(date_from)s AND %(date_to)s
+        UNION ALL
+        SELECT product_id, count, revenue FROM {SalesDelta._meta.db_table}
+        WHERE product_id IS NOT NULL AND day BETWEEN %(date_from)s AND %(date_to)s
+    ) AS sales
+    GROUP BY product_id
+    HAVING sum(units) > 0
+    ORDER BY unit_count DESC, product_id
+    LIMIT %(top_products)s
+"""
+
+
+class RollupDelta:
+    """Накопленные изменения агрегатов, которые дописываются в журнал одной вставкой."""
+
+    def __init__(self):
+        self.orders = defaultdict(lambda: [0, Decimal(0)])
+        self.products = defaultdict(lambda: [0, Decimal(0)])
+
+    def add_order(self, order, status, sign=1):
+        row = self.orders[(timezone.localdate(order.created_at), status)]
+        row[0] += sign
+        row[1] += sign * to_decimal(order.total_price)
+
+    def add_items(self, order, items, sign=1):
+        """items - тройки (product_id, quantity, price)."""
+        day = timezone.localdate(order.created_at)
+        for product_id, quantity, price in items:
+            row = self.products[(day, product_id)]
+            row[0] += sign * quantity
+            row[1] += sign * quantity * to_decimal(price)
+
+    def apply(self):
+        rows = [
+            (day, status, None, *row)
+            for (day, status), row in self.orders.items()
+            if any(row)
+        ] + [
+            (day, None, product_id, *row)
+            for (day, product_id), row in self.products.items()
+            if any(row)
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(APPEND_SQL, [list(column) for column in zip(*rows)])
+
+
+def to_decimal(value):
+    # Цена товара, созданного с float и не перечитанного из базы, остается float.
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def order_items(order):
+    return OrderItem.objects.filter(order=order).values_list(
+        "product_id", "quantity", "price"
+    )
+
+
+def record_orders(orders, items):
+    """Учитывает новые заказы и их позиции (OrderItem) в агрегатах."""
+    delta = RollupDelta()
+    for order in orders:
+        delta.add_order(order, order.status)
+    for item in items:
+        if item.order.status not in UNSOLD_STATUSES:
+            delta.add_items(item.order, [(item.product_id, item.quantity, item.price)])
+    delta.apply()
+
+
+def record_status_change(order, previous_status):
+    """Переносит заказ из агрегата прежнего статуса в агрегат текущего."""
+    if order.status == previous_status:
+        return
+    delta = RollupDelta()
+    delta.add_order(order, previous_status, sign=-1)
+    delta.add_order(order, order.status)
+    was_sold = previous_status not in UNSOLD_STATUSES
+    if was_sold != (order.status not in UNSOLD_STATUSES):
+        delta.add_items(order, order_items(order), sign=-1 if was_sold else 1)
+    delta.apply()
+
+
+def record_deletion(order):
+    """Убирает удаляемый заказ из агрегатов; вызывается до удаления позиций."""
+    delta = RollupDelta()
+    delta.add_order(order, order.status, sign=-1)
+    if order.status not in UNSOLD_STATUSES:
+        delta.add_items(order, order_items(order), sign=-1)
+    delta.apply()
+
+
+@transaction.atomic
+def fold_rollups():
+    """
+    Переносит журнал SalesDelta в таблицы агрегатов.
+
+    Вызывается периодически из Celery beat. Возвращает число перенесенных строк.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(FOLD_SQL)
+        return cursor.fetchone()[0]
+
+
+@transaction.atomic
+def rebuild_rollups(date_from, date_to):
+    """
+    Пересчитывает агрегаты за дни date_from..date_to из таблиц заказов.
+
+    На время пересчета таблицы агрегатов блокируются от записи, поэтому
+    перенос журнала ждет его окончания; вставки в журнал не блокируются.
+    Записи журнала за пересчитанные дни, учтенные в пересчете, удаляются.
+    Возвращает число записанных строк.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(LOCK_SQL)
+        OrderDailyStats.objects.filter(day__range=(date_from, date_to)).delete()
+        ProductDailySales.objects.filter(day__range=(date_from, date_to)).delete()
+        cursor.execute(
+            REBUILD_SQL,
+            {
+                "date_from": date_from,
+                "date_to": date_to,
+                "created_from": start_of_day(date_from),
+                "created_to": start_of_day(date_to + datetime.timedelta(days=1)),
+                "tzname": timezone.get_current_timezone_name(),
+                "unsold": list(UNSOLD_STATUSES),
+            },
+        )
+        order_stats, product_sales = cursor.fetchone()
+    return {"order_stats": order_stats, "product_sales": product_sales}
+
+
+def sales_report(date_from, date_to, top_products):
+    """Отчет о продажах за период; читает только журнал и таблицы агрегатов."""
+    params = {"date_from": date_from, "date_to": date_to, "top_products": top_products}
+    with connection.cursor() as cursor:
+        cursor.execute(REPORT_DAYS_SQL, params)
+        days = fetch_dicts(cursor)
+        cursor.execute(REPORT_PRODUCTS_SQL, params)
+        products = fetch_dicts(cursor)
+
+    totals = {}
+    for row in days:
+        total = totals.setdefault(
+            row["status"],
+            {"status": row["status"], "order_count": 0, "revenue_total": Decimal(0)},
+        )
+        total["order_count"] += row["orders"]
+        total["revenue_total"] += row["revenue"]
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "totals": [totals[status] for status in sorted(totals)],
+        "days": days,
+        "products": products,
+    }
+
+
+def fetch_dicts(cursor):
+    columns = [column.name for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
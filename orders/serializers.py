@@ -1,14 +1,35 @@
+import datetime
+from collections import defaultdict
+
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
-from .models import Order, OrderItem
+from django.utils import timezone
+from rest_framework.reverse import reverse
+from core.serializers import (
+    BulkPrimaryKeyRelatedField,
+    BulkRelatedListSerializer,
+    preload_related,
+)
+from .models import Order, OrderDailyStats, OrderIntake, OrderItem
 from products.models import Product
+from .export import EXPORT_FORMATS
+from .services import place_order, place_orders, set_order_status
+
+ORDERS_BATCH_MAX_SIZE = 500
+# Период отчета о продажах по умолчанию и наибольший допустимый, в днях.
+ORDERS_STATS_DEFAULT_DAYS = 30
+ORDERS_STATS_MAX_DAYS = 366
+# Поля Order.objects.values(), из которых OrderReadSerializer строит ответ.
+ORDER_READ_FIELDS = ("id", "user_id", "status", "created_at", "total_price")
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    product = BulkPrimaryKeyRelatedField(queryset=Product.objects.all())
 
     class Meta:
         model = OrderItem
         fields = ["product", "quantity"]
+        list_serializer_class = BulkRelatedListSerializer
 
     def validate_quantity(self, value):
         if value <= 0:
@@ -26,37 +47,234 @@ class OrderSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         items_data = validated_data.pop("items")
+        return place_order(items_data, **validated_data)
 
-        # Создаем сам заказ без позиций
-        order = Order.objects.create(**validated_data)
 
-        total_price = 0
+class OrderReadListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        return self.child.represent_many(list(data))
 
-        for item_data in items_data:
-            product = item_data["product"]
-            quantity = item_data["quantity"]
 
-            if product.stock < quantity:
-                order.delete()
-                raise serializers.ValidationError(
-                    f"На складе недостаточно товара: {product.name}."
-                )
+class OrderReadSerializer(OrderSerializer):
+    """
+    Быстрое чтение заказов для list и retrieve.
 
-            product.stock -= quantity
-            product.save()
+    Принимает словари из Order.objects.values(*ORDER_READ_FIELDS), позиции
+    всех заказов страницы читает одним values_list и собирает ответ без
+    механики полей DRF. Формат ответа и схема те же, что у OrderSerializer.
+    """
 
-            OrderItem.objects.create(
-                order=order, product=product, quantity=quantity, price=product.price
-            )
-            total_price += product.price * quantity
+    class Meta(OrderSerializer.Meta):
+        list_serializer_class = OrderReadListSerializer
+
+    def to_representation(self, instance):
+        return self.represent_many([instance])[0]
+
+    def represent_many(self, orders):
+        created_at = self.fields["created_at"].to_representation
+        total_price = self.fields["total_price"].to_representation
+
+        items = defaultdict(list)
+        for order_id, product_id, quantity in (
+            OrderItem.objects.filter(order_id__in=[order["id"] for order in orders])
+            .order_by("pk")
+            .values_list("order_id", "product_id", "quantity")
+        ):
+            items[order_id].append({"product": product_id, "quantity": quantity})
+
+        return [
+            {
+                "id": order["id"],
+                "user": order["user_id"],
+                "status": order["status"],
+                "created_at": created_at(order["created_at"]),
+                "items": items[order["id"]],
+                "total_price": total_price(order["total_price"]),
+            }
+            for order in orders
+        ]
+
+
+def create_orders(payloads, order_fields, atomic=True, context=None):
+    """
+    Валидирует и создает заказы из сырых данных запросов за один проход.
+
+    payloads - данные OrderSerializer, order_fields - поля заказа для каждого
+    из них (например, пользователь). Возвращает список той же длины: Order,
+    словарь ошибок или None для корзины, не созданной из-за atomic=True.
+    """
+    context = {} if context is None else context
+    preload_related(OrderSerializer(context=context), payloads)
 
-        order.total_price = total_price
-        order.save()
+    results = [None] * len(payloads)
+    baskets = []
+    for index, payload in enumerate(payloads):
+        serializer = OrderSerializer(data=payload, context=context)
+        if serializer.is_valid():
+            baskets.append((index, serializer.validated_data["items"]))
+        else:
+            results[index] = serializer.errors
 
-        return order
+    if atomic and len(baskets) < len(payloads):
+        return results
+
+    placed = place_orders(
+        [(items, order_fields[index]) for index, items in baskets],
+        atomic=atomic,
+    )
+    for (index, _), result in zip(baskets, placed):
+        if isinstance(result, serializers.ValidationError):
+            result = serializers.as_serializer_error(result)
+        results[index] = result
+    return results
+
+
+class OrderBatchSerializer(serializers.Serializer):
+    """
+    Пакет заказов одного пользователя.
+
+    Все заказы валидируются вместе (товары загружаются одним запросом) и
+    создаются одним проходом резервирования. При atomic=False корзины, для
+    которых не хватило товара или не прошла валидация, отклоняются по
+    отдельности, остальные создаются.
+    """
+
+    orders = serializers.ListField(
+        child=serializers.DictField(), min_length=1, max_length=ORDERS_BATCH_MAX_SIZE
+    )
+    atomic = serializers.BooleanField(default=True)
+
+    def create(self, validated_data):
+        return create_orders(
+            validated_data["orders"],
+            [{"user": validated_data["user"]}] * len(validated_data["orders"]),
+            atomic=validated_data["atomic"],
+            context=self.context,
+        )
+
+    @property
+    def created_orders(self):
+        return [result for result in self.instance if isinstance(result, Order)]
+
+    def to_representation(self, instance):
+        prefetch_related_objects(self.created_orders, "items")
+        return {
+            "results": [
+                self.result_representation(index, result)
+                for index, result in enumerate(instance)
+            ]
+        }
+
+    def result_representation(self, index, result):
+        if isinstance(result, Order):
+            return {
+                "index": index,
+                "status": "created",
+                "order": OrderSerializer(result, context=self.context).data,
+            }
+        if result is None:
+            return {"index": index, "status": "skipped"}
+        return {"index": index, "status": "rejected", "errors": result}
+
+
+class OrderIntakeSerializer(serializers.ModelSerializer):
+    order = OrderSerializer(read_only=True)
+    status_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = OrderIntake
+        fields = [
+            "id",
+            "status",
+            "order",
+            "errors",
+            "created_at",
+            "processed_at",
+            "status_url",
+        ]
+        read_only_fields = fields
+
+    def get_status_url(self, intake) -> str:
+        return reverse(
+            "order-intake",
+            kwargs={"handle": intake.pk},
+            request=self.context.get("request"),
+        )
 
 
 class AdminOrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ["status"]
+
+    def update(self, instance, validated_data):
+        if "status" in validated_data:
+            set_order_status(instance, validated_data["status"])
+        return instance
+
+
+class OrderExportSerializer(serializers.Serializer):
+    file_format = serializers.ChoiceField(choices=EXPORT_FORMATS, default="csv")
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+    created_from = serializers.DateField(required=False)
+    created_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get("created_from") and attrs.get("created_to"):
+            if attrs["created_from"] > attrs["created_to"]:
+                raise serializers.ValidationError(
+                    {"created_to": ["Конец периода раньше начала."]}
+                )
+        return attrs
+
+
+class OrderStatsSerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    top_products = serializers.IntegerField(min_value=0, max_value=100, default=10)
+
+    def validate(self, attrs):
+        date_to = attrs.setdefault("date_to", timezone.localdate())
+        date_from = attrs.setdefault(
+            "date_from",
+            date_to - datetime.timedelta(days=ORDERS_STATS_DEFAULT_DAYS - 1),
+        )
+        if date_from > date_to:
+            raise serializers.ValidationError(
+                {"date_to": ["Конец периода раньше начала."]}
+            )
+        if (date_to - date_from).days >= ORDERS_STATS_MAX_DAYS:
+            raise serializers.ValidationError(
+                {"date_from": [f"Период не длиннее {ORDERS_STATS_MAX_DAYS} дней."]}
+            )
+        return attrs
+
+
+class OrderStatsTotalSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    orders = serializers.IntegerField(source="order_count")
+    revenue = serializers.DecimalField(
+        max_digits=14, decimal_places=2, source="revenue_total"
+    )
+
+
+class OrderDailyStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderDailyStats
+        fields = ["day", "status", "orders", "revenue"]
+
+
+class ProductSalesSerializer(serializers.Serializer):
+    product = serializers.IntegerField(source="product_id")
+    units = serializers.IntegerField(source="unit_count")
+    revenue = serializers.DecimalField(
+        max_digits=14, decimal_places=2, source="revenue_total"
+    )
+
+
+class OrderStatsReportSerializer(serializers.Serializer):
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    totals = OrderStatsTotalSerializer(many=True)
+    days = OrderDailyStatsSerializer(many=True)
+    products = ProductSalesSerializer(many=True)
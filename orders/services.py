@@ -0,0 +1,213 @@
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+from rest_framework import serializers
+
+from products.cache import bump_catalog_version
+from products.inventory import return_to_shards, take_from_shards
+from products.models import Product
+from .models import Order, OrderItem
+from .rollups import record_orders, record_status_change
+
+
+def merge_items(items):
+    """
+    Сворачивает позиции корзины в {product_id: quantity}.
+
+    Один товар может встречаться в корзине несколько раз, а в заказе
+    (order, product) уникальны, поэтому количества суммируются.
+    """
+    quantities = {}
+    for item in items:
+        product_id = item["product"].pk
+        quantities[product_id] = quantities.get(product_id, 0) + item["quantity"]
+    return quantities
+
+
+class StockReservation:
+    """
+    Резервирование остатков за фиксированное число запросов.
+
+    Все затронутые товары блокируются одним SELECT ... FOR UPDATE в порядке id,
+    поэтому параллельные резервации не могут взаимно заблокироваться.
+    Проверка остатков идет в памяти, а списание выполняется одним UPDATE.
+
+    Шардированные товары (stock_shards > 0) строку товара не блокируют:
+    количество сразу списывается с одного из шардов остатка, поэтому заказы
+    на горячий товар не ждут друг друга на одной блокировке.
+    """
+
+    def __init__(self, products):
+        products = {product.pk: product for product in products}
+        self.sharded = {
+            product_id
+            for product_id, product in products.items()
+            if product.stock_shards
+        }
+        self.products = {
+            product_id: products[product_id] for product_id in self.sharded
+        }
+        self.products.update(
+            (product.pk, product)
+            for product in Product.objects.filter(pk__in=products.keys() - self.sharded)
+            .only("id", "name", "price", "stock", "stock_shards")
+            .order_by("pk")
+            .select_for_update()
+        )
+        self.reserved = {}
+        self.taken = []
+
+    def reserve(self, quantities):
+        for product_id, quantity in quantities.items():
+            product = self.products.get(product_id)
+            if product is None:
+                raise serializers.ValidationError(
+                    f"Товар #{product_id} больше не существует."
+                )
+            if product_id in self.sharded:
+                continue
+            if product.stock - self.reserved.get(product_id, 0) < quantity:
+                raise serializers.ValidationError(
+                    f"На складе недостаточно товара: {product.name}."
+                )
+
+        taken = []
+        for product_id in sorted(quantities.keys() & self.sharded):
+            shards = take_from_shards(product_id, quantities[product_id])
+            if shards is None:
+                return_to_shards(taken)
+                raise serializers.ValidationError(
+                    f"На складе недостаточно товара: {self.products[product_id].name}."
+                )
+            taken.extend(shards)
+        self.taken.extend(taken)
+
+        for product_id, quantity in quantities.items():
+            if product_id not in self.sharded:
+                self.reserved[product_id] = self.reserved.get(product_id, 0) + quantity
+
+    def release(self):
+        """Возвращает на шарды все, что уже было с них списано."""
+        return_to_shards(self.taken)
+        self.taken = []
+        self.reserved = {}
+
+    def commit(self):
+        # Одна смена версии каталога на все корзины пакета.
+        if self.taken or self.reserved:
+            transaction.on_commit(bump_catalog_version)
+        if not self.reserved:
+            return
+
+        Product.objects.filter(pk__in=self.reserved).update(
+            stock=Case(
+                *[
+                    When(pk=product_id, then=F("stock") - quantity)
+                    for product_id, quantity in self.reserved.items()
+                ]
+            ),
+            updated_at=timezone.now(),
+        )
+
+
+def _order_total(products, quantities):
+    return sum(
+        products[product_id].price * quantity
+        for product_id, quantity in quantities.items()
+    )
+
+
+@transaction.atomic(savepoint=False)
+def place_orders(baskets, atomic=True):
+    """
+    Создает заказы для списка корзин [(items, order_fields), ...] за один проход.
+
+    Товары всех корзин блокируются одним запросом, заказы и позиции
+    вставляются двумя bulk_create, изменения продаж одной вставкой пишутся
+    в журнал SalesDelta; в агрегаты его позже переносит fold_rollups.
+    Возвращает список той же длины: Order для принятой корзины или
+    ValidationError для отклоненной. При atomic=True одна отклоненная
+    корзина отменяет весь пакет и в базу ничего не пишется.
+    """
+    merged = [merge_items(items) for items, _ in baskets]
+
+    reservation = StockReservation(
+        {item["product"] for items, _ in baskets for item in items}
+    )
+    results = []
+    for quantities in merged:
+        try:
+            reservation.reserve(quantities)
+        except serializers.ValidationError as exc:
+            results.append(exc)
+        else:
+            results.append(None)
+
+    rejected = any(result is not None for result in results)
+    if atomic and rejected:
+        reservation.release()
+        return results
+
+    reservation.commit()
+
+    products = reservation.products
+    accepted = [index for index, result in enumerate(results) if result is None]
+    orders = Order.objects.bulk_create(
+        [
+            Order(
+                total_price=_order_total(products, merged[index]),
+                **baskets[index][1],
+            )
+            for index in accepted
+        ]
+    )
+    items = OrderItem.objects.bulk_create(
+        [
+            OrderItem(
+                order=order,
+                product=products[product_id],
+                quantity=quantity,
+                price=products[product_id].price,
+            )
+            for index, order in zip(accepted, orders)
+            for product_id, quantity in merged[index].items()
+        ]
+    )
+    record_orders(orders, items)
+
+    for index, order in zip(accepted, orders):
+        results[index] = order
+    return results
+
+
+def place_order(items, **order_fields):
+    """
+    Создает заказ с позициями, списывая остатки.
+
+    Число запросов не зависит от количества позиций: блокировка товаров,
+    списание, вставка заказа, одна bulk-вставка позиций и одна вставка
+    в журнал продаж SalesDelta.
+    """
+    (result,) = place_orders([(items, order_fields)])
+    if isinstance(result, serializers.ValidationError):
+        raise result
+    return result
+
+
+@transaction.atomic
+def set_order_status(order, status):
+    """
+    Меняет статус заказа и переносит его между агрегатами продаж.
+
+    Прежний статус читается под блокировкой строки заказа, поэтому
+    параллельные смены статуса не учитываются в агрегатах дважды.
+    """
+    previous_status = (
+        Order.objects.select_for_update()
+        .values_list("status", flat=True)
+        .get(pk=order.pk)
+    )
+    order.status = status
+    order.save(update_fields=["status", "updated_at"])
+    record_status_change(order, previous_status)
+    return order
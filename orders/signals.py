@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Order, OrderItem
+from .rollups import record_deletion
+
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def touch_order(sender, instance, origin=None, **kwargs):
+    # Позиции удаляются каскадом вместе с заказом, обновлять его незачем.
+    if isinstance(origin, Order):
+        return
+    Order.objects.filter(pk=instance.order_id).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Order)
+def forget_order(sender, instance, **kwargs):
+    # pre_delete приходит до каскадного удаления позиций и в той же транзакции.
+    record_deletion(instance)
@@ -1,18 +1,132 @@
+import datetime
+import logging
+import time
+
 from celery import shared_task
-from django.core.mail import send_mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
 
+from . import outbox
 
-@shared_task
-def send_order_confirmation_email(order_id, recipient_email):
+logger = logging.getLogger(__name__)
+
+
+def build_confirmation_email(order_id, recipient_email):
     subject = f"Подтверждение заказа #{order_id}"
     message = f"Здравствуйте!\n\nВаш заказ №{order_id} успешно оформлен.\n"
     from_email = settings.EMAIL_HOST_USER or "noreply@nextshop.com"
 
-    send_mail(
-        subject,
-        message,
-        from_email,
-        [recipient_email],
-        fail_silently=False,
+    return EmailMessage(subject, message, from_email, [recipient_email])
+
+
+@shared_task
+def send_order_confirmation_email(order_id, recipient_email):
+    send_order_confirmation_emails([[order_id, recipient_email]])
+
+
+@shared_task(bind=True)
+def send_order_confirmation_emails(self, orders, attempt=0):
+    """
+    Отправляет подтверждения для списка [order_id, email] одним соединением.
+
+    Письма уходят по одному, не чаще ORDERS_EMAIL_RATE_LIMIT в секунду.
+    Ошибка одного письма не прерывает пакет: после нее соединение
+    переоткрывается, а неотправленные письма ставятся в повтор отдельной
+    задачей с растущей задержкой, до ORDERS_EMAIL_MAX_RETRIES раз.
+    """
+    rate_limit = settings.ORDERS_EMAIL_RATE_LIMIT
+    interval = 1 / rate_limit if rate_limit else 0
+
+    failed = []
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception:
+        logger.exception("Не удалось подключиться к почтовому серверу")
+        failed = list(orders)
+    else:
+        try:
+            for index, (order_id, recipient_email) in enumerate(orders):
+                started = time.monotonic()
+                try:
+                    connection.send_messages(
+                        [build_confirmation_email(order_id, recipient_email)]
+                    )
+                except Exception:
+                    logger.exception(
+                        "Не удалось отправить подтверждение заказа #%s", order_id
+                    )
+                    failed.append([order_id, recipient_email])
+                    try:
+                        connection.close()
+                        connection.open()
+                    except Exception:
+                        logger.exception(
+                            "Не удалось переподключиться к почтовому серверу"
+                        )
+                        failed.extend(orders[index + 1 :])
+                        break
+
+                pause = interval - (time.monotonic() - started)
+                if pause > 0:
+                    time.sleep(pause)
+        finally:
+            connection.close()
+
+    if not failed:
+        return
+    if attempt >= settings.ORDERS_EMAIL_MAX_RETRIES:
+        logger.error("Подтверждения заказов не отправлены: %s", failed)
+        return
+    self.apply_async(
+        kwargs={"orders": failed, "attempt": attempt + 1},
+        countdown=settings.ORDERS_EMAIL_RETRY_DELAY * 2**attempt,
+    )
+
+
+outbox.register_mergeable(
+    send_order_confirmation_emails,
+    "orders",
+    max_size=lambda: settings.ORDERS_EMAIL_BATCH_SIZE,
+)
+
+
+@shared_task
+def drain_order_intake():
+    """Разбирает очередь асинхронных заказов пакетами до опустошения."""
+    from .intake import INTAKE_DRAIN_SCHEDULED, process_intake_batch
+
+    cache.delete(INTAKE_DRAIN_SCHEDULED)
+    while process_intake_batch():
+        pass
+
+
+@shared_task
+def relay_outbox():
+    """Отправляет брокеру все накопившиеся сообщения outbox."""
+    while outbox.relay_outbox_batch():
+        pass
+
+
+@shared_task
+def purge_outbox():
+    outbox.purge_outbox()
+
+
+@shared_task
+def fold_order_rollups():
+    """Переносит накопленные изменения агрегатов продаж в таблицы агрегатов."""
+    from .rollups import fold_rollups
+
+    return fold_rollups()
+
+
+@shared_task
+def rebuild_order_rollups(date_from, date_to):
+    """Пересчитывает агрегаты продаж за период (даты в ISO-формате)."""
+    from .rollups import rebuild_rollups
+
+    return rebuild_rollups(
+        datetime.date.fromisoformat(date_from), datetime.date.fromisoformat(date_to)
     )
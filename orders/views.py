@@ -1,29 +1,54 @@
-from rest_framework import viewsets
+from rest_framework import status, viewsets
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db import transaction
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import OrderingFilter
-from .models import Order
-from .serializers import OrderSerializer, AdminOrderSerializer
-from drf_spectacular.utils import extend_schema
-from .tasks import send_order_confirmation_email
+from rest_framework.generics import get_object_or_404
+from core.mixins import ConditionalGetMixin
+from core.pagination import KeysetPagination
+from .export import EXPORT_CONTENT_TYPES, export_lines
+from .idempotency import IDEMPOTENCY_HEADER, idempotent
+from .intake import submit_order_intake
+from .models import Order, OrderIntake
+from .outbox import enqueue
+from .rollups import sales_report
+from .serializers import (
+    OrderSerializer,
+    AdminOrderSerializer,
+    OrderBatchSerializer,
+    OrderIntakeSerializer,
+    OrderExportSerializer,
+    OrderReadSerializer,
+    OrderStatsReportSerializer,
+    OrderStatsSerializer,
+    ORDER_READ_FIELDS,
+)
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from .tasks import send_order_confirmation_emails
 
 
 @extend_schema(tags=["Orders"])
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ["status"]
     ordering_fields = ["created_at", "total_price"]
+    ordering = ["-created_at"]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         user = self.request.user
-        queryset = (
-            Order.objects.all()
-            .select_related("user")
-            .prefetch_related("items__product")
-        )
+        if self.action in ["list", "retrieve"]:
+            queryset = Order.objects.values(*ORDER_READ_FIELDS)
+        else:
+            queryset = (
+                Order.objects.all()
+                .select_related("user")
+                .prefetch_related("items__product")
+            )
 
         # ДЛЯ DRF-SPECTACULAR
         if getattr(self, "swagger_fake_view", False):
@@ -34,24 +59,106 @@ class OrderViewSet(viewsets.ModelViewSet):
 
         return queryset.filter(user=user)
 
+    def use_conditional_list(self):
+        # Список администратора охватывает всю таблицу: MAX/COUNT по ней стоил бы
+        # дороже самой страницы, которую keyset-пагинация читает по индексу.
+        return not self.request.user.is_staff
+
     def get_serializer_class(self):
         if (
             self.action in ["set_status", "update", "partial_update"]
             and self.request.user.is_staff
         ):
             return AdminOrderSerializer
+        if self.action in ["list", "retrieve"]:
+            return OrderReadSerializer
+        if self.action == "batch":
+            return OrderBatchSerializer
+        if self.action == "intake":
+            return OrderIntakeSerializer
+        if self.action == "export":
+            return OrderExportSerializer
+        if self.action == "stats":
+            return OrderStatsSerializer
         return OrderSerializer
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                IDEMPOTENCY_HEADER, OpenApiTypes.STR, OpenApiParameter.HEADER
+            ),
+            OpenApiParameter(
+                "Prefer",
+                OpenApiTypes.STR,
+                OpenApiParameter.HEADER,
+                description="respond-async: принять заказ в очередь и ответить 202.",
+            ),
+        ],
+        responses={201: OrderSerializer, 202: OrderIntakeSerializer},
+    )
+    @idempotent
     @transaction.atomic
     def create(self, request, *args, **kwargs):
+        if "respond-async" in request.headers.get("Prefer", ""):
+            return self.create_async(request)
         return super().create(request, *args, **kwargs)
 
+    def create_async(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        intake = submit_order_intake(
+            request.user,
+            {
+                "items": [
+                    {"product": item["product"].pk, "quantity": item["quantity"]}
+                    for item in serializer.validated_data["items"]
+                ]
+            },
+        )
+        data = OrderIntakeSerializer(intake, context=self.get_serializer_context()).data
+        return Response(
+            data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": data["status_url"]},
+        )
+
     def perform_create(self, serializer):
         order = serializer.save(user=self.request.user)
-        send_order_confirmation_email.delay(
-            order_id=order.id, recipient_email=order.user.email
+        enqueue(send_order_confirmation_emails, orders=[[order.id, order.user.email]])
+
+    @extend_schema(responses={201: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT})
+    @action(detail=False, methods=["post"])
+    @idempotent
+    @transaction.atomic
+    def batch(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=request.user)
+
+        orders = serializer.created_orders
+        if orders:
+            enqueue(
+                send_order_confirmation_emails,
+                orders=[[order.id, request.user.email] for order in orders],
+            )
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if orders else status.HTTP_400_BAD_REQUEST,
         )
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("handle", OpenApiTypes.UUID, OpenApiParameter.PATH)
+        ]
+    )
+    @action(detail=False, methods=["get"], url_path=r"intake/(?P<handle>[^/.]+)")
+    def intake(self, request, handle=None):
+        intakes = OrderIntake.objects.select_related("order")
+        if not request.user.is_staff:
+            intakes = intakes.filter(user=request.user)
+        intake = get_object_or_404(intakes, pk=handle)
+        return Response(self.get_serializer(intake).data)
+
     @action(detail=True, methods=["patch"], permission_classes=[IsAdminUser])
     def set_status(self, request, pk=None):
         order = self.get_object()
@@ -62,9 +169,54 @@ class OrderViewSet(viewsets.ModelViewSet):
             {"status": f"Статус заказа #{order.id} изменен на '{order.status}'."}
         )
 
+    @extend_schema(
+        parameters=[OrderExportSerializer],
+        responses={(200, "text/csv"): OpenApiTypes.STR},
+    )
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        filters = dict(serializer.validated_data)
+        file_format = filters.pop("file_format")
+
+        response = StreamingHttpResponse(
+            export_lines(file_format, **filters),
+            content_type=EXPORT_CONTENT_TYPES[file_format],
+        )
+        response["Content-Disposition"] = f'attachment; filename="orders.{file_format}"'
+        return response
+
+    @extend_schema(
+        parameters=[OrderStatsSerializer],
+        responses=OrderStatsReportSerializer,
+    )
+    @action(detail=False, methods=["get"])
+    def stats(self, request):
+        # Только агрегаты и журнал продаж: отчет не сканирует заказы и не
+        # берет блокировок, которые мешали бы оформлению.
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        report = sales_report(**serializer.validated_data)
+        return Response(OrderStatsReportSerializer(report).data)
+
     def get_permissions(self):
-        if self.action in ["set_status", "update", "partial_update", "destroy"]:
+        if self.action in [
+            "set_status",
+            "update",
+            "partial_update",
+            "destroy",
+            "export",
+            "stats",
+        ]:
             self.permission_classes = [IsAdminUser]
-        elif self.action in ["create", "list", "retrieve"]:
+        elif self.action in ["create", "batch", "intake", "list", "retrieve"]:
             self.permission_classes = [IsAuthenticated]
         return super().get_permissions()
+
+    def get_throttles(self):
+        # Оформление заказов ограничивается отдельно от чтения; опрос статуса
+        # заявки (intake) - это чтение, его лимит не должен мешать оформлению.
+        if self.action in ["create", "batch"]:
+            self.throttle_scope = "orders"
+        return super().get_throttles()
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.mixins import weak_etag
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_HITS_KEY = "catalog:stats:hits"
+CATALOG_MISSES_KEY = "catalog:stats:misses"
+
+
+def _incr(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        return cache.incr(key)
+
+
+def catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Версия от времени, а не с единицы: после вытеснения ключа
+        # старые записи кэша не должны снова стать актуальными.
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Делает все закэшированные страницы и карточки каталога устаревшими."""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+def catalog_cache_key(kind, request):
+    url = hashlib.sha256(request.build_absolute_uri().encode()).hexdigest()
+    # entry: записи хранят данные вместе с ETag (см. catalog_entry).
+    return f"catalog:{catalog_version()}:entry:{kind}:{url}"
+
+
+def get_or_compute(key, compute):
+    """
+    Возвращает значение из кэша или вычисляет его ровно в одном воркере.
+
+    Остальные воркеры, пришедшие за тем же ключом, ждут результат до
+    CATALOG_CACHE_LOCK_TIMEOUT секунд и только потом считают сами.
+    """
+    value = cache.get(key)
+    if value is not None:
+        _incr(CATALOG_HITS_KEY)
+        return value
+    _incr(CATALOG_MISSES_KEY)
+
+    lock_key = f"{key}:lock"
+    timeout = settings.CATALOG_CACHE_LOCK_TIMEOUT
+    if cache.add(lock_key, True, timeout):
+        try:
+            value = compute()
+            cache.set(key, value, settings.CATALOG_CACHE_TTL)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return compute()
+
+
+def catalog_cache_stats():
+    hits = cache.get(CATALOG_HITS_KEY, 0)
+    misses = cache.get(CATALOG_MISSES_KEY, 0)
+    return {
+        "version": catalog_version(),
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+    }
+
+
+def catalog_entry(data):
+    """Запись кэша: данные ответа и weak ETag, посчитанный по ним же."""
+    body = json.dumps(data, cls=JSONEncoder, sort_keys=True)
+    return {"data": data, "etag": weak_etag(body)}
+
+
+class CatalogCacheMixin:
+    """
+    Кэширует list и retrieve по версии каталога, которая меняется
+    при любом изменении товаров или остатков.
+
+    ETag хранится в записи кэша рядом с данными, поэтому он меняется ровно
+    тогда, когда меняется отданный ответ, в том числе если запись истекла
+    по CATALOG_CACHE_TTL и пересчитана без смены версии.
+    """
+
+    catalog_cache_kinds = {"list": "list", "retrieve": "detail"}
+
+    def get_catalog_entry(self, request, *args, **kwargs):
+        # Одна запись на запрос: ETag и тело ответа берутся из нее.
+        if getattr(self, "_catalog_entry", None) is None:
+            compute = getattr(super(CatalogCacheMixin, self), self.action)
+            self._catalog_entry = get_or_compute(
+                catalog_cache_key(self.catalog_cache_kinds[self.action], request),
+                lambda: catalog_entry(compute(request, *args, **kwargs).data),
+            )
+        return self._catalog_entry
+
+    def list(self, request, *args, **kwargs):
+        return Response(self.get_catalog_entry(request, *args, **kwargs)["data"])
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.get_catalog_entry(request, *args, **kwargs)["data"])
@@ -0,0 +1,84 @@
+import re
+from functools import cache
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Cast
+from rest_framework.filters import OrderingFilter, SearchFilter
+
+# Конфигурация должна совпадать с триггером products_product_search_vector.
+SEARCH_CONFIG = "russian"
+# Ранг делится на 1 + log(длины названия): короткие точные названия выше.
+SEARCH_RANK_NORMALIZATION = 1
+
+
+@cache
+def trigram_search_enabled():
+    """Установлено ли pg_trgm (см. миграцию products 0003)."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def prefix_search_query(term):
+    """tsquery, в котором каждое слово запроса может быть началом слова в названии."""
+    words = re.findall(r"\w+", term)
+    if not words:
+        return None
+    return SearchQuery(
+        " & ".join(f"{word}:*" for word in words),
+        config=SEARCH_CONFIG,
+        search_type="raw",
+    )
+
+
+def search_products(queryset, term):
+    """Отбирает товары по term и добавляет аннотацию search_rank."""
+    query = prefix_search_query(term)
+    if query is None:
+        return queryset
+
+    rank = SearchRank(
+        F("search_vector"),
+        query,
+        normalization=Value(SEARCH_RANK_NORMALIZATION),
+    )
+    condition = Q(search_vector=query)
+    if trigram_search_enabled():
+        rank += TrigramWordSimilarity(term, "name")
+        condition |= Q(name__trigram_word_similar=term)
+    # ts_rank возвращает real; курсор KeysetPagination сравнивает ранг как
+    # double precision, и без приведения равные ранги на границе страницы
+    # не совпадали бы и терялись.
+    rank = Cast(rank, FloatField())
+    return queryset.annotate(search_rank=rank).filter(condition)
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    Поиск товаров по ?search=.
+
+    Находит товары по полнотекстовому индексу (с префиксами слов) и, если
+    установлено pg_trgm, по триграммам названия, что прощает опечатки.
+    Оба условия обслуживаются GIN-индексами. Без явного ?ordering=
+    результаты идут по убыванию релевантности.
+    """
+
+    def get_search_term(self, request):
+        return " ".join(self.get_search_terms(request))
+
+    def filter_queryset(self, request, queryset, view):
+        return search_products(queryset, self.get_search_term(request))
+
+    def get_ordering(self, request, queryset, view):
+        ordering_filter = OrderingFilter()
+        if prefix_search_query(self.get_search_term(request)) and (
+            ordering_filter.ordering_param not in request.query_params
+        ):
+            return ["-search_rank"]
+        return ordering_filter.get_ordering(request, queryset, view)
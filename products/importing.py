@@ -0,0 +1,144 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from .cache import bump_catalog_version
+from .models import Product
+
+IMPORT_FORMATS = ("csv", "ndjson")
+IMPORT_FIELDS = ("sku", "name", "price", "stock")
+# Сколько отклоненных строк возвращать подробно, остальные только считаются.
+MAX_REPORTED_REJECTS = 100
+
+CREATE_STAGING_SQL = """
+    CREATE TEMPORARY TABLE product_import (
+        line integer,
+        sku varchar(64),
+        name varchar(255),
+        price numeric(10, 2),
+        stock integer
+    ) ON COMMIT DROP
+"""
+COPY_SQL = (
+    "COPY product_import (line, sku, name, price, stock) FROM STDIN WITH (FORMAT csv)"
+)
+# Остаток шардированных товаров хранится в шардах, импорт его не трогает.
+UPSERT_SQL = f"""
+    WITH upserted AS (
+        INSERT INTO {Product._meta.db_table}
+            (sku, name, price, stock, stock_shards, created_at, updated_at)
+        SELECT DISTINCT ON (sku) sku, name, price, stock, 0, now(), now()
+        FROM product_import
+        ORDER BY sku, line DESC
+        ON CONFLICT (sku) DO UPDATE SET
+            name = EXCLUDED.name,
+            price = EXCLUDED.price,
+            stock = CASE
+                WHEN {Product._meta.db_table}.stock_shards > 0
+                THEN {Product._meta.db_table}.stock
+                ELSE EXCLUDED.stock
+            END,
+            updated_at = EXCLUDED.updated_at
+        RETURNING xmax = 0 AS created
+    )
+    SELECT count(*) FILTER (WHERE created), count(*) FROM upserted
+"""
+
+
+def read_rows(stream, file_format):
+    """Построчно читает CSV с заголовком или NDJSON из текстового потока."""
+    if file_format == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+def clean_row(row):
+    """Возвращает значения IMPORT_FIELDS или бросает ValidationError по полям."""
+    if not isinstance(row, dict):
+        raise ValidationError({"row": ["Строка не является объектом."]})
+    values, errors = [], {}
+    for name in IMPORT_FIELDS:
+        field = Product._meta.get_field(name)
+        raw = row.get(name)
+        if raw in (None, ""):
+            errors[name] = ["Обязательное поле."]
+            continue
+        try:
+            values.append(field.clean(raw, None))
+        except ValidationError as error:
+            errors[name] = error.messages
+    if errors:
+        raise ValidationError(errors)
+    return values
+
+
+@transaction.atomic
+def import_products(stream, file_format, chunk_size=None):
+    """
+    Загружает товары из потока и создает или обновляет их по sku.
+
+    Файл читается и проверяется порциями по PRODUCTS_IMPORT_CHUNK_SIZE строк,
+    каждая порция уходит через COPY во временную таблицу, после чего все
+    товары записываются одним INSERT ... ON CONFLICT. Если sku повторяется,
+    побеждает последняя строка. Возвращает отчет с числом строк, ошибками
+    и временем этапов.
+    """
+    chunk_size = chunk_size or settings.PRODUCTS_IMPORT_CHUNK_SIZE
+    started = time.perf_counter()
+    timings = {"validate": 0.0, "copy": 0.0, "upsert": 0.0}
+    rows = rejected = 0
+    rejects = []
+
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_STAGING_SQL)
+        numbered = enumerate(read_rows(stream, file_format), start=1)
+        while chunk := list(islice(numbered, chunk_size)):
+            stage_started = time.perf_counter()
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for line, row in chunk:
+                rows += 1
+                try:
+                    writer.writerow([line, *clean_row(row)])
+                except ValidationError as error:
+                    rejected += 1
+                    if len(rejects) < MAX_REPORTED_REJECTS:
+                        rejects.append({"line": line, "errors": error.message_dict})
+            timings["validate"] += time.perf_counter() - stage_started
+
+            stage_started = time.perf_counter()
+            buffer.seek(0)
+            cursor.copy_expert(COPY_SQL, buffer)
+            timings["copy"] += time.perf_counter() - stage_started
+
+        stage_started = time.perf_counter()
+        cursor.execute(UPSERT_SQL)
+        created, upserted = cursor.fetchone()
+        timings["upsert"] = time.perf_counter() - stage_started
+
+    if upserted:
+        transaction.on_commit(bump_catalog_version)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": rows,
+        "created": created,
+        "updated": upserted - created,
+        "rejected": rejected,
+        "rejects": rejects,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed) if elapsed else rows,
+        "timings": {stage: round(value, 3) for stage, value in timings.items()},
+    }
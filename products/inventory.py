@@ -0,0 +1,232 @@
+import time
+
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .models import Product, ProductStockShard
+
+# Один шард с достаточным остатком, уже занятые другими транзакциями
+# шарды пропускаются, поэтому заказы на горячий товар не ждут друг друга.
+TAKE_FROM_ONE_SHARD_SQL = f"""
+    UPDATE {ProductStockShard._meta.db_table} SET stock = stock - %s
+    WHERE id = (
+        SELECT id FROM {ProductStockShard._meta.db_table}
+        WHERE product_id = %s AND stock >= %s
+        ORDER BY random()
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id
+"""
+
+
+# Сколько раз сборка с нескольких шардов ждет шарды, занятые другими
+# транзакциями, прежде чем отказать.
+SHARD_TAKE_ATTEMPTS = 5
+SHARD_TAKE_RETRY_DELAY = 0.02
+
+# Границы столбцов: итог изменения за ними отклоняется, а не дает DataError.
+STOCK_MAX = 2**31 - 1
+_price = Product._meta.get_field("price")
+PRICE_LIMIT = 10 ** (_price.max_digits - _price.decimal_places)
+
+
+def shard_sizes(total, shards):
+    """Делит остаток на shards почти равных частей."""
+    size, rest = divmod(total, shards)
+    return [size + (1 if number < rest else 0) for number in range(shards)]
+
+
+@transaction.atomic
+def rebalance_stock(product, total=None, shards=None, delta=0, bump_version=True):
+    """
+    Перераспределяет остаток товара по шардам.
+
+    total и shards по умолчанию берутся текущие, delta прибавляется к total
+    уже под блокировкой. При shards=0 остаток сворачивается обратно в
+    Product.stock. Отрицательный итог или итог больше STOCK_MAX дает
+    ValueError. bump_version=False - версию каталога меняет вызывающий.
+    """
+    locked = Product.objects.select_for_update().get(pk=product.pk)
+    rows = list(
+        ProductStockShard.objects.filter(product=locked)
+        .order_by("pk")
+        .select_for_update()
+    )
+    if total is None:
+        total = sum(row.stock for row in rows) if locked.stock_shards else locked.stock
+    total += delta
+    if total < 0:
+        raise ValueError("Остаток не может быть отрицательным.")
+    if total > STOCK_MAX:
+        raise ValueError("Остаток слишком большой.")
+    if shards is None:
+        shards = locked.stock_shards
+
+    ProductStockShard.objects.filter(product=locked).delete()
+    if shards:
+        ProductStockShard.objects.bulk_create(
+            [
+                ProductStockShard(product=locked, number=number, stock=size)
+                for number, size in enumerate(shard_sizes(total, shards))
+            ]
+        )
+
+    product.stock = 0 if shards else total
+    product.stock_shards = shards
+    product.sharded_stock = total if shards else None
+    product.updated_at = timezone.now()
+    Product.objects.filter(pk=product.pk).update(
+        stock=product.stock,
+        stock_shards=product.stock_shards,
+        updated_at=product.updated_at,
+    )
+    if bump_version:
+        transaction.on_commit(bump_catalog_version)
+    return product
+
+
+@transaction.atomic
+def bulk_update_products(items, delta=False):
+    """
+    Меняет остаток и цену многих товаров одним UPDATE ... FROM (VALUES ...).
+
+    items - список {"id", "stock"?, "price"?}; при delta=True значения
+    прибавляются к текущим. Строки сначала блокируются по порядку id, как и
+    при создании заказов, поэтому пакет не взаимоблокируется с ними.
+    Изменение, после которого остаток или цена стали бы отрицательными или
+    не поместились бы в столбец, отклоняется целиком. Остаток шардированных
+    товаров перераспределяется через rebalance_stock; их цена проверяется до
+    этого, чтобы отклоненная строка не меняла и остаток. Версия каталога
+    меняется один раз на пакет. Возвращает {"updated", "missing", "rejected"}.
+    """
+    by_id = {item["id"]: item for item in items}
+    locked = {
+        product.pk: product
+        for product in Product.objects.filter(pk__in=by_id)
+        .order_by("pk")
+        .select_for_update()
+        .only("pk", "stock_shards", "price")
+    }
+    missing = sorted(by_id.keys() - locked.keys())
+
+    rejected = []
+    for product in locked.values():
+        stock, price = by_id[product.pk].get("stock"), by_id[product.pk].get("price")
+        if not product.stock_shards or stock is None:
+            continue
+        # Строка заблокирована, поэтому UPDATE ниже примет ту же цену.
+        if price is not None and not (
+            0 <= (product.price + price if delta else price) < PRICE_LIMIT
+        ):
+            rejected.append(product.pk)
+            continue
+        try:
+            if delta:
+                rebalance_stock(product, delta=stock, bump_version=False)
+            else:
+                rebalance_stock(product, total=stock, bump_version=False)
+        except ValueError:
+            rejected.append(product.pk)
+
+    rows = [by_id[pk] for pk in locked if pk not in rejected]
+    updated = set()
+    if rows:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                bulk_update_sql(len(rows), delta),
+                [
+                    value
+                    for row in rows
+                    for value in (row["id"], row.get("stock"), row.get("price"))
+                ],
+            )
+            updated = {row[0] for row in cursor.fetchall()}
+        transaction.on_commit(bump_catalog_version)
+
+    rejected = sorted(
+        rejected + [row["id"] for row in rows if row["id"] not in updated]
+    )
+    return {"updated": sorted(updated), "missing": missing, "rejected": rejected}
+
+
+def bulk_update_sql(count, delta):
+    table = Product._meta.db_table
+    values = ", ".join(["(%s::bigint, %s::integer, %s::numeric)"] * count)
+    # bigint: сумма двух integer за границей столбца не должна падать в запросе.
+    new_stock = "p.stock::bigint + v.stock" if delta else "v.stock"
+    new_price = "p.price + v.price" if delta else "v.price"
+    return f"""
+        UPDATE {table} AS p SET
+            stock = CASE
+                WHEN v.stock IS NULL OR p.stock_shards > 0 THEN p.stock
+                ELSE {new_stock}
+            END,
+            price = COALESCE({new_price}, p.price),
+            updated_at = now()
+        FROM (VALUES {values}) AS v (id, stock, price)
+        WHERE p.id = v.id
+            AND (
+                v.stock IS NULL OR p.stock_shards > 0
+                OR {new_stock} BETWEEN 0 AND {STOCK_MAX}
+            )
+            AND (
+                v.price IS NULL
+                OR ({new_price} >= 0 AND {new_price} < {PRICE_LIMIT})
+            )
+        RETURNING p.id
+    """
+
+
+def take_from_shards(product_id, quantity):
+    """
+    Списывает quantity с шардов товара и возвращает [(shard_id, quantity), ...].
+
+    Сначала пробует один свободный шард с достаточным остатком. Если такого
+    нет, собирает количество с нескольких шардов. Шарды, занятые другими
+    транзакциями, и здесь пропускаются (SKIP LOCKED), а не ждутся: транзакция
+    пакета заказов уже может держать шард горячего товара после прошлой
+    корзины, и ожидание остальных шардов давало бы взаимную блокировку.
+    Если свободных шардов не хватает, попытка повторяется до
+    SHARD_TAKE_ATTEMPTS раз. Возвращает None, если суммарного остатка не
+    хватает или он так и остался занят. Вызывается внутри транзакции.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(TAKE_FROM_ONE_SHARD_SQL, [quantity, product_id, quantity])
+        row = cursor.fetchone()
+    if row is not None:
+        return [(row[0], quantity)]
+
+    shards = ProductStockShard.objects.filter(product_id=product_id, stock__gt=0)
+    for attempt in range(SHARD_TAKE_ATTEMPTS):
+        total = shards.aggregate(total=Sum("stock"))["total"] or 0
+        if total < quantity:
+            return None
+        rows = list(shards.order_by("pk").select_for_update(skip_locked=True))
+        if sum(row.stock for row in rows) >= quantity:
+            break
+        time.sleep(SHARD_TAKE_RETRY_DELAY * (attempt + 1))
+    else:
+        return None
+
+    taken = []
+    for row in rows:
+        if quantity == 0:
+            break
+        part = min(row.stock, quantity)
+        quantity -= part
+        taken.append((row.pk, part))
+
+    for shard_id, part in taken:
+        ProductStockShard.objects.filter(pk=shard_id).update(stock=F("stock") - part)
+    return taken
+
+
+def return_to_shards(taken):
+    """Возвращает на шарды количество, списанное take_from_shards."""
+    for shard_id, quantity in taken:
+        ProductStockShard.objects.filter(pk=shard_id).update(
+            stock=F("stock") + quantity
+        )
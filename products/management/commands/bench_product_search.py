@@ -0,0 +1,132 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from products.filters import search_products, trigram_search_enabled
+from products.models import Product
+
+WORDS = [
+    "ноутбук",
+    "смартфон",
+    "наушники",
+    "клавиатура",
+    "мышь",
+    "монитор",
+    "планшет",
+    "колонка",
+    "зарядка",
+    "чехол",
+    "laptop",
+    "keyboard",
+    "headphones",
+    "charger",
+    "monitor",
+]
+ADJECTIVES = [
+    "игровой",
+    "беспроводная",
+    "портативный",
+    "механическая",
+    "черный",
+    "белый",
+    "compact",
+    "wireless",
+    "pro",
+    "ultra",
+]
+
+GENERATE_SQL = f"""
+    INSERT INTO {Product._meta.db_table}
+        (name, price, stock, stock_shards, created_at, updated_at)
+    SELECT
+        (%(words)s::text[])[1 + floor(random() * %(word_count)s)::int] || ' ' ||
+        (%(adjectives)s::text[])[1 + floor(random() * %(adjective_count)s)::int]
+            || ' ' || i,
+        round((random() * 1000)::numeric, 2),
+        floor(random() * 100)::int,
+        0,
+        now(),
+        now()
+    FROM generate_series(1, %(products)s) AS i
+"""
+
+
+def typo(word):
+    position = random.randrange(1, len(word) - 1)
+    return word[:position] + word[position + 1 :]
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает задержку поиска товаров через icontains и через "
+        "полнотекстовый/триграммный индекс на сгенерированном каталоге. "
+        "Сгенерированные товары удаляются откатом транзакции."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--limit", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.generate(options["products"])
+            terms = self.terms(options["queries"])
+            self.stdout.write(
+                f"products={options['products']} queries={len(terms)} "
+                f"trigram={'on' if trigram_search_enabled() else 'off'}"
+            )
+            limit = options["limit"]
+            self.report(
+                "icontains",
+                terms,
+                lambda term: Product.objects.filter(name__icontains=term).order_by(
+                    "name"
+                )[:limit],
+            )
+            self.report(
+                "search",
+                terms,
+                lambda term: search_products(Product.objects.all(), term).order_by(
+                    "-search_rank"
+                )[:limit],
+            )
+            transaction.set_rollback(True)
+
+    def generate(self, products):
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                GENERATE_SQL,
+                {
+                    "words": WORDS,
+                    "word_count": len(WORDS),
+                    "adjectives": ADJECTIVES,
+                    "adjective_count": len(ADJECTIVES),
+                    "products": products,
+                },
+            )
+            cursor.execute(f"ANALYZE {Product._meta.db_table}")
+        self.stdout.write(f"generated in {time.perf_counter() - started:.1f}s")
+
+    def terms(self, queries):
+        # Целые слова, префиксы и слова с опечаткой поровну.
+        makers = [lambda word: word, lambda word: word[:4], typo]
+        return [
+            makers[i % len(makers)](random.choice(WORDS + ADJECTIVES))
+            for i in range(queries)
+        ]
+
+    def report(self, label, terms, build_queryset):
+        timings = []
+        for term in terms:
+            started = time.perf_counter()
+            list(build_queryset(term))
+            timings.append((time.perf_counter() - started) * 1000)
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        self.stdout.write(
+            f"{label:<10} p50={statistics.median(timings):.1f}ms p95={p95:.1f}ms"
+        )
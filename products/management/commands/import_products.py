@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.reports import write_load_report
+from products.importing import IMPORT_FORMATS, import_products
+
+
+class Command(BaseCommand):
+    help = "Загружает товары из CSV или NDJSON, создавая или обновляя их по sku."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=IMPORT_FORMATS, dest="file_format")
+        parser.add_argument("--chunk-size", type=int)
+
+    def handle(self, *args, **options):
+        file_format = options["file_format"] or options["path"].rsplit(".", 1)[-1]
+        if file_format not in IMPORT_FORMATS:
+            raise CommandError("Укажите --format: csv или ndjson.")
+
+        with open(options["path"], encoding="utf-8-sig", newline="") as stream:
+            report = import_products(stream, file_format, options["chunk_size"])
+
+        write_load_report(self, report, ["created", "updated"])
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:50
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не выполняется внутри транзакции.
+    atomic = False
+
+    dependencies = [
+        ("products", "0004_product_sku"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="product",
+            index=models.Index(fields=["name", "id"], name="products_name_id_idx"),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:20
+
+from django.db import migrations
+
+# Вектор зависит только от name: списания остатков и синхронизация цен не
+# должны разбирать название заново и перезаписывать индексированный столбец.
+TRIGGER_ON_NAME = """
+    DROP TRIGGER products_product_search_vector ON products_product;
+    CREATE TRIGGER products_product_search_vector
+    BEFORE INSERT OR UPDATE OF name ON products_product
+    FOR EACH ROW EXECUTE FUNCTION products_product_search_vector();
+"""
+
+TRIGGER_ON_ANY_UPDATE = """
+    DROP TRIGGER products_product_search_vector ON products_product;
+    CREATE TRIGGER products_product_search_vector
+    BEFORE INSERT OR UPDATE ON products_product
+    FOR EACH ROW EXECUTE FUNCTION products_product_search_vector();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0005_product_name_id_idx"),
+    ]
+
+    operations = [
+        migrations.RunSQL(TRIGGER_ON_NAME, TRIGGER_ON_ANY_UPDATE),
+    ]
@@ -1,17 +1,86 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import OuterRef, Subquery, Sum
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_available_stock(self):
+        """Добавляет суммарный остаток по шардам, не считая его на каждый товар."""
+        shards = (
+            ProductStockShard.objects.filter(product=OuterRef("pk"))
+            .order_by()
+            .values("product")
+            .annotate(total=Sum("stock"))
+            .values("total")
+        )
+        return self.annotate(sharded_stock=Subquery(shards))
 
 
 class Product(models.Model):
+    sku = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, verbose_name="Артикул"
+    )
     name = models.CharField(max_length=255, verbose_name="Название")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
     stock = models.PositiveIntegerField(verbose_name="Количество на складе")
+    stock_shards = models.PositiveSmallIntegerField(
+        default=0, verbose_name="Количество шардов остатка"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+    # Заполняется триггером products_product_search_vector (см. миграции 0003 и 0006).
+    search_vector = SearchVectorField(
+        null=True, editable=False, verbose_name="Поисковый вектор"
+    )
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
         ordering = ["name"]
+        indexes = [
+            # Порядок каталога по умолчанию; keyset-пагинация добавляет id.
+            models.Index(fields=["name", "id"], name="products_name_id_idx"),
+            GinIndex(fields=["search_vector"], name="products_search_vector_idx"),
+            # Триграммный индекс products_name_trgm_idx создается миграцией 0003
+            # только там, где доступно расширение pg_trgm.
+        ]
 
     def __str__(self):
         return self.name
+
+    @property
+    def available_stock(self):
+        """
+        Доступный остаток товара.
+
+        У шардированного товара остаток хранится в ProductStockShard,
+        а Product.stock равен нулю.
+        """
+        if not self.stock_shards:
+            return self.stock
+        sharded_stock = getattr(self, "sharded_stock", None)
+        if sharded_stock is None:
+            sharded_stock = self.stock_shard_rows.aggregate(total=Sum("stock"))["total"]
+        return sharded_stock or 0
+
+
+class ProductStockShard(models.Model):
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="stock_shard_rows",
+        verbose_name="Товар",
+    )
+    number = models.PositiveSmallIntegerField(verbose_name="Номер шарда")
+    stock = models.PositiveIntegerField(verbose_name="Остаток")
+
+    class Meta:
+        verbose_name = "Шард остатка"
+        verbose_name_plural = "Шарды остатка"
+        unique_together = ("product", "number")
+
+    def __str__(self):
+        return f"{self.product_id}#{self.number}: {self.stock}"
@@ -1,9 +1,121 @@
+import io
+
 from rest_framework import serializers
+from .importing import IMPORT_FORMATS, import_products
+from .inventory import STOCK_MAX, bulk_update_products, rebalance_stock
 from .models import Product
 
+PRODUCTS_BULK_UPDATE_MAX_SIZE = 5000
+
 
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = ["id", "name", "price", "stock", "created_at", "updated_at"]
+        fields = [
+            "id",
+            "sku",
+            "name",
+            "price",
+            "stock",
+            "stock_shards",
+            "created_at",
+            "updated_at",
+        ]
         read_only_fields = ["created_at", "updated_at"]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data["stock"] = instance.available_stock
+        return data
+
+    def create(self, validated_data):
+        shards = validated_data.pop("stock_shards", 0)
+        product = super().create(validated_data)
+        if shards:
+            rebalance_stock(product, shards=shards)
+        return product
+
+    def update(self, instance, validated_data):
+        # Остаток меняется только под блокировкой строки, иначе save()
+        # перезаписал бы списания параллельных заказов.
+        stock = validated_data.pop("stock", None)
+        shards = validated_data.pop("stock_shards", None)
+
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        if validated_data:
+            instance.save(update_fields=[*validated_data, "updated_at"])
+
+        if stock is not None or shards is not None:
+            rebalance_stock(instance, total=stock, shards=shards)
+        return instance
+
+
+class ProductImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    file_format = serializers.ChoiceField(choices=IMPORT_FORMATS, required=False)
+
+    def validate(self, attrs):
+        if "file_format" not in attrs:
+            extension = attrs["file"].name.rsplit(".", 1)[-1].lower()
+            if extension not in IMPORT_FORMATS:
+                raise serializers.ValidationError(
+                    {"file_format": ["Укажите формат: csv или ndjson."]}
+                )
+            attrs["file_format"] = extension
+        return attrs
+
+    def save(self):
+        stream = io.TextIOWrapper(
+            self.validated_data["file"].file, encoding="utf-8-sig", newline=""
+        )
+        try:
+            return import_products(stream, self.validated_data["file_format"])
+        except UnicodeDecodeError:
+            raise serializers.ValidationError({"file": ["Файл должен быть в UTF-8."]})
+
+
+class ProductBulkItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    stock = serializers.IntegerField(
+        required=False, min_value=-STOCK_MAX, max_value=STOCK_MAX
+    )
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+    def validate(self, attrs):
+        if "stock" not in attrs and "price" not in attrs:
+            raise serializers.ValidationError("Укажите stock или price.")
+        return attrs
+
+
+class ProductBulkUpdateSerializer(serializers.Serializer):
+    """
+    Пакетное изменение остатков и цен: mode=set задает значения,
+    mode=delta прибавляет их к текущим.
+    """
+
+    mode = serializers.ChoiceField(choices=["set", "delta"], default="set")
+    items = ProductBulkItemSerializer(
+        many=True, min_length=1, max_length=PRODUCTS_BULK_UPDATE_MAX_SIZE
+    )
+
+    def validate(self, attrs):
+        ids = [item["id"] for item in attrs["items"]]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError(
+                {"items": ["Каждый товар может встречаться в пакете один раз."]}
+            )
+        if attrs["mode"] == "set" and any(
+            item.get(field, 0) < 0
+            for item in attrs["items"]
+            for field in ("stock", "price")
+        ):
+            raise serializers.ValidationError(
+                {"items": ["Остаток и цена не могут быть отрицательными."]}
+            )
+        return attrs
+
+    def save(self):
+        return bulk_update_products(
+            self.validated_data["items"], delta=self.validated_data["mode"] == "delta"
+        )
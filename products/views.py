@@ -1,13 +1,67 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from core.mixins import ConditionalGetMixin, weak_etag
+from core.pagination import KeysetPagination
+from .cache import CatalogCacheMixin, catalog_cache_stats
+from .filters import ProductSearchFilter
 from .models import Product
-from .serializers import ProductSerializer
+from .serializers import (
+    ProductBulkUpdateSerializer,
+    ProductImportSerializer,
+    ProductSerializer,
+)
 
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema
 
 
 @extend_schema(tags=["Products"])
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+class ProductViewSet(ConditionalGetMixin, CatalogCacheMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.with_available_stock()
     serializer_class = ProductSerializer
     permission_classes = [IsAdminUser]
+    filter_backends = [ProductSearchFilter, OrderingFilter]
+    # Только NOT NULL поля: KeysetPagination не умеет листать по NULL.
+    ordering_fields = ["name", "price", "created_at", "updated_at"]
+    ordering = ["name"]
+    pagination_class = KeysetPagination
+
+    def get_version(self, queryset):
+        # ETag лежит в записи кэша каталога рядом с отданными данными, поэтому
+        # при попадании в кэш запроса к базе нет. Last-Modified не отдается.
+        return self.get_catalog_entry(self.request, **self.kwargs)["etag"], None
+
+    def get_serializer_class(self):
+        if self.action == "import_products":
+            return ProductImportSerializer
+        if self.action == "bulk":
+            return ProductBulkUpdateSerializer
+        return ProductSerializer
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    @action(detail=False, methods=["get"], url_path="cache-stats")
+    def cache_stats(self, request):
+        return Response(catalog_cache_stats())
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        parser_classes=[MultiPartParser],
+    )
+    def import_products(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.save())
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    @action(detail=False, methods=["patch"])
+    def bulk(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.save())
@@ -1,4 +1,5 @@
 import pytest
+from django.core.cache import cache
 from django.core.management import call_command
 from django.conf import settings
 
@@ -12,3 +13,10 @@ def load_fixtures(django_db_setup, django_db_blocker):
     # Test host
     if not hasattr(settings, "EMAIL_HOST_USER"):
         settings.EMAIL_HOST_USER = "test@yourdomain.com"
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
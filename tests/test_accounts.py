@@ -1,6 +1,35 @@
+import io
+import threading
+import time
+from unittest import mock
+
 import pytest
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.blacklist import (
+    SEQUENCE_KEY,
+    TokenBlacklist,
+    blacklist,
+    compact_blacklist,
+)
+from accounts import hashers, last_login, provisioning
+from accounts.checks import check_shared_cache
+from accounts.models import UserBulkCreateJob
+from accounts.serializers import MyTokenObtainPairSerializer
+from accounts.tasks import flush_last_logins
+from orders.models import Order
+from products.models import Product
 
 User = get_user_model()
 
@@ -35,3 +64,420 @@ def test_admin_is_superuser():
 def test_user_string_representation():
     user = User.objects.get(email="testuser@example.com")
     assert str(user) == "testuser@example.com"
+
+
+def _bearer(user):
+    token = MyTokenObtainPairSerializer.get_token(user).access_token
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    return client
+
+
+def _user_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    return response, [q["sql"] for q in queries if '"accounts_user"' in q["sql"]]
+
+
+@pytest.mark.django_db
+def test_jwt_user_is_loaded_once_and_cached():
+    user = User.objects.create_user(email="cached@example.com", password="secret123")
+    client = _bearer(user)
+
+    response, first = _user_queries(client, reverse("order-list"))
+    assert response.status_code == 200
+    assert len(first) == 1
+
+    response, second = _user_queries(client, reverse("order-list"))
+    assert response.status_code == 200
+    assert second == []
+
+    # Закэшированный пользователь - обычный User: годится для внешнего ключа.
+    product = Product.objects.create(name="Товар", price=10, stock=5)
+    response = client.post(
+        reverse("order-list"),
+        {"items": [{"product": product.pk, "quantity": 1}]},
+        format="json",
+    )
+    assert response.status_code == 201
+    assert Order.objects.get(pk=response.data["id"]).user_id == user.pk
+
+
+@pytest.mark.django_db
+def test_jwt_user_cache_is_dropped_on_save():
+    user = User.objects.create_user(email="changing@example.com", password="secret123")
+    client = _bearer(user)
+    assert client.get(reverse("order-export")).status_code == 403
+
+    user.is_staff = True
+    user.save()
+    assert client.get(reverse("order-export")).status_code == 200
+
+    user.is_active = False
+    user.save()
+    assert client.get(reverse("order-list")).status_code == 401
+
+
+@pytest.mark.django_db
+def test_stateless_jwt_mode_reads_user_from_claims(settings):
+    settings.ACCOUNTS_JWT_STATELESS = True
+    admin = User.objects.get(email="admin@example.com")
+
+    response, queries = _user_queries(_bearer(admin), reverse("order-stats"))
+    assert response.status_code == 200
+    assert queries == []
+
+    # Токен без claims состояния проверяется через кэш и базу.
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(admin)}")
+    response, queries = _user_queries(client, reverse("order-stats"))
+    assert response.status_code == 200
+    assert len(queries) == 1
+
+
+def _login(client, email):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.post(
+            reverse("token_obtain_pair"),
+            {"email": email, "password": "secret123"},
+            format="json",
+        )
+    assert response.status_code == 200
+    return [q["sql"] for q in queries if '"accounts_user"' in q["sql"]]
+
+
+@pytest.mark.django_db
+def test_login_buffers_last_login_and_flushes_in_bulk():
+    users = [
+        User.objects.create_user(email=f"shift{i}@example.com", password="secret123")
+        for i in range(3)
+    ]
+    client = APIClient()
+
+    for user in users:
+        queries = _login(client, user.email)
+        # Один SELECT при аутентификации, без повторного get и UPDATE.
+        assert len(queries) == 1
+        assert queries[0].startswith("SELECT")
+    assert len(_login(client, users[0].email)) == 1
+    assert not User.objects.filter(last_login__isnull=False).exists()
+
+    assert flush_last_logins.delay().get() == 3
+    first = User.objects.get(pk=users[0].pk).last_login
+    assert first is not None
+    assert User.objects.filter(last_login__isnull=False).count() == 3
+
+    # Повторный вход в пределах интервала ничего не пишет.
+    _login(client, users[0].email)
+    assert flush_last_logins.delay().get() == 0
+    assert User.objects.get(pk=users[0].pk).last_login == first
+
+
+@pytest.mark.django_db
+def test_last_login_is_written_again_after_interval(settings):
+    settings.ACCOUNTS_LAST_LOGIN_INTERVAL = 0
+    user = User.objects.create_user(email="again@example.com", password="secret123")
+    client = APIClient()
+
+    _login(client, user.email)
+    _login(client, user.email)
+    assert flush_last_logins.delay().get() == 1
+    first = User.objects.get(pk=user.pk).last_login
+
+    _login(client, user.email)
+    assert flush_last_logins.delay().get() == 1
+    assert User.objects.get(pk=user.pk).last_login > first
+
+
+@pytest.mark.django_db
+def test_flush_waits_for_login_entry_that_is_not_written_yet():
+    user = User.objects.create_user(email="slow@example.com", password="secret123")
+    login_time = timezone.now()
+    # record_login взял номер, но запись в буфер еще не дошла.
+    cache.add(last_login.SEQUENCE_KEY, 0, None)
+    number = cache.incr(last_login.SEQUENCE_KEY)
+
+    assert flush_last_logins.delay().get() == 0
+
+    cache.set(last_login.entry_key(number), (user.pk, login_time), None)
+    assert flush_last_logins.delay().get() == 1
+    assert User.objects.get(pk=user.pk).last_login == login_time
+
+    # Запись, которой нет и после следующего flush, считается истекшей.
+    lost = cache.incr(last_login.SEQUENCE_KEY)
+    flush_last_logins.delay().get()
+    flush_last_logins.delay().get()
+    assert cache.get(last_login.FLUSHED_KEY) == lost
+
+
+def test_per_process_cache_is_reported_at_startup(settings):
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    assert [warning.id for warning in check_shared_cache(None)] == ["accounts.W001"]
+
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": "redis://localhost:6379/0",
+        }
+    }
+    assert check_shared_cache(None) == []
+
+
+@pytest.fixture
+def token_blacklist():
+    blacklist.reset()
+    yield blacklist
+    blacklist.reset()
+
+
+def _tokens(client, email):
+    response = client.post(
+        reverse("token_obtain_pair"),
+        {"email": email, "password": "secret123"},
+        format="json",
+    )
+    return response.data["access"], response.data["refresh"]
+
+
+def _refresh(client, refresh):
+    return client.post(reverse("token_refresh"), {"refresh": refresh}, format="json")
+
+
+@pytest.mark.django_db
+def test_rotated_refresh_token_cannot_be_reused(token_blacklist):
+    User.objects.create_user(email="rotate@example.com", password="secret123")
+    client = APIClient()
+    _, refresh = _tokens(client, "rotate@example.com")
+
+    response = _refresh(client, refresh)
+    assert response.status_code == 200
+    assert _refresh(client, refresh).status_code == 401
+    assert _refresh(client, response.data["refresh"]).status_code == 200
+
+
+@pytest.mark.django_db
+def test_logout_revokes_refresh_token(token_blacklist):
+    User.objects.create_user(email="logout@example.com", password="secret123")
+    client = APIClient()
+    _, refresh = _tokens(client, "logout@example.com")
+
+    response = client.post(reverse("logout"), {"refresh": refresh}, format="json")
+    assert response.status_code == 204
+    assert _refresh(client, refresh).status_code == 401
+    response = client.post(reverse("logout"), {"refresh": "garbage"}, format="json")
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_logout_all_revokes_every_session(token_blacklist):
+    User.objects.create_user(email="sessions@example.com", password="secret123")
+    client = APIClient()
+    sessions = [_tokens(client, "sessions@example.com") for _ in range(2)]
+    access, _ = sessions[0]
+
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+    assert client.post(reverse("logout_all")).status_code == 204
+    assert client.get(reverse("order-list")).status_code == 401
+
+    client.credentials()
+    for _, refresh in sessions:
+        assert _refresh(client, refresh).status_code == 401
+
+
+def test_logout_all_revokes_tokens_issued_in_the_same_second(token_blacklist):
+    now = int(time.time())
+    with mock.patch("accounts.blacklist.time.time", return_value=now + 0.7):
+        token_blacklist.revoke_user(42)
+
+    assert token_blacklist.is_user_revoked(42, now - 1)
+    assert token_blacklist.is_user_revoked(42, now)
+    assert not token_blacklist.is_user_revoked(42, now + 1)
+
+
+@pytest.mark.django_db
+def test_blacklist_is_synced_between_processes(token_blacklist):
+    user = User.objects.create_user(email="sync@example.com", password="secret123")
+    revoked = MyTokenObtainPairSerializer.get_token(user)
+    valid = MyTokenObtainPairSerializer.get_token(user)
+    worker = TokenBlacklist()
+    assert token_blacklist.revoke(revoked)
+    assert not token_blacklist.revoke(revoked)
+
+    worker.sync(force=True)
+    assert worker.is_revoked(revoked)
+    # Отсутствие в фильтре Блума проверяется без обращения к кэшу.
+    with mock.patch.object(cache, "get", side_effect=AssertionError):
+        assert not worker.is_revoked(valid)
+
+    # Номер выдан, запись еще не дописана: синхронизация ждет ее один раз.
+    cache.incr(SEQUENCE_KEY)
+    worker.sync(force=True)
+    assert worker.position == 1
+    worker.sync(force=True)
+    assert worker.position == 2
+
+    # Снимок пишется так же: недописанная запись пропускается со второго раза.
+    assert compact_blacklist() == 1
+    assert compact_blacklist() == 2
+    fresh = TokenBlacklist()
+    with mock.patch.object(cache, "get_many", wraps=cache.get_many) as get_many:
+        fresh.sync(force=True)
+    assert fresh.position == 2
+    assert get_many.call_count == 1
+    assert fresh.is_revoked(revoked)
+
+
+@pytest.mark.django_db
+def test_legacy_password_hash_is_upgraded_on_login(settings):
+    user = User.objects.create_user(email="legacy@example.com")
+    User.objects.filter(pk=user.pk).update(
+        password=make_password("secret123", hasher="pbkdf2_sha256")
+    )
+    client = APIClient()
+
+    _login(client, user.email)
+    user.refresh_from_db()
+    assert user.password.startswith("argon2$argon2id$v=19$m=19456,t=2,p=1$")
+
+    # Новые параметры применяются так же, при следующем входе.
+    settings.ACCOUNTS_ARGON2_TIME_COST = 3
+    _login(client, user.email)
+    user.refresh_from_db()
+    assert "$m=19456,t=3,p=1$" in user.password
+
+
+@pytest.mark.django_db
+def test_registration_hashes_with_configured_hasher():
+    response = APIClient().post(
+        reverse("register"),
+        {"email": "new@example.com", "full_name": "Новый", "password": "secret123"},
+        format="json",
+    )
+    assert response.status_code == 201
+    assert User.objects.get(email="new@example.com").password.startswith("argon2$")
+
+
+@pytest.mark.django_db
+def test_login_is_rejected_when_hashing_slots_are_taken(settings, monkeypatch):
+    settings.ACCOUNTS_PASSWORD_HASHING_TIMEOUT = 0
+    monkeypatch.setattr(hashers, "get_slots", lambda: threading.BoundedSemaphore(0))
+
+    response = APIClient().post(
+        reverse("token_obtain_pair"),
+        {"email": "testuser@example.com", "password": "secret123"},
+        format="json",
+    )
+    assert response.status_code == 503
+    assert response.data["detail"].code == "password_hashing_busy"
+
+
+BULK_CSV = (
+    "email,full_name,password\n"
+    "first@example.com,Первый,secret123\n"
+    "testuser@example.com,Уже есть,secret123\n"
+    "second@EXAMPLE.com,Второй,\n"
+    "first@example.com,Повтор,secret123\n"
+    "not-an-email,Ошибка,secret123\n"
+    "third@example.com,Третий,123\n"
+)
+
+
+@pytest.mark.django_db
+def test_admin_bulk_creates_users_from_csv(
+    settings, monkeypatch, django_capture_on_commit_callbacks
+):
+    settings.ACCOUNTS_BULK_CREATE_CHUNK_SIZE = 2
+    settings.ACCOUNTS_BULK_CREATE_PROCESSES = 4
+    # Задача хэширует пароли в процессе воркера, без своих процессов.
+    monkeypatch.setattr(provisioning, "ProcessPoolExecutor", None)
+    client = APIClient()
+    client.force_authenticate(User.objects.get(email="admin@example.com"))
+
+    with CaptureQueriesContext(connection) as queries:
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(
+                reverse("users_bulk_create"),
+                {"file": SimpleUploadedFile("users.csv", BULK_CSV.encode())},
+                format="multipart",
+            )
+
+    assert response.status_code == 202
+    assert response.data["status"] == "pending"
+    assert response["Location"] == response.data["status_url"]
+    # Одна проверка занятых email на порцию; в третьей порции проверять нечего.
+    lookups = [
+        q for q in queries if q["sql"].startswith('SELECT "accounts_user"."email"')
+    ]
+    assert len(lookups) == 2
+
+    job = client.get(response.data["status_url"]).data
+    report = job["report"]
+    assert job["status"] == "done"
+    assert (report["rows"], report["created"]) == (6, 2)
+    assert (report["skipped"], report["rejected"]) == (2, 2)
+    assert [reject["line"] for reject in report["rejects"]] == [5, 6]
+    # Строки с паролями не попадают в базу и удаляются из кэша после задачи.
+    stored = UserBulkCreateJob.objects.get(pk=job["id"])
+    assert stored.chunks == 3
+    assert cache.get(provisioning.staged_chunk_key(stored.pk, 0)) is None
+
+    first = User.objects.get(email="first@example.com")
+    assert first.full_name == "Первый"
+    assert first.check_password("secret123")
+    assert not User.objects.get(email="second@example.com").has_usable_password()
+    assert User.objects.get(email="testuser@example.com").full_name != "Уже есть"
+
+
+@pytest.mark.django_db
+def test_bulk_create_users_rejects_non_utf8_file():
+    client = APIClient()
+    client.force_authenticate(User.objects.get(email="admin@example.com"))
+    response = client.post(
+        reverse("users_bulk_create"),
+        {"file": SimpleUploadedFile("users.csv", BULK_CSV.encode("cp1251"))},
+        format="multipart",
+    )
+    assert response.status_code == 400
+    assert "file" in response.data
+    assert not UserBulkCreateJob.objects.exists()
+
+
+@pytest.mark.django_db
+def test_bulk_create_users_requires_admin():
+    client = APIClient()
+    client.force_authenticate(User.objects.get(email="testuser@example.com"))
+    response = client.post(
+        reverse("users_bulk_create"),
+        {"file": SimpleUploadedFile("users.csv", BULK_CSV.encode())},
+        format="multipart",
+    )
+    assert response.status_code == 403
+
+
+@pytest.mark.django_db
+def test_bulk_create_users_command_hashes_in_process_pool(tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text(
+        "email,full_name,password\n"
+        + "".join(f"pool{i}@example.com,Пул {i},secret12{i}\n" for i in range(4)),
+        encoding="utf-8",
+    )
+    out = io.StringIO()
+
+    call_command("bulk_create_users", str(path), "--processes", "2", stdout=out)
+
+    assert "rows=4 created=4 skipped=0 rejected=0" in out.getvalue()
+    assert User.objects.get(email="pool3@example.com").check_password("secret123")
+
+
+@pytest.mark.django_db
+def test_bulk_create_users_starts_no_pool_for_single_password(monkeypatch):
+    monkeypatch.setattr(provisioning, "ProcessPoolExecutor", None)
+    stream = io.StringIO("email,full_name,password\nsolo@example.com,Один,secret123\n")
+
+    report = provisioning.bulk_create_users(stream, processes=4)
+
+    assert report["created"] == 1
+    assert User.objects.get(email="solo@example.com").check_password("secret123")
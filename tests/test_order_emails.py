@@ -0,0 +1,136 @@
+import socketserver
+import threading
+
+import pytest
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+
+from orders.outbox import enqueue
+from orders.tasks import (
+    relay_outbox,
+    send_order_confirmation_email,
+    send_order_confirmation_emails,
+)
+
+
+class CountingBackend(EmailBackend):
+    """locmem-бэкенд, который считает открытые соединения."""
+
+    opened = 0
+    fail_for = set()
+
+    def open(self):
+        CountingBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.to[0] in CountingBackend.fail_for:
+                CountingBackend.fail_for.discard(message.to[0])
+                raise ConnectionError
+        return super().send_messages(messages)
+
+
+@pytest.fixture
+def counting_backend(settings):
+    settings.EMAIL_BACKEND = "tests.test_order_emails.CountingBackend"
+    CountingBackend.opened = 0
+    CountingBackend.fail_for = set()
+    return CountingBackend
+
+
+class SMTPStandIn(socketserver.StreamRequestHandler):
+    """Минимальный SMTP-сервер: принимает письма и считает соединения."""
+
+    def handle(self):
+        self.server.connections += 1
+        self.wfile.write(b"220 localhost\r\n")
+        in_data = False
+        for raw in self.rfile:
+            line = raw.decode().rstrip("\r\n")
+            if in_data:
+                if line == ".":
+                    in_data = False
+                    self.server.messages += 1
+                    self.wfile.write(b"250 OK\r\n")
+                continue
+
+            command = line[:4].upper()
+            if command == "DATA":
+                in_data = True
+                self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif command == "QUIT":
+                self.wfile.write(b"221 Bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 OK\r\n")
+
+
+@pytest.fixture
+def smtp_server(settings):
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPStandIn)
+    server.connections = 0
+    server.messages = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    settings.EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+    settings.EMAIL_HOST, settings.EMAIL_PORT = server.server_address
+    settings.EMAIL_USE_TLS = False
+    settings.EMAIL_HOST_PASSWORD = ""
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_batch_sends_all_confirmations_over_one_connection(counting_backend):
+    send_order_confirmation_emails([[1, "a@example.com"], [2, "b@example.com"]])
+
+    assert counting_backend.opened == 1
+    assert [email.subject for email in mail.outbox] == [
+        "Подтверждение заказа #1",
+        "Подтверждение заказа #2",
+    ]
+
+
+def test_failed_confirmation_is_retried_alone(counting_backend, settings):
+    settings.ORDERS_EMAIL_RETRY_DELAY = 0
+    counting_backend.fail_for = {"b@example.com"}
+
+    send_order_confirmation_emails(
+        [[1, "a@example.com"], [2, "b@example.com"], [3, "c@example.com"]]
+    )
+
+    assert [email.to[0] for email in mail.outbox] == [
+        "a@example.com",
+        "c@example.com",
+        "b@example.com",
+    ]
+
+
+def test_single_order_task_is_a_thin_wrapper(counting_backend):
+    send_order_confirmation_email(7, "a@example.com")
+
+    assert counting_backend.opened == 1
+    assert mail.outbox[0].subject == "Подтверждение заказа #7"
+
+
+@pytest.mark.django_db
+def test_relay_merges_pending_confirmations(counting_backend, settings):
+    settings.ORDERS_EMAIL_BATCH_SIZE = 2
+    for order_id in range(5):
+        enqueue(send_order_confirmation_emails, orders=[[order_id, "a@example.com"]])
+
+    relay_outbox()
+
+    assert len(mail.outbox) == 5
+    assert counting_backend.opened == 3
+
+
+def test_smtp_batch_reuses_one_connection(smtp_server):
+    send_order_confirmation_emails(
+        [[order_id, f"user{order_id}@example.com"] for order_id in range(10)]
+    )
+
+    assert smtp_server.messages == 10
+    assert smtp_server.connections == 1
@@ -0,0 +1,180 @@
+"""
+Регрессия планов запросов OrderViewSet.
+
+Модуль засевает таблицы реалистичным объемом, выполняет каждый вид
+запроса через API и прогоняет все SELECT по заказам через EXPLAIN.
+Тест падает, если PostgreSQL читает таблицу заказов или позиций целиком
+(Seq Scan) или сортирует заказы вместо чтения их из индекса в нужном порядке.
+Данные и статистика планировщика одинаковы при каждом запуске, поэтому
+регрессия плана роняет тест всегда, а не время от времени.
+"""
+
+import json
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from orders.models import Order, OrderItem
+from products.models import Product
+
+USERS = 200
+ORDERS = 50_000
+ORDER_TABLES = {Order._meta.db_table, OrderItem._meta.db_table}
+SORT_NODES = {"Sort", "Incremental Sort"}
+
+# setseed() делает random() воспроизводимым, а статистика с запасом больше
+# таблицы заставляет ANALYZE прочитать все строки вместо случайной выборки.
+SEED_SQL = f"""
+    SELECT setseed(0.5);
+    INSERT INTO {Order._meta.db_table}
+        (user_id, created_at, updated_at, status, total_price)
+    SELECT
+        (%(users)s::bigint[])[1 + i %% %(user_count)s],
+        now() - (i || ' minutes')::interval,
+        now() - (i || ' minutes')::interval,
+        (ARRAY['new', 'in_progress', 'completed', 'cancelled'])[1 + (i * 7) %% 4],
+        round((random() * 1000)::numeric, 2)
+    FROM generate_series(1, %(orders)s) AS i;
+
+    INSERT INTO {OrderItem._meta.db_table} (order_id, product_id, quantity, price)
+    SELECT id, %(product)s, 1, total_price FROM {Order._meta.db_table};
+
+    SET default_statistics_target = 1000;
+    ANALYZE {Order._meta.db_table};
+    ANALYZE {OrderItem._meta.db_table};
+    RESET default_statistics_target;
+"""
+
+CLEANUP_SQL = f"""
+    DELETE FROM {OrderItem._meta.db_table} WHERE order_id IN (
+        SELECT id FROM {Order._meta.db_table} WHERE user_id = ANY(%(users)s)
+    );
+    DELETE FROM {Order._meta.db_table} WHERE user_id = ANY(%(users)s);
+"""
+
+
+@pytest.fixture(scope="module")
+def seeded(django_db_setup, django_db_blocker):
+    with django_db_blocker.unblock():
+        users = User.objects.bulk_create(
+            [User(email=f"plan{i}@example.com") for i in range(USERS)]
+        )
+        product = Product.objects.create(name="Plan product", price=1, stock=0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                SEED_SQL,
+                {
+                    "users": [user.pk for user in users],
+                    "user_count": USERS,
+                    "orders": ORDERS,
+                    "product": product.pk,
+                },
+            )
+        yield users[0]
+        # Заказы засеяны в обход агрегатов продаж, поэтому и удаляются в обход
+        # сигналов, которые вычли бы их из агрегатов.
+        with connection.cursor() as cursor:
+            cursor.execute(CLEANUP_SQL, {"users": [user.pk for user in users]})
+        User.objects.filter(pk__in=[user.pk for user in users]).delete()
+        product.delete()
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def scans_orders(node):
+    return any(
+        child.get("Relation Name") == Order._meta.db_table for child in plan_nodes(node)
+    )
+
+
+def assert_indexed_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    for node in plan_nodes(plan[0]["Plan"]):
+        assert not (
+            node["Node Type"] == "Seq Scan" and node["Relation Name"] in ORDER_TABLES
+        ), f"Seq Scan по {node['Relation Name']}:\n{sql}"
+        assert not (
+            node["Node Type"] in SORT_NODES and scans_orders(node)
+        ), f"Сортировка заказов без индекса:\n{sql}"
+
+
+def order_queries(client, url, params, follow_next):
+    response = client.get(url, params)
+    assert response.status_code == 200
+    if follow_next:
+        url, params = response.data["next"], None
+
+    with CaptureQueriesContext(connection) as queries:
+        assert client.get(url, params).status_code == 200
+
+    return [
+        query["sql"]
+        for query in queries
+        if query["sql"].startswith("SELECT")
+        and any(f'"{table}"' in query["sql"] for table in ORDER_TABLES)
+    ]
+
+
+SHAPES = [
+    ("user", {}, False),
+    ("user", {}, True),
+    ("user", {"status": "new"}, False),
+    ("user", {"ordering": "total_price"}, False),
+    ("user", {"ordering": "-total_price"}, True),
+    ("user", {"ordering": "created_at"}, True),
+    ("user", {"status": "new", "ordering": "total_price"}, True),
+    ("admin", {}, False),
+    ("admin", {}, True),
+    ("admin", {"status": "completed"}, False),
+    ("admin", {"status": "new"}, True),
+    ("admin", {"ordering": "created_at"}, True),
+    ("admin", {"ordering": "total_price"}, False),
+    ("admin", {"ordering": "-total_price"}, True),
+    ("admin", {"status": "in_progress", "ordering": "-total_price"}, False),
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("who,params,follow_next", SHAPES)
+def test_order_list_plans_use_indexes(seeded, who, params, follow_next):
+    client = APIClient()
+    user = seeded if who == "user" else User.objects.get(email="admin@example.com")
+    client.force_authenticate(user=user)
+
+    queries = order_queries(
+        client, reverse("order-list"), {"page_size": 20, **params}, follow_next
+    )
+
+    assert queries
+    for sql in queries:
+        assert_indexed_plan(sql)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("who", ["user", "admin"])
+def test_order_detail_plans_use_indexes(seeded, who):
+    client = APIClient()
+    user = seeded if who == "user" else User.objects.get(email="admin@example.com")
+    client.force_authenticate(user=user)
+    order = Order.objects.filter(user=seeded).first()
+
+    queries = order_queries(
+        client, reverse("order-detail", args=[order.pk]), None, False
+    )
+
+    assert queries
+    for sql in queries:
+        assert_indexed_plan(sql)
@@ -1,11 +1,50 @@
+import json
+from base64 import b64encode
+from unittest import mock
+
 import pytest
+from django.core.management import call_command
 from rest_framework import status
 from rest_framework.test import APIClient
+from django.db.models.sql import Query
 from django.urls import reverse
-from orders.models import Order, OrderItem
+from core.mixins import weak_etag
+from orders.intake import (
+    INTAKE_DRAIN_SCHEDULED,
+    process_intake_batch,
+    submit_order_intake,
+)
+from orders.models import (
+    Order,
+    OrderDailyStats,
+    OrderIntake,
+    OrderItem,
+    OutboxMessage,
+    ProductDailySales,
+    SalesDelta,
+)
+from orders.rollups import fold_rollups, rebuild_rollups
+from orders.outbox import enqueue
+from orders.tasks import (
+    drain_order_intake,
+    relay_outbox,
+    send_order_confirmation_email,
+)
+from orders.serializers import (
+    ORDER_READ_FIELDS,
+    OrderReadSerializer,
+    OrderSerializer,
+)
+from orders.services import place_order, place_orders, set_order_status
+from products.inventory import rebalance_stock
+from rest_framework.exceptions import ValidationError
 from products.models import Product
 from accounts.models import User
 from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
 
 ORDERS_LIST_URL = reverse("order-list")
 
@@ -207,6 +246,9 @@ def test_order_creation_sends_confirmation_email(
     )
     assert response.status_code == status.HTTP_201_CREATED
 
+    assert len(mail.outbox) == 0
+    relay_outbox()
+
     assert len(mail.outbox) == 1
 
     email = mail.outbox[0]
@@ -218,3 +260,871 @@ def test_order_creation_sends_confirmation_email(
     assert email.to == [user.email]
 
     assert str(order_id) in email.body
+
+
+@pytest.mark.django_db
+def test_place_order_query_count_does_not_depend_on_lines(
+    user_data, django_assert_num_queries
+):
+    user, _ = user_data
+    products = Product.objects.bulk_create(
+        [Product(name=f"Product {i}", price=10, stock=100) for i in range(10)]
+    )
+
+    # Блокировка товаров, списание, заказ, позиции и upsert агрегатов продаж.
+    with django_assert_num_queries(5):
+        place_order([{"product": products[0], "quantity": 1}], user=user)
+
+    with django_assert_num_queries(5):
+        order = place_order(
+            [{"product": product, "quantity": 2} for product in products], user=user
+        )
+
+    assert order.items.count() == 10
+    assert order.total_price == 200
+    assert sorted(Product.objects.values_list("stock", flat=True)) == [97] + [98] * 9
+
+
+@pytest.mark.django_db
+def test_place_order_merges_duplicate_lines(user_data, product_in_db):
+    user, _ = user_data
+
+    order = place_order(
+        [
+            {"product": product_in_db, "quantity": 2},
+            {"product": product_in_db, "quantity": 3},
+        ],
+        user=user,
+    )
+
+    product_in_db.refresh_from_db()
+    assert order.items.get().quantity == 5
+    assert order.total_price == 500
+    assert product_in_db.stock == 45
+
+
+def test_order_exceeding_stock_is_rejected_without_side_effects(
+    authenticated_user_client, setup_products_for_filter
+):
+    response = authenticated_user_client.post(
+        ORDERS_LIST_URL,
+        {"items": [{"product": 2, "quantity": 5}, {"product": 1, "quantity": 51}]},
+        format="json",
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert not Order.objects.exists()
+    assert dict(Product.objects.values_list("id", "stock")) == {1: 50, 2: 100}
+
+
+@pytest.mark.django_db
+def test_order_items_resolve_products_with_one_query(django_assert_num_queries):
+    products = Product.objects.bulk_create(
+        [Product(name=f"Product {i}", price=10, stock=100) for i in range(50)]
+    )
+    data = {"items": [{"product": product.id, "quantity": 1} for product in products]}
+
+    serializer = OrderSerializer(data=data)
+    with django_assert_num_queries(1):
+        assert serializer.is_valid(), serializer.errors
+
+    validated = serializer.validated_data["items"]
+    assert [item["product"] for item in validated] == products
+
+
+@pytest.mark.django_db
+def test_order_items_compile_product_queryset_once():
+    products = Product.objects.bulk_create(
+        [Product(name=f"Product {i}", price=10, stock=100) for i in range(20)]
+    )
+    data = {"items": [{"product": product.id, "quantity": 1} for product in products]}
+
+    serializer = OrderSerializer(data=data)
+    with mock.patch.object(Query, "__str__", autospec=True, return_value="") as sql:
+        assert serializer.is_valid(), serializer.errors
+    assert sql.call_count == 1
+
+
+@pytest.mark.django_db
+def test_order_items_report_missing_products_together(product_in_db):
+    data = {
+        "items": [
+            {"product": 999_002, "quantity": 1},
+            {"product": product_in_db.id, "quantity": 1},
+            {"product": 999_001, "quantity": 1},
+        ]
+    }
+
+    serializer = OrderSerializer(data=data)
+
+    assert not serializer.is_valid()
+    assert serializer.errors["items"]["product"] == [
+        "Объекты с id 999001, 999002 не существуют."
+    ]
+
+
+ORDERS_BATCH_URL = reverse("order-batch")
+
+
+def test_batch_creates_all_orders(
+    authenticated_user_client, setup_products_for_filter, user_data
+):
+    user, _ = user_data
+    payload = {
+        "orders": [
+            {"items": [{"product": 1, "quantity": 1}]},
+            {"items": [{"product": 1, "quantity": 2}, {"product": 2, "quantity": 3}]},
+        ]
+    }
+
+    response = authenticated_user_client.post(ORDERS_BATCH_URL, payload, format="json")
+
+    assert response.status_code == status.HTTP_201_CREATED
+    results = response.data["results"]
+    assert [result["status"] for result in results] == ["created", "created"]
+    assert results[1]["order"]["total_price"] == "2075.00"
+    assert len(results[1]["order"]["items"]) == 2
+    assert Order.objects.filter(user=user).count() == 2
+    assert dict(Product.objects.values_list("id", "stock")) == {1: 47, 2: 97}
+
+    relay_outbox()
+    assert len(mail.outbox) == 2
+    assert {email.to[0] for email in mail.outbox} == {user.email}
+
+
+def test_atomic_batch_creates_nothing_when_one_order_fails(
+    authenticated_user_client, setup_products_for_filter
+):
+    payload = {
+        "orders": [
+            {"items": [{"product": 1, "quantity": 1}]},
+            {"items": [{"product": 2, "quantity": 101}]},
+            {"items": [{"product": 999_001, "quantity": 1}]},
+        ]
+    }
+
+    response = authenticated_user_client.post(ORDERS_BATCH_URL, payload, format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    results = response.data["results"]
+    assert [result["status"] for result in results] == [
+        "skipped",
+        "skipped",
+        "rejected",
+    ]
+    assert not Order.objects.exists()
+    assert dict(Product.objects.values_list("id", "stock")) == {1: 50, 2: 100}
+    relay_outbox()
+    assert len(mail.outbox) == 0
+
+
+def test_best_effort_batch_rejects_orders_individually(
+    authenticated_user_client, setup_products_for_filter
+):
+    payload = {
+        "atomic": False,
+        "orders": [
+            {"items": [{"product": 2, "quantity": 60}]},
+            {"items": [{"product": 2, "quantity": 60}]},
+            {"items": [{"product": 999_001, "quantity": 1}]},
+            {"items": [{"product": 1, "quantity": 1}]},
+        ],
+    }
+
+    response = authenticated_user_client.post(ORDERS_BATCH_URL, payload, format="json")
+
+    assert response.status_code == status.HTTP_201_CREATED
+    results = response.data["results"]
+    assert [result["status"] for result in results] == [
+        "created",
+        "rejected",
+        "rejected",
+        "created",
+    ]
+    assert results[1]["errors"] == {
+        "non_field_errors": ["На складе недостаточно товара: Mouse."]
+    }
+    assert Order.objects.count() == 2
+    assert dict(Product.objects.values_list("id", "stock")) == {1: 49, 2: 40}
+    relay_outbox()
+    assert len(mail.outbox) == 2
+
+
+def test_order_retry_with_idempotency_key_is_replayed(
+    authenticated_user_client, order_data, product_in_db, user_data
+):
+    user, _ = user_data
+    headers = {"Idempotency-Key": "retry-1"}
+
+    first = authenticated_user_client.post(
+        ORDERS_LIST_URL, order_data, format="json", headers=headers
+    )
+    retry = authenticated_user_client.post(
+        ORDERS_LIST_URL, order_data, format="json", headers=headers
+    )
+
+    assert first.status_code == retry.status_code == status.HTTP_201_CREATED
+    assert retry.data == first.data
+    assert retry["Idempotent-Replayed"] == "true"
+    assert Order.objects.filter(user=user).count() == 1
+    product_in_db.refresh_from_db()
+    assert product_in_db.stock == 48
+    relay_outbox()
+    assert len(mail.outbox) == 1
+
+
+def test_idempotency_key_reused_for_different_request(
+    authenticated_user_client, order_data
+):
+    headers = {"Idempotency-Key": "retry-2"}
+    authenticated_user_client.post(
+        ORDERS_LIST_URL, order_data, format="json", headers=headers
+    )
+    order_data["items"][0]["quantity"] = 3
+
+    response = authenticated_user_client.post(
+        ORDERS_LIST_URL, order_data, format="json", headers=headers
+    )
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert Order.objects.count() == 1
+
+
+def test_idempotency_key_in_flight_returns_conflict(
+    authenticated_user_client, order_data, user_data
+):
+    user, _ = user_data
+    cache.add(f"idempotency:{user.pk}:retry-3:lock", "fingerprint")
+
+    response = authenticated_user_client.post(
+        ORDERS_LIST_URL,
+        order_data,
+        format="json",
+        headers={"Idempotency-Key": "retry-3"},
+    )
+
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert not Order.objects.exists()
+
+
+def test_idempotency_lock_taken_over_after_ttl_is_kept(
+    authenticated_user_client, order_data, user_data, monkeypatch
+):
+    user, _ = user_data
+    lock_key = f"idempotency:{user.pk}:retry-4:lock"
+    place = OrderSerializer.create
+
+    def outlive_lock_ttl(serializer, validated_data):
+        # Блокировка истекла, и ее взял повтор запроса.
+        cache.set(lock_key, "retry")
+        return place(serializer, validated_data)
+
+    monkeypatch.setattr(OrderSerializer, "create", outlive_lock_ttl)
+
+    response = authenticated_user_client.post(
+        ORDERS_LIST_URL,
+        order_data,
+        format="json",
+        headers={"Idempotency-Key": "retry-4"},
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert cache.get(lock_key) == "retry"
+
+
+@pytest.mark.django_db
+def test_order_on_sharded_product_takes_stock_from_shards(user_data, product_in_db):
+    user, _ = user_data
+    rebalance_stock(product_in_db, shards=5)
+
+    place_order([{"product": product_in_db, "quantity": 12}], user=user)
+
+    product = Product.objects.get(pk=product_in_db.pk)
+    assert product.stock == 0
+    assert product.available_stock == 38
+
+    with pytest.raises(ValidationError):
+        place_order([{"product": product, "quantity": 39}], user=user)
+    assert Product.objects.get(pk=product.pk).available_stock == 38
+
+
+def test_atomic_batch_returns_taken_shard_stock(
+    authenticated_user_client, setup_products_for_filter
+):
+    rebalance_stock(Product.objects.get(pk=1), shards=4)
+    payload = {
+        "orders": [
+            {"items": [{"product": 1, "quantity": 5}]},
+            {"items": [{"product": 2, "quantity": 101}]},
+        ]
+    }
+
+    response = authenticated_user_client.post(ORDERS_BATCH_URL, payload, format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert Product.objects.get(pk=1).available_stock == 50
+
+
+@pytest.mark.django_db
+def test_batch_collects_hot_product_from_shards_it_already_holds(user_data):
+    user, _ = user_data
+    product = Product.objects.create(name="Горячий", price=10, stock=40)
+    rebalance_stock(product, shards=4)
+
+    # Вторая корзина не помещается в один шард и собирается с нескольких,
+    # включая шард, который транзакция пакета заняла для первой.
+    results = place_orders(
+        [
+            ([{"product": product, "quantity": 3}], {"user": user}),
+            ([{"product": product, "quantity": 30}], {"user": user}),
+        ]
+    )
+
+    assert all(isinstance(result, Order) for result in results)
+    assert Product.objects.get(pk=product.pk).available_stock == 7
+
+
+def test_async_order_is_accepted_and_processed_by_worker(
+    authenticated_user_client,
+    order_data,
+    product_in_db,
+    user_data,
+    django_capture_on_commit_callbacks,
+):
+    user, _ = user_data
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = authenticated_user_client.post(
+            ORDERS_LIST_URL,
+            order_data,
+            format="json",
+            headers={"Prefer": "respond-async"},
+        )
+
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.data["status"] == "pending"
+    assert response["Location"] == response.data["status_url"]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        drain_order_intake()
+
+    response = authenticated_user_client.get(response["Location"])
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["status"] == "accepted"
+    assert response.data["order"]["status"] == "new"
+    assert Order.objects.filter(user=user).count() == 1
+    product_in_db.refresh_from_db()
+    assert product_in_db.stock == 48
+    relay_outbox()
+    assert len(mail.outbox) == 1
+
+
+def test_async_order_survives_broker_error_and_is_drained_later(
+    authenticated_user_client,
+    order_data,
+    product_in_db,
+    django_capture_on_commit_callbacks,
+    monkeypatch,
+    settings,
+):
+    def broker_down(*args, **kwargs):
+        raise ConnectionError
+
+    monkeypatch.setattr(drain_order_intake, "apply_async", broker_down)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = authenticated_user_client.post(
+            ORDERS_LIST_URL,
+            order_data,
+            format="json",
+            headers={"Prefer": "respond-async"},
+        )
+
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    # Флаг снят: следующая заявка снова попробует запланировать разбор.
+    assert cache.get(INTAKE_DRAIN_SCHEDULED) is None
+    assert "drain-order-intake" in settings.CELERY_BEAT_SCHEDULE
+
+    drain_order_intake()
+
+    assert OrderIntake.objects.get().status == "accepted"
+
+
+@pytest.mark.django_db
+def test_intake_batch_rejects_orders_without_stock(user_data, product_in_db):
+    user, _ = user_data
+    for quantity in (30, 30, 10):
+        submit_order_intake(
+            user, {"items": [{"product": product_in_db.id, "quantity": quantity}]}
+        )
+
+    assert process_intake_batch() == 3
+
+    statuses = list(
+        OrderIntake.objects.order_by("created_at").values_list("status", flat=True)
+    )
+    assert statuses == ["accepted", "rejected", "accepted"]
+    rejected = OrderIntake.objects.get(status="rejected")
+    assert rejected.errors == {
+        "non_field_errors": ["На складе недостаточно товара: Test Product."]
+    }
+    assert process_intake_batch() == 0
+
+
+def test_intake_status_is_private(api_client, user_data, product_in_db):
+    user, _ = user_data
+    intake = submit_order_intake(
+        user, {"items": [{"product": product_in_db.id, "quantity": 1}]}
+    )
+    other = User.objects.create_user(email="other@example.com", password="x")
+    api_client.force_authenticate(user=other)
+
+    response = api_client.get(reverse("order-intake", kwargs={"handle": intake.pk}))
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_confirmation_email_is_not_sent_for_rolled_back_order(
+    authenticated_user_client, order_data, monkeypatch
+):
+    def fail(*args, **kwargs):
+        raise RuntimeError
+
+    monkeypatch.setattr(OrderItem.objects, "bulk_create", fail)
+
+    with pytest.raises(RuntimeError):
+        authenticated_user_client.post(ORDERS_LIST_URL, order_data, format="json")
+    relay_outbox()
+
+    assert not OutboxMessage.objects.exists()
+    assert len(mail.outbox) == 0
+
+
+@pytest.mark.django_db
+def test_relay_outbox_publishes_pending_messages_once(user_data):
+    user, _ = user_data
+    enqueue(send_order_confirmation_email, order_id=1, recipient_email=user.email)
+    enqueue(send_order_confirmation_email, order_id=2, recipient_email=user.email)
+
+    relay_outbox()
+    relay_outbox()
+
+    assert [email.subject for email in mail.outbox] == [
+        "Подтверждение заказа #1",
+        "Подтверждение заказа #2",
+    ]
+    assert not OutboxMessage.objects.filter(sent_at__isnull=True).exists()
+
+
+def test_order_detail_supports_conditional_get(
+    authenticated_user_client, order_in_db, django_assert_num_queries
+):
+    url = reverse("order-detail", args=[order_in_db.pk])
+    response = authenticated_user_client.get(url)
+    etag, last_modified = response["ETag"], response["Last-Modified"]
+
+    with django_assert_num_queries(1):
+        response = authenticated_user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    response = authenticated_user_client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+def test_order_list_is_versioned_by_etag_only(
+    authenticated_user_client, orders_with_items
+):
+    params = {"status": "new"}
+    response = authenticated_user_client.get(ORDERS_LIST_URL, params)
+    etag = response["ETag"]
+    assert "Last-Modified" not in response
+
+    # Заказ уходит из фильтра, а MAX(updated_at) оставшихся не меняется.
+    set_order_status(orders_with_items[0], "completed")
+    response = authenticated_user_client.get(
+        ORDERS_LIST_URL, params, HTTP_IF_NONE_MATCH=etag
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response["ETag"] != etag
+
+
+def test_order_etag_changes_on_status_and_line_edits(
+    authenticated_admin_client, order_in_db
+):
+    url = reverse("order-detail", args=[order_in_db.pk])
+    first = authenticated_admin_client.get(url)["ETag"]
+
+    authenticated_admin_client.patch(url, {"status": "completed"}, format="json")
+    second = authenticated_admin_client.get(url)["ETag"]
+    assert second != first
+
+    item = order_in_db.items.first()
+    item.quantity += 1
+    item.save()
+    assert authenticated_admin_client.get(
+        url, HTTP_IF_NONE_MATCH=second
+    ).status_code == (status.HTTP_200_OK)
+
+
+def test_order_detail_with_non_numeric_pk_is_not_found(authenticated_user_client):
+    response = authenticated_user_client.get(reverse("order-detail", args=["abc"]))
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_missing_order_is_not_found_despite_empty_version_etag(
+    authenticated_user_client, order_in_db
+):
+    url = reverse("order-detail", args=[order_in_db.pk + 1000])
+    empty_etag = weak_etag("0:")
+
+    response = authenticated_user_client.get(url, HTTP_IF_NONE_MATCH=empty_etag)
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert "ETag" not in response
+
+
+def test_order_list_etag_follows_filtered_queryset(api_client, user_data, setup_orders):
+    user, _ = user_data
+    api_client.force_authenticate(user=user)
+    etag = api_client.get(ORDERS_LIST_URL, {"status": "new"})["ETag"]
+
+    Order.objects.filter(user=user, status="completed").update(status="cancelled")
+    response = api_client.get(
+        ORDERS_LIST_URL, {"status": "new"}, HTTP_IF_NONE_MATCH=etag
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    Order.objects.create(user=user, status="new")
+    response = api_client.get(
+        ORDERS_LIST_URL, {"status": "new"}, HTTP_IF_NONE_MATCH=etag
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+
+def _walk(client, url, params=None):
+    pages, response = [], client.get(url, params)
+    pages.append(response.data)
+    while response.data["next"]:
+        response = client.get(response.data["next"])
+        pages.append(response.data)
+    return pages
+
+
+def test_order_list_keyset_pages_cover_ties_without_gaps(
+    authenticated_admin_client, user_data
+):
+    user, _ = user_data
+    Order.objects.bulk_create(
+        [Order(user=user, total_price=price % 3) for price in range(25)]
+    )
+
+    pages = _walk(
+        authenticated_admin_client,
+        ORDERS_LIST_URL,
+        {"ordering": "total_price", "page_size": 4},
+    )
+    seen = [order["id"] for page in pages for order in page["results"]]
+
+    expected = list(
+        Order.objects.order_by("total_price", "pk").values_list("pk", flat=True)
+    )
+    assert seen == expected
+    assert len(pages) == 7
+
+    previous = authenticated_admin_client.get(pages[3]["previous"]).data
+    assert previous["results"] == pages[2]["results"]
+
+
+def test_order_list_page_cost_does_not_depend_on_depth(
+    authenticated_admin_client, user_data
+):
+    user, _ = user_data
+    Order.objects.bulk_create([Order(user=user) for _ in range(30)])
+    pages = _walk(authenticated_admin_client, ORDERS_LIST_URL, {"page_size": 5})
+
+    query_counts = []
+    for link in [page["next"] for page in pages[:-1]]:
+        with CaptureQueriesContext(connection) as queries:
+            authenticated_admin_client.get(link)
+        query_counts.append(len(queries))
+        assert not any("OFFSET" in query["sql"] for query in queries)
+    assert len(set(query_counts)) == 1
+
+    seen = [order["id"] for page in pages for order in page["results"]]
+    assert seen == list(
+        Order.objects.order_by("-created_at", "-pk").values_list("pk", flat=True)
+    )
+
+
+def test_order_list_reports_approximate_count(authenticated_admin_client, order_in_db):
+    response = authenticated_admin_client.get(
+        ORDERS_LIST_URL, {"approximate_count": "true"}
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert isinstance(response.data["approximate_count"], int)
+    assert (
+        "approximate_count" not in authenticated_admin_client.get(ORDERS_LIST_URL).data
+    )
+
+
+def test_order_list_rejects_tampered_cursor(authenticated_admin_client):
+    response = authenticated_admin_client.get(ORDERS_LIST_URL, {"cursor": "bm9wZQ=="})
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.parametrize(
+    "position",
+    [[123, 1], [None, 1], ["2026-01-01T00:00:00+00:00", None]],
+    ids=["wrong-type", "null-created-at", "null-pk"],
+)
+def test_order_list_rejects_crafted_cursor_positions(
+    authenticated_admin_client, position
+):
+    cursor = b64encode(json.dumps({"p": position}).encode()).decode()
+
+    response = authenticated_admin_client.get(ORDERS_LIST_URL, {"cursor": cursor})
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+EXPORT_URL = reverse("order-export")
+
+
+def _content(response):
+    return b"".join(response.streaming_content).decode()
+
+
+def test_admin_exports_orders_as_csv_stream(
+    authenticated_admin_client, order_in_db, django_assert_num_queries
+):
+    Order.objects.create(user=order_in_db.user, status="cancelled")
+
+    with django_assert_num_queries(0):
+        response = authenticated_admin_client.get(EXPORT_URL, {"status": "new"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.streaming
+    assert response["Content-Type"] == "text/csv"
+    lines = _content(response).splitlines()
+    assert lines[0] == (
+        "order_id,created_at,status,user_email,total_price,"
+        "product_id,product_name,quantity,price"
+    )
+    assert lines[1:] == [
+        f"{order_in_db.pk},{order_in_db.created_at.isoformat()},new,"
+        f"testuser_for_order@example.com,200.00,{order_in_db.items.get().product_id},"
+        "Test Product,2,100.00"
+    ]
+
+
+def test_export_ndjson_filters_by_period(authenticated_admin_client, user_data):
+    user, _ = user_data
+    old, recent = Order.objects.bulk_create([Order(user=user), Order(user=user)])
+    Order.objects.filter(pk=old.pk).update(created_at="2024-01-10T12:00:00Z")
+
+    response = authenticated_admin_client.get(
+        EXPORT_URL,
+        {
+            "file_format": "ndjson",
+            "created_from": "2024-01-10",
+            "created_to": "2024-01-10",
+        },
+    )
+
+    rows = [json.loads(line) for line in _content(response).splitlines()]
+    assert [row["order_id"] for row in rows] == [old.pk]
+    assert rows[0]["product_id"] is None
+
+
+def test_export_is_admin_only(authenticated_user_client):
+    response = authenticated_user_client.get(EXPORT_URL)
+
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+def test_export_orders_command(order_in_db, tmp_path):
+    path = tmp_path / "orders.ndjson"
+
+    call_command("export_orders", "--format", "ndjson", "--output", str(path))
+
+    assert json.loads(path.read_text())["order_id"] == order_in_db.pk
+
+
+@pytest.fixture
+def orders_with_items(user_data, setup_products_for_filter):
+    user, admin_user = user_data
+    orders = [
+        place_order(
+            [{"product": product, "quantity": quantity} for product in products],
+            user=owner,
+        )
+        for owner, products, quantity in [
+            (user, setup_products_for_filter, 1),
+            (user, setup_products_for_filter[:1], 3),
+            (admin_user, setup_products_for_filter[1:], 2),
+        ]
+    ]
+    set_order_status(orders[1], "completed")
+    return orders
+
+
+def test_order_read_serializer_matches_order_serializer(orders_with_items):
+    full = OrderSerializer(
+        Order.objects.prefetch_related("items__product").order_by("pk"), many=True
+    ).data
+    fast = OrderReadSerializer(
+        Order.objects.values(*ORDER_READ_FIELDS).order_by("pk"), many=True
+    ).data
+
+    assert json.dumps(fast) == json.dumps(full)
+    assert (
+        OrderReadSerializer(
+            Order.objects.values(*ORDER_READ_FIELDS).get(pk=orders_with_items[0].pk)
+        ).data
+        == OrderSerializer(orders_with_items[0]).data
+    )
+
+
+def test_order_list_and_detail_keep_their_format(
+    authenticated_admin_client, orders_with_items, django_assert_num_queries
+):
+    # Страница заказов и позиции всех заказов страницы.
+    with django_assert_num_queries(2):
+        response = authenticated_admin_client.get(ORDERS_LIST_URL)
+
+    expected = OrderSerializer(
+        Order.objects.order_by("-created_at", "-pk"), many=True
+    ).data
+    assert response.data["results"] == expected
+
+    order = orders_with_items[0]
+    response = authenticated_admin_client.get(reverse("order-detail", args=[order.pk]))
+    assert response.data == OrderSerializer(order).data
+
+
+STATS_URL = reverse("order-stats")
+
+
+def _rollups():
+    fold_rollups()
+    return (
+        sorted(
+            OrderDailyStats.objects.exclude(orders=0).values_list(
+                "day", "status", "orders", "revenue"
+            )
+        ),
+        sorted(
+            ProductDailySales.objects.exclude(units=0).values_list(
+                "day", "product_id", "units", "revenue"
+            )
+        ),
+    )
+
+
+def _assert_rollups_match_orders():
+    incremental = _rollups()
+    today = timezone.localdate()
+    rebuild_rollups(today, today)
+    assert _rollups() == incremental
+
+
+def test_rollups_follow_order_lifecycle(
+    authenticated_admin_client, orders_with_items, setup_products_for_filter
+):
+    today = timezone.localdate()
+    _assert_rollups_match_orders()
+    assert _rollups()[0] == [
+        (today, "completed", 1, 3000),
+        (today, "new", 2, 1075),
+    ]
+
+    order = orders_with_items[0]
+    for new_status in ["cancelled", "in_progress"]:
+        response = authenticated_admin_client.patch(
+            reverse("order-set-status", args=[order.pk]),
+            {"status": new_status},
+            format="json",
+        )
+        assert response.status_code == status.HTTP_200_OK
+        _assert_rollups_match_orders()
+
+    assert (
+        authenticated_admin_client.delete(
+            reverse("order-detail", args=[order.pk])
+        ).status_code
+        == status.HTTP_204_NO_CONTENT
+    )
+    _assert_rollups_match_orders()
+    assert (today, setup_products_for_filter[0].pk, 3, 3000) in _rollups()[1]
+
+
+def test_order_appends_rollup_deltas_without_locking_rollup_rows(
+    user_data, setup_products_for_filter
+):
+    user, _ = user_data
+    product = setup_products_for_filter[0]
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(3):
+            place_order([{"product": product, "quantity": 1}], user=user)
+
+    rollup_tables = ('"orders_orderdailystats"', '"orders_productdailysales"')
+    assert not [
+        query["sql"]
+        for query in queries
+        if any(table in query["sql"] for table in rollup_tables)
+    ]
+    assert SalesDelta.objects.count() == 6
+    assert fold_rollups() == 6
+    assert not SalesDelta.objects.exists()
+    assert _rollups()[1] == [(timezone.localdate(), product.pk, 3, 3000)]
+
+
+def test_stats_reads_only_rollup_tables(authenticated_admin_client, orders_with_items):
+    # Часть изменений уже в агрегатах, часть еще в журнале.
+    fold_rollups()
+    set_order_status(orders_with_items[2], "completed")
+    set_order_status(orders_with_items[2], "new")
+    unfolded = SalesDelta.objects.count()
+
+    with CaptureQueriesContext(connection) as queries:
+        response = authenticated_admin_client.get(STATS_URL, {"top_products": 1})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert not [
+        query["sql"]
+        for query in queries
+        if "orders_order" in query["sql"].replace("orders_orderdailystats", "")
+    ]
+    # Отчет не переносит журнал и не берет блокировок записи.
+    assert SalesDelta.objects.count() == unfolded > 0
+    assert response.data["date_to"] == timezone.localdate().isoformat()
+    assert [dict(row) for row in response.data["totals"]] == [
+        {"status": "completed", "orders": 1, "revenue": "3000.00"},
+        {"status": "new", "orders": 2, "revenue": "1075.00"},
+    ]
+    assert len(response.data["days"]) == 2
+    assert len(response.data["products"]) == 1
+    assert response.data["products"][0]["units"] == 4
+
+
+def test_stats_is_admin_only_and_validates_period(authenticated_user_client, user_data):
+    assert authenticated_user_client.get(STATS_URL).status_code == 403
+
+    authenticated_user_client.force_authenticate(user=user_data[1])
+    response = authenticated_user_client.get(
+        STATS_URL, {"date_from": "2026-02-01", "date_to": "2026-01-01"}
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "date_to" in response.data
+
+
+def test_rebuild_order_rollups_command_repairs_drift(orders_with_items):
+    expected = _rollups()
+    OrderDailyStats.objects.update(orders=99)
+    ProductDailySales.objects.all().delete()
+
+    call_command("rebuild_order_rollups", "--from", timezone.localdate().isoformat())
+
+    assert _rollups() == expected
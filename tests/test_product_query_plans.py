@@ -0,0 +1,88 @@
+"""
+Регрессия планов запросов списка товаров.
+
+Страницы каталога в порядке по умолчанию (name, id) должны читаться из
+индекса с LIMIT, без чтения таблицы целиком и сортировки, на любой глубине.
+"""
+
+import json
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from products.models import Product
+
+PRODUCTS = 50_000
+PRODUCT_TABLE = Product._meta.db_table
+SORT_NODES = {"Sort", "Incremental Sort"}
+
+# Данные и статистика одинаковы при каждом запуске (см. test_order_query_plans).
+SEED_SQL = f"""
+    SELECT setseed(0.5);
+    INSERT INTO {PRODUCT_TABLE}
+        (name, price, stock, stock_shards, created_at, updated_at)
+    SELECT
+        'Plan product ' || lpad((random() * 100000)::int::text, 6, '0'),
+        1, 1, 0, now(), now()
+    FROM generate_series(1, %(products)s);
+
+    SET default_statistics_target = 1000;
+    ANALYZE {PRODUCT_TABLE};
+    RESET default_statistics_target;
+"""
+
+
+@pytest.fixture(scope="module")
+def seeded(django_db_setup, django_db_blocker):
+    with django_db_blocker.unblock():
+        with connection.cursor() as cursor:
+            cursor.execute(SEED_SQL, {"products": PRODUCTS})
+        yield
+        Product.objects.filter(name__startswith="Plan product ").delete()
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def assert_indexed_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    for node in plan_nodes(plan[0]["Plan"]):
+        assert not (
+            node["Node Type"] in ("Seq Scan", "Parallel Seq Scan")
+            and node["Relation Name"] == PRODUCT_TABLE
+        ), f"Seq Scan по {PRODUCT_TABLE}:\n{sql}"
+        assert node["Node Type"] not in SORT_NODES, f"Сортировка товаров:\n{sql}"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("pages", [1, 5])
+def test_product_list_pages_use_name_index(seeded, pages):
+    client = APIClient()
+    client.force_authenticate(user=User.objects.get(email="admin@example.com"))
+
+    url, params = reverse("product-list"), {"page_size": 50}
+    for _ in range(pages - 1):
+        url, params = client.get(url, params).data["next"], None
+    with CaptureQueriesContext(connection) as queries:
+        assert client.get(url, params).status_code == 200
+
+    product_queries = [
+        query["sql"]
+        for query in queries
+        if query["sql"].startswith("SELECT") and f'"{PRODUCT_TABLE}"' in query["sql"]
+    ]
+    assert product_queries
+    for sql in product_queries:
+        assert_indexed_plan(sql)
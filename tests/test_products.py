@@ -1,6 +1,15 @@
+import io
+
 import pytest
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db.models import F
 from rest_framework import status
 from django.urls import reverse
+from products.cache import CATALOG_VERSION_KEY, catalog_version
+from products.filters import prefix_search_query, trigram_search_enabled
+from products.inventory import rebalance_stock
 from products.models import Product
 
 PRODUCTS_LIST_URL = reverse("product-list")
@@ -80,3 +89,496 @@ def test_get_product_detail_is_not_allowed_for_unauthenticated_user(
     url = reverse("product-detail", args=[product.pk])
     response = api_client.get(url)
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_admin_can_create_sharded_product(authenticated_admin_client, product_data):
+    response = authenticated_admin_client.post(
+        PRODUCTS_LIST_URL, {**product_data, "stock_shards": 4}, format="json"
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.data["stock"] == 10
+    product = Product.objects.get()
+    assert product.stock == 0
+    assert sorted(product.stock_shard_rows.values_list("stock", flat=True)) == [
+        2,
+        2,
+        3,
+        3,
+    ]
+
+
+def test_admin_stock_update_rebalances_shards(authenticated_admin_client, product_data):
+    product = rebalance_stock(Product.objects.create(**product_data), shards=3)
+    url = reverse("product-detail", args=[product.pk])
+
+    response = authenticated_admin_client.patch(url, {"stock": 31}, format="json")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["stock"] == 31
+    assert sorted(product.stock_shard_rows.values_list("stock", flat=True)) == [
+        10,
+        10,
+        11,
+    ]
+
+    response = authenticated_admin_client.get(PRODUCTS_LIST_URL)
+    assert response.data["results"][0]["stock"] == 31
+
+
+def test_unsharding_product_collapses_stock(authenticated_admin_client, product_data):
+    product = rebalance_stock(Product.objects.create(**product_data), shards=3)
+    url = reverse("product-detail", args=[product.pk])
+
+    response = authenticated_admin_client.patch(url, {"stock_shards": 0}, format="json")
+
+    product.refresh_from_db()
+    assert response.status_code == status.HTTP_200_OK
+    assert product.stock == 10
+    assert not product.stock_shard_rows.exists()
+
+
+def test_repeated_product_list_is_served_from_cache(
+    authenticated_admin_client, product_data, django_assert_num_queries
+):
+    product = Product.objects.create(**product_data)
+    first = authenticated_admin_client.get(PRODUCTS_LIST_URL)
+    detail_url = reverse("product-detail", args=[product.pk])
+    authenticated_admin_client.get(detail_url)
+
+    # ETag хранится рядом со страницей в кэше: база не нужна.
+    with django_assert_num_queries(0):
+        second = authenticated_admin_client.get(PRODUCTS_LIST_URL)
+        detail = authenticated_admin_client.get(detail_url)
+
+    assert second.status_code == status.HTTP_200_OK
+    assert second.data == first.data
+    assert detail.data["id"] == product.pk
+
+
+def test_product_detail_with_non_numeric_pk_is_not_found(authenticated_admin_client):
+    url = reverse("product-detail", args=["abc"])
+    response = authenticated_admin_client.get(url)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_product_change_invalidates_cached_list(
+    authenticated_admin_client, product_data, django_capture_on_commit_callbacks
+):
+    product = Product.objects.create(**product_data)
+    authenticated_admin_client.get(PRODUCTS_LIST_URL)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        authenticated_admin_client.patch(
+            reverse("product-detail", args=[product.pk]),
+            {"name": "Новое имя"},
+            format="json",
+        )
+
+    response = authenticated_admin_client.get(PRODUCTS_LIST_URL)
+    assert response.data["results"][0]["name"] == "Новое имя"
+
+
+def test_placed_order_invalidates_cached_stock(
+    authenticated_admin_client,
+    product_data,
+    django_user_model,
+    django_capture_on_commit_callbacks,
+):
+    from orders.services import place_order
+
+    product = Product.objects.create(**product_data)
+    url = reverse("product-detail", args=[product.pk])
+    authenticated_admin_client.get(url)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        place_order(
+            [{"product": product, "quantity": 3}],
+            user=django_user_model.objects.get(email="admin@example.com"),
+        )
+
+    assert authenticated_admin_client.get(url).data["stock"] == 7
+
+
+def test_product_etag_follows_data_refreshed_without_version_bump(
+    authenticated_admin_client, product_data
+):
+    product = Product.objects.create(**product_data)
+    url = reverse("product-detail", args=[product.pk])
+    etag = authenticated_admin_client.get(url)["ETag"]
+
+    # Остаток изменился без смены версии, запись кэша истекла по TTL.
+    Product.objects.filter(pk=product.pk).update(stock=3)
+    version = catalog_version()
+    cache.clear()
+    cache.set(CATALOG_VERSION_KEY, version, None)
+
+    response = authenticated_admin_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["stock"] == 3
+    assert response["ETag"] != etag
+
+
+def test_admin_can_get_catalog_cache_stats(authenticated_admin_client):
+    authenticated_admin_client.get(PRODUCTS_LIST_URL)
+    authenticated_admin_client.get(PRODUCTS_LIST_URL)
+
+    response = authenticated_admin_client.get(reverse("product-cache-stats"))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["hits"] == 1
+    assert response.data["misses"] == 1
+    assert response.data["hit_ratio"] == 0.5
+
+
+def test_product_list_answers_not_modified_for_matching_etag(
+    authenticated_admin_client,
+    product_data,
+    django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    product = Product.objects.create(**product_data)
+    etag = authenticated_admin_client.get(PRODUCTS_LIST_URL)["ETag"]
+    assert etag.startswith('W/"')
+
+    with django_assert_num_queries(0):
+        response = authenticated_admin_client.get(
+            PRODUCTS_LIST_URL, HTTP_IF_NONE_MATCH=etag
+        )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response["ETag"] == etag
+    # ETag зависит от URL: у другой выборки он свой.
+    response = authenticated_admin_client.get(
+        PRODUCTS_LIST_URL, {"search": "x"}, HTTP_IF_NONE_MATCH=etag
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    with django_capture_on_commit_callbacks(execute=True):
+        rebalance_stock(product, shards=2)
+    response = authenticated_admin_client.get(
+        PRODUCTS_LIST_URL, HTTP_IF_NONE_MATCH=etag
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response["ETag"] != etag
+
+
+def test_product_list_pages_by_name_with_cursor(authenticated_admin_client):
+    Product.objects.bulk_create(
+        [Product(name=f"Товар {i % 4}", price=1, stock=1) for i in range(10)]
+    )
+
+    response = authenticated_admin_client.get(PRODUCTS_LIST_URL, {"page_size": 3})
+    names = [product["name"] for product in response.data["results"]]
+    while response.data["next"]:
+        response = authenticated_admin_client.get(response.data["next"])
+        names += [product["name"] for product in response.data["results"]]
+
+    assert names == sorted(f"Товар {i % 4}" for i in range(10))
+    assert "count" not in response.data
+
+
+def _walk_ids(client, params):
+    ids, response = [], client.get(PRODUCTS_LIST_URL, params)
+    ids += [product["id"] for product in response.data["results"]]
+    while response.data["next"]:
+        response = client.get(response.data["next"])
+        ids += [product["id"] for product in response.data["results"]]
+    return ids
+
+
+def test_product_list_ignores_ordering_by_nullable_sku(authenticated_admin_client, db):
+    Product.objects.bulk_create(
+        Product(
+            name=f"Товар {number}",
+            sku=f"SKU-{number}" if number % 2 else None,
+            price=10,
+            stock=1,
+        )
+        for number in range(6)
+    )
+    params = {"ordering": "sku", "page_size": 2}
+
+    found = _walk_ids(authenticated_admin_client, params)
+    assert sorted(found) == sorted(Product.objects.values_list("pk", flat=True))
+
+
+@pytest.fixture
+def catalog(db):
+    return Product.objects.bulk_create(
+        [
+            Product(name="Ноутбук игровой", price=1000, stock=1),
+            Product(name="Сумка для ноутбука с плечевым ремнем", price=50, stock=1),
+            Product(name="Мышь беспроводная", price=20, stock=1),
+            Product(name="Laptop stand", price=30, stock=1),
+        ]
+    )
+
+
+def _search(client, term, **params):
+    response = client.get(PRODUCTS_LIST_URL, {"search": term, **params})
+    assert response.status_code == status.HTTP_200_OK
+    return [product["name"] for product in response.data["results"]]
+
+
+def test_product_search_matches_word_prefixes_and_ranks(
+    authenticated_admin_client, catalog
+):
+    assert _search(authenticated_admin_client, "ноут") == [
+        "Ноутбук игровой",
+        "Сумка для ноутбука с плечевым ремнем",
+    ]
+    assert _search(authenticated_admin_client, "lapt") == ["Laptop stand"]
+
+
+@pytest.mark.skipif("not trigram_search_enabled()", reason="pg_trgm не установлено")
+def test_product_search_tolerates_typos(authenticated_admin_client, catalog):
+    assert _search(authenticated_admin_client, "бесправодная") == ["Мышь беспроводная"]
+
+
+def test_product_search_respects_explicit_ordering(authenticated_admin_client, catalog):
+    assert _search(authenticated_admin_client, "ноутбук", ordering="price") == [
+        "Сумка для ноутбука с плечевым ремнем",
+        "Ноутбук игровой",
+    ]
+
+
+def test_product_search_pages_cover_rank_ties(authenticated_admin_client, db):
+    Product.objects.bulk_create(
+        Product(name=f"Чехол для телефона {number}", price=10, stock=1)
+        for number in range(18)
+    )
+    params = {"search": "чехол", "page_size": 2}
+
+    found = _walk_ids(authenticated_admin_client, params)
+    assert sorted(found) == sorted(Product.objects.values_list("pk", flat=True))
+
+
+def test_search_vector_follows_renames(authenticated_admin_client, catalog):
+    product = catalog[2]
+    authenticated_admin_client.patch(
+        reverse("product-detail", args=[product.pk]),
+        {"name": "Клавиатура механическая"},
+        format="json",
+    )
+
+    assert (
+        Product.objects.filter(search_vector=prefix_search_query("клавиатура")).get()
+        == product
+    )
+    assert _search(authenticated_admin_client, "мышь") == []
+
+
+def test_stock_updates_do_not_recompute_search_vector(catalog):
+    product = catalog[0]
+    rows = Product.objects.filter(pk=product.pk)
+    rows.update(search_vector=None)
+
+    rows.update(stock=F("stock") - 1, price=F("price") + 1)
+    assert rows.values_list("search_vector", flat=True).get() is None
+
+    rows.update(name="Клавиатура механическая")
+    assert rows.filter(search_vector=prefix_search_query("клавиатура")).exists()
+
+
+def _upload(client, content, name):
+    return client.post(
+        reverse("product-import-products"),
+        {"file": SimpleUploadedFile(name, content.encode())},
+        format="multipart",
+    )
+
+
+def test_admin_can_import_products_from_csv(
+    authenticated_admin_client, django_capture_on_commit_callbacks
+):
+    Product.objects.create(sku="A-1", name="Старое имя", price=1, stock=1)
+    content = (
+        "sku,name,price,stock\n"
+        "A-1,Ноутбук,1000.00,5\n"
+        "B-2,Мышь,20,abc\n"
+        "C-3,Клавиатура,50,7\n"
+        "C-3,Клавиатура механическая,60,8\n"
+    )
+
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        response = _upload(authenticated_admin_client, content, "catalog.csv")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["rows"] == 4
+    assert (response.data["created"], response.data["updated"]) == (1, 1)
+    assert response.data["rejects"] == [
+        {"line": 2, "errors": {"stock": ["“abc” value must be an integer."]}}
+    ]
+    assert list(Product.objects.values_list("sku", "name", "stock")) == [
+        ("C-3", "Клавиатура механическая", 8),
+        ("A-1", "Ноутбук", 5),
+    ]
+    assert len(callbacks) == 1
+
+
+def test_import_keeps_sharded_stock_and_reads_ndjson(authenticated_admin_client):
+    product = Product.objects.create(sku="A-1", name="Ноутбук", price=1, stock=0)
+    rebalance_stock(product, total=10, shards=2)
+    content = '{"sku": "A-1", "name": "Ноутбук", "price": 900, "stock": 1}\nnot json\n'
+
+    response = _upload(authenticated_admin_client, content, "catalog.ndjson")
+
+    assert response.data["updated"] == 1
+    assert response.data["rejected"] == 1
+    product = Product.objects.with_available_stock().get()
+    assert (product.price, product.available_stock) == (900, 10)
+
+
+def test_import_requires_known_format(authenticated_admin_client):
+    response = _upload(authenticated_admin_client, "sku\n", "catalog.xlsx")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "file_format" in response.data
+
+
+def test_import_products_command(db, tmp_path):
+    path = tmp_path / "catalog.csv"
+    path.write_text("sku,name,price,stock\nA-1,Ноутбук,10,1\n", encoding="utf-8")
+    out = io.StringIO()
+
+    call_command("import_products", str(path), "--chunk-size", "1", stdout=out)
+
+    assert "rows=1 created=1" in out.getvalue()
+    assert Product.objects.get(sku="A-1").name == "Ноутбук"
+
+
+BULK_URL = reverse("product-bulk")
+
+
+def test_bulk_update_sets_stock_and_price_in_one_statement(
+    authenticated_admin_client,
+    django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    first, second = Product.objects.bulk_create(
+        [Product(name="А", price=10, stock=5), Product(name="Б", price=20, stock=5)]
+    )
+    payload = {
+        "items": [
+            {"id": second.pk, "stock": 7},
+            {"id": first.pk, "stock": 1, "price": "11.50"},
+            {"id": 999999, "stock": 1},
+        ]
+    }
+
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        # Блокировка строк и UPDATE, плюс SAVEPOINT/RELEASE внутри теста.
+        with django_assert_num_queries(4):
+            response = authenticated_admin_client.patch(
+                BULK_URL, payload, format="json"
+            )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data == {
+        "updated": [first.pk, second.pk],
+        "missing": [999999],
+        "rejected": [],
+    }
+    assert list(Product.objects.values_list("stock", "price")) == [(1, 11.5), (7, 20)]
+    assert len(callbacks) == 1
+
+
+def test_bulk_update_applies_deltas_and_rejects_negative_results(
+    authenticated_admin_client,
+):
+    plain, sharded, low = Product.objects.bulk_create(
+        [
+            Product(name="А", price=10, stock=5),
+            Product(name="Б", price=10, stock=10),
+            Product(name="В", price=10, stock=1),
+        ]
+    )
+    rebalance_stock(sharded, shards=2)
+
+    response = authenticated_admin_client.patch(
+        BULK_URL,
+        {
+            "mode": "delta",
+            "items": [
+                {"id": plain.pk, "stock": -2, "price": "-1.00"},
+                {"id": sharded.pk, "stock": 3},
+                {"id": low.pk, "stock": -2},
+            ],
+        },
+        format="json",
+    )
+
+    assert response.data["updated"] == [plain.pk, sharded.pk]
+    assert response.data["rejected"] == [low.pk]
+    products = Product.objects.with_available_stock().in_bulk()
+    assert products[plain.pk].available_stock == 3
+    assert products[plain.pk].price == 9
+    assert products[sharded.pk].available_stock == 13
+    assert products[low.pk].available_stock == 1
+
+
+def test_bulk_update_rejected_price_leaves_sharded_stock(authenticated_admin_client):
+    product = rebalance_stock(
+        Product.objects.create(name="А", price=10, stock=10), shards=2
+    )
+
+    response = authenticated_admin_client.patch(
+        BULK_URL,
+        {"mode": "delta", "items": [{"id": product.pk, "stock": 5, "price": "-100"}]},
+        format="json",
+    )
+
+    assert response.data["rejected"] == [product.pk]
+    product = Product.objects.with_available_stock().get(pk=product.pk)
+    assert product.available_stock == 10
+    assert product.price == 10
+
+
+def test_bulk_update_rejects_overflow_and_bumps_catalog_once(
+    authenticated_admin_client, django_capture_on_commit_callbacks
+):
+    plain, big, first, second = Product.objects.bulk_create(
+        [
+            Product(name="А", price="99999990.00", stock=5),
+            Product(name="Б", price=10, stock=2**31 - 2),
+            Product(name="В", price=10, stock=10),
+            Product(name="Г", price=10, stock=10),
+        ]
+    )
+    for product in (first, second):
+        rebalance_stock(product, shards=2)
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        response = authenticated_admin_client.patch(
+            BULK_URL,
+            {
+                "mode": "delta",
+                "items": [
+                    {"id": plain.pk, "price": "10.00"},
+                    {"id": big.pk, "stock": 5},
+                    {"id": first.pk, "stock": 1},
+                    {"id": second.pk, "stock": 1, "price": "99999999.00"},
+                ],
+            },
+            format="json",
+        )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["updated"] == [first.pk]
+    assert response.data["rejected"] == [plain.pk, big.pk, second.pk]
+    assert len(callbacks) == 1
+
+
+def test_bulk_update_validates_items(authenticated_admin_client, product_data):
+    product = Product.objects.create(**product_data)
+
+    for items in (
+        [{"id": product.pk}],
+        [{"id": product.pk, "stock": -1}],
+        [{"id": product.pk, "stock": 2**31}],
+        [{"id": product.pk, "stock": 1}, {"id": product.pk, "stock": 2}],
+    ):
+        response = authenticated_admin_client.patch(
+            BULK_URL, {"items": items}, format="json"
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
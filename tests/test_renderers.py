@@ -0,0 +1,102 @@
+import datetime
+import io
+import uuid
+from decimal import Decimal
+
+import pytest
+from django.urls import reverse
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core import parsers, renderers
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+from orders.services import place_order
+from products.models import Product
+
+MSK = datetime.timezone(datetime.timedelta(hours=3))
+PAYLOAD = {
+    "price": Decimal("1999.90"),
+    "tiny": Decimal("0.00001"),
+    "huge": Decimal("1E+20"),
+    "created_at": datetime.datetime(2024, 1, 2, 3, 4, 5, 120, datetime.timezone.utc),
+    "local": datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=MSK),
+    "day": datetime.date(2024, 1, 2),
+    "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+    "text": 'Заказ \u2028\u2029 \x00 "ок" 😀',
+    1: [True, None, 0.5, (1, 2)],
+}
+
+
+def _parse(parser, body):
+    try:
+        return parser.parse(io.BytesIO(body), parser_context={})
+    except Exception as error:
+        return type(error), str(error)
+
+
+@pytest.mark.parametrize(
+    "payload,media_type",
+    [
+        (PAYLOAD, None),
+        (PAYLOAD, "application/json; indent=4"),
+        # Целое длиннее 64 бит orjson не кодирует: работает json.dumps.
+        ({**PAYLOAD, "big": 2**70}, None),
+    ],
+)
+def test_fast_renderer_output_matches_json_renderer(payload, media_type):
+    assert FastJSONRenderer().render(payload, media_type) == JSONRenderer().render(
+        payload, media_type
+    )
+
+
+def test_fast_renderer_falls_back_without_orjson(monkeypatch):
+    monkeypatch.setattr(renderers, "orjson", None)
+    monkeypatch.setattr(parsers, "orjson", None)
+
+    assert FastJSONRenderer().render(PAYLOAD) == JSONRenderer().render(PAYLOAD)
+    assert _parse(FastJSONParser(), b'{"a": [1, 2.5]}') == {"a": [1, 2.5]}
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b'{"name": "\xd1\x82\xd0\xb5\xd1\x81\xd1\x82", "price": 1.25, "n": null}',
+        b'{"id": 123456789012345678901234567890}',
+        b'{"id": -9999999999999999999}',
+        b'{"text": "\\ud800"}',
+        b'{"price": NaN}',
+        b"",
+    ],
+)
+def test_fast_parser_matches_json_parser(body):
+    assert _parse(FastJSONParser(), body) == _parse(JSONParser(), body)
+
+
+@pytest.mark.django_db
+def test_api_responses_use_fast_renderer(user_data_admin):
+    product = Product.objects.create(name="Ноутбук", price="1999.90", stock=10)
+    place_order([{"product": product, "quantity": 2}], user=user_data_admin)
+    client = APIClient()
+    client.force_authenticate(user=user_data_admin)
+
+    response = client.get(reverse("order-list"))
+
+    assert isinstance(response.accepted_renderer, FastJSONRenderer)
+    assert response.content == JSONRenderer().render(response.data)
+
+    response = client.post(
+        reverse("product-list"),
+        b'{"name": "\xd0\x9c\xd1\x8b\xd1\x88\xd1\x8c", "price": "10.50", "stock": 3}',
+        content_type="application/json",
+    )
+    assert response.status_code == 201
+    assert response.data["name"] == "Мышь"
+
+
+@pytest.fixture
+def user_data_admin(db, django_user_model):
+    return django_user_model.objects.create_superuser(
+        email="admin_for_renderers@example.com", password="password123"
+    )
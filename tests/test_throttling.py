@@ -0,0 +1,124 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.urls import reverse
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework.test import APIClient
+
+from core import throttling
+from core.throttling import parse_rate, take_token
+from products.models import Product
+
+
+@pytest.fixture
+def rates(settings):
+    def set_rates(**rates):
+        settings.REST_FRAMEWORK = {
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {
+                **settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"],
+                **rates,
+            },
+        }
+
+    return set_rates
+
+
+def test_parse_rate():
+    assert parse_rate("20/min") == (20, 60)
+    assert parse_rate("5/s") == (5, 1)
+    assert parse_rate("1000/day") == (1000, 24 * 60 * 60)
+
+
+def test_token_bucket_is_atomic_and_refills():
+    with ThreadPoolExecutor(8) as executor:
+        results = list(
+            executor.map(lambda _: take_token("test:burst", 5, 0.001), range(40))
+        )
+    assert sum(allowed for allowed, _ in results) == 5
+    assert all(wait > 0 for allowed, wait in results if not allowed)
+
+    assert take_token("test:refill", 1, 100) == (True, 0)
+    assert not take_token("test:refill", 1, 100)[0]
+    time.sleep(0.02)
+    assert take_token("test:refill", 1, 100)[0]
+
+
+@pytest.mark.django_db
+def test_login_is_throttled_per_ip_with_retry_after(rates):
+    rates(auth="2/min")
+    client = APIClient()
+    credentials = {"email": "testuser@example.com", "password": "wrong"}
+
+    for _ in range(2):
+        assert client.post(reverse("token_obtain_pair"), credentials).status_code == 401
+    response = client.post(reverse("token_obtain_pair"), credentials)
+
+    assert response.status_code == 429
+    assert 29 <= int(response["Retry-After"]) <= 30
+    other_ip = client.post(
+        reverse("token_obtain_pair"), credentials, REMOTE_ADDR="10.0.0.2"
+    )
+    assert other_ip.status_code == 401
+
+
+@pytest.mark.django_db
+def test_order_placement_is_throttled_per_user(rates, django_user_model):
+    rates(orders="1/hour")
+    product = Product.objects.create(name="Товар", price=10, stock=10)
+    payload = {"items": [{"product": product.pk, "quantity": 1}]}
+    clients = []
+    for email in ("first@example.com", "second@example.com"):
+        client = APIClient()
+        client.force_authenticate(django_user_model.objects.create_user(email=email))
+        clients.append(client)
+
+    url = reverse("order-list")
+
+    # Опрос статуса асинхронной заявки не тратит лимит оформления.
+    intake_url = reverse("order-intake", args=[uuid.uuid4()])
+    for _ in range(3):
+        assert clients[0].get(intake_url).status_code == 404
+    assert clients[0].post(url, payload, format="json").status_code == 201
+    response = clients[0].post(url, payload, format="json")
+    assert response.status_code == 429
+    assert int(response["Retry-After"]) > 3000
+    # Чтение и другие пользователи лимитом оформления не ограничены.
+    assert clients[0].get(url).status_code == 200
+    assert clients[1].post(url, payload, format="json").status_code == 201
+
+
+@pytest.mark.django_db
+def test_spoofed_forwarded_for_does_not_reset_login_bucket(rates):
+    rates(auth="2/min")
+    client = APIClient()
+    credentials = {"email": "testuser@example.com", "password": "wrong"}
+
+    responses = [
+        client.post(
+            reverse("token_obtain_pair"),
+            credentials,
+            HTTP_X_FORWARDED_FOR=f"203.0.113.{i}",
+        )
+        for i in range(5)
+    ]
+
+    assert [r.status_code for r in responses] == [401, 401, 429, 429, 429]
+
+
+@pytest.mark.django_db
+def test_throttle_lets_requests_through_when_redis_is_down(rates, monkeypatch, caplog):
+    rates(auth="1/min")
+
+    def take_token(*args):
+        raise RedisConnectionError("Connection refused")
+
+    monkeypatch.setattr(throttling, "take_token", take_token)
+    client = APIClient()
+    credentials = {"email": "testuser@example.com", "password": "wrong"}
+
+    for _ in range(2):
+        assert client.post(reverse("token_obtain_pair"), credentials).status_code == 401
+    assert "Redis недоступен" in caplog.text